@@ -0,0 +1 @@
+from application.application import Application
@@ -1,8 +1,5 @@
 import random
 
-import cv2
-import numpy as np
-
 from core.particle import Particle
 import application
 from core.particle_force_generator import ParticleForceRegistry
@@ -32,6 +29,10 @@ class MultiBodyGravitationSystemApplication(application.Application):
         # print([i.position.__str__() for i in self.particles])
 
     def display(self):
+        # OpenCV and NumPy are only needed to draw, so headless users of the application never load them
+        import cv2
+        import numpy as np
+
         img = np.zeros([self.height, self.width, 3])
         for particle in self.particles:
             x, y = int(particle.position.x), int(particle.position.y)
@@ -46,6 +47,8 @@ class MultiBodyGravitationSystemApplication(application.Application):
 
 
 if __name__ == "__main__":
+    import cv2
+
     height = 1200
     width = 800
     particles = [
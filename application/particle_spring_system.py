@@ -1,6 +1,3 @@
-import cv2
-import numpy as np
-
 import application
 from core.particle import Particle
 from core.particle_force_generator import ParticleForceRegistry, ParticleSpringForceGenerator, \
@@ -24,6 +21,10 @@ class ParticleSpringSystemApplication(application.Application):
         super().init_graphics()
 
     def display(self):
+        # OpenCV and NumPy are only needed to draw, so headless users of the application never load them
+        import cv2
+        import numpy as np
+
         img = np.zeros([self.height, self.width, 3], dtype=np.uint8)
         particle_position = (int(self.particle.position.x), int(self.particle.position.y))
         anchor_position = (int(self.anchor.x), int(self.anchor.y))
@@ -46,6 +47,8 @@ class ParticleSpringSystemApplication(application.Application):
 
 
 if __name__ == "__main__":
+    import cv2
+
     particle = Particle(
         position=Vector(400, 350),
         velocity=Vector(100, 300),
@@ -16,8 +16,19 @@ class Matrix3:
             data = [0, 0, 0, 0, 0, 0, 0, 0, 0]
         self.data = data
 
-    def __mul__(self, o: 'Matrix3'):
+    def __mul__(self, o: 'Matrix3 | Vector') -> 'Matrix3 | Vector':
+        """
+        Multiplies this matrix by another matrix, or transforms a vector by this matrix
+        :param o: the matrix or the vector
+        :return: the product matrix, or the transformed vector
+        """
         data = self.data
+        if isinstance(o, Vector):
+            return Vector(
+                o.x * data[0] + o.y * data[1] + o.z * data[2],
+                o.x * data[3] + o.y * data[4] + o.z * data[5],
+                o.x * data[6] + o.y * data[7] + o.z * data[8]
+            )
         return Matrix3([
             data[0] * o.data[0] + data[1] * o.data[3] + data[2] * o.data[6],
             data[0] * o.data[1] + data[1] * o.data[4] + data[2] * o.data[7],
@@ -30,6 +41,44 @@ class Matrix3:
             data[6] * o.data[2] + data[7] * o.data[5] + data[8] * o.data[8]
         ])
 
+    def determinant(self) -> float:
+        """
+        :return: the determinant of the matrix
+        """
+        data = self.data
+        return (data[0] * (data[4] * data[8] - data[5] * data[7])
+                - data[1] * (data[3] * data[8] - data[5] * data[6])
+                + data[2] * (data[3] * data[7] - data[4] * data[6]))
+
+    def inverse(self) -> 'Matrix3':
+        """
+        :return: the inverse of the matrix
+        :raise ValueError: if the matrix is singular
+        """
+        determinant = self.determinant()
+        if determinant == 0:
+            raise ValueError("Matrix is singular")
+        data = self.data
+        inverse_determinant = 1 / determinant
+        return Matrix3([
+            (data[4] * data[8] - data[5] * data[7]) * inverse_determinant,
+            (data[2] * data[7] - data[1] * data[8]) * inverse_determinant,
+            (data[1] * data[5] - data[2] * data[4]) * inverse_determinant,
+            (data[5] * data[6] - data[3] * data[8]) * inverse_determinant,
+            (data[0] * data[8] - data[2] * data[6]) * inverse_determinant,
+            (data[2] * data[3] - data[0] * data[5]) * inverse_determinant,
+            (data[3] * data[7] - data[4] * data[6]) * inverse_determinant,
+            (data[1] * data[6] - data[0] * data[7]) * inverse_determinant,
+            (data[0] * data[4] - data[1] * data[3]) * inverse_determinant
+        ])
+
+    def transpose(self) -> 'Matrix3':
+        """
+        :return: the transpose of the matrix, which is also its inverse for a rotation matrix
+        """
+        data = self.data
+        return Matrix3([data[0], data[3], data[6], data[1], data[4], data[7], data[2], data[5], data[8]])
+
 
 class Matrix4:
     """
@@ -45,28 +94,28 @@ class Matrix4:
             data = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
         self.data = data
 
-    def __mul__(self, vector: Vector) -> Vector:
+    def __mul__(self, o: 'Matrix4 | Vector') -> 'Matrix4 | Vector':
         """
-        Transform the given vector by this matrix
-        :param vector: The vector to transform
-        :return: the transformed vector
+        Transform the given vector by this matrix, or combines this transform with another one, the other transform
+        being applied first
+        :param o: The vector to transform, or the other transform
+        :return: the transformed vector, or the combined transform
         """
         data = self.data
-        return Vector(
-            vector.x * data[0] +
-            vector.y * data[1] +
-            vector.z * data[2] + data[3],
-            vector.x * data[4] +
-            vector.y * data[5] +
-            vector.z * data[6] + data[7],
-            vector.x * data[8] +
-            vector.y * data[9] +
-            vector.z * data[10] + data[11]
-        )
-
-    def __mul__(self, o: 'Matrix4') -> 'Matrix4':
+        if isinstance(o, Vector):
+            return Vector(
+                o.x * data[0] +
+                o.y * data[1] +
+                o.z * data[2] + data[3],
+                o.x * data[4] +
+                o.y * data[5] +
+                o.z * data[6] + data[7],
+                o.x * data[8] +
+                o.y * data[9] +
+                o.z * data[10] + data[11]
+            )
+
         result = Matrix4()
-        data = self.data
         result.data[0] = (o.data[0] * data[0]) + (o.data[4] * data[1]) + (o.data[8] * data[2])
         result.data[4] = (o.data[0] * data[4]) + (o.data[4] * data[5]) + (o.data[8] * data[6])
         result.data[8] = (o.data[0] * data[8]) + (o.data[4] * data[9]) + (o.data[8] * data[10])
@@ -80,3 +129,43 @@ class Matrix4:
         result.data[7] = (o.data[3] * data[4]) + (o.data[7] * data[5]) + (o.data[11] * data[6]) + data[7]
         result.data[11] = (o.data[3] * data[8]) + (o.data[7] * data[9]) + (o.data[11] * data[10]) + data[11]
         return result
+
+    def linear(self) -> Matrix3:
+        """
+        :return: the 3x3 linear part of the matrix, its rotation for the transform of a rigid body
+        """
+        data = self.data
+        return Matrix3([data[0], data[1], data[2], data[4], data[5], data[6], data[8], data[9], data[10]])
+
+    def determinant(self) -> float:
+        """
+        :return: the determinant of the matrix, that of its 3x3 linear part since the last row is (0, 0, 0, 1)
+        """
+        return self.linear().determinant()
+
+    def inverse(self) -> 'Matrix4':
+        """
+        :return: the inverse transform, taking world space back to the space this matrix transforms from
+        :raise ValueError: if the matrix is singular
+        """
+        return self._inverse_of(self.linear().inverse())
+
+    def rigid_inverse(self) -> 'Matrix4':
+        """
+        Inverts a rigid transform, made of a rotation and a translation only, by transposing its rotation. This is
+        cheaper than inverse, and exact for the transforms of rigid bodies
+        :return: the inverse transform
+        """
+        return self._inverse_of(self.linear().transpose())
+
+    def _inverse_of(self, linear: Matrix3) -> 'Matrix4':
+        """
+        :param linear: the inverse of the linear part of this matrix
+        :return: the inverse transform
+        """
+        data = self.data
+        translation = linear * Vector(data[3], data[7], data[11])
+        inverse = linear.data
+        return Matrix4([inverse[0], inverse[1], inverse[2], -translation.x,
+                        inverse[3], inverse[4], inverse[5], -translation.y,
+                        inverse[6], inverse[7], inverse[8], -translation.z])
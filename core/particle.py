@@ -27,6 +27,11 @@ class Particle:
     :type inverse_mass: float
 
     :param: force_accum
+
+    A particle may be put to sleep by the world once it has been at rest for a while. A sleeping particle is not
+    integrated and its force generators are not run, until it is woken up by set_awake, by a contact with a moving
+    particle or by a force added to it directly. ParticleForceRegistry.wake_generator wakes up the particles of a force
+    generator whose parameters have changed.
     """
 
     def __init__(
@@ -44,6 +49,9 @@ class Particle:
         self.damping = damping
         self.inverse_mass = inverse_mass
         self.force_accum = force_accum
+        self.is_awake = True
+        # time spent with a kinetic energy below the sleep threshold of the world
+        self.sleep_time = 0.0
 
     @property
     def mass(self):
@@ -65,6 +73,8 @@ class Particle:
 
         :param dt: The time step of the integration
         """
+        if not self.is_awake:
+            return
 
         # Update linear position
         # s2-s1 = u*t + a*t*t/2; ignoring second part as t*t is very small
@@ -87,11 +97,45 @@ class Particle:
 
     def add_force(self, force: Vector):
         """
-        Adds a force to the particle
+        Adds a force to the particle, waking it up if it is asleep
         :param force: force to be added to the particle
         """
+        if not self.is_awake:
+            self.set_awake()
         self.force_accum += force
 
+    def set_awake(self, awake: bool = True):
+        """
+        Wakes the particle up or puts it to sleep. A particle put to sleep loses its velocity and its accumulated
+        forces.
+        :param awake: whether the particle should be awake
+        """
+        self.is_awake = awake
+        self.sleep_time = 0.0
+        if not awake:
+            self.velocity = Vector.zero()
+            self.clear_accumulator()
+
+    @property
+    def is_moving(self) -> bool:
+        """
+        Checks if the particle is awake and was above the sleep threshold of the world on the last frame. A moving
+        particle wakes up the sleeping particles it is linked to.
+        :return: True if the particle is moving, False otherwise
+        """
+        return self.is_awake and self.sleep_time == 0
+
+    def kinetic_energy(self) -> float:
+        """
+        Returns the kinetic energy of the particle. A particle of infinite mass has no energy at rest and an infinite
+        energy otherwise, so that moving anchors never fall asleep.
+        :return: the kinetic energy (m * v^2 / 2)
+        """
+        speed_squared = self.velocity.scaler_product(self.velocity)
+        if self.has_infinite_mass():
+            return math.inf if speed_squared > 0 else 0.0
+        return 0.5 * speed_squared / self.inverse_mass
+
     def has_infinite_mass(self):
         """
         Checks if the particle has infinite mass.
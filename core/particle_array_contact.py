@@ -0,0 +1,62 @@
+import numpy as np
+
+from core.particle_contact import ParticleContact, ParticleContactGenerator
+from core.particle_storage import ParticleStorage
+from core.vector import Vector
+
+
+class ParticleArrayContactGenerator(ParticleContactGenerator):
+    """
+    The base class of the generators that find all their contacts at once on the arrays of a storage, such as contacts
+    with the scenery or between overlapping particles. Subclasses find their contacts as arrays of slots, and fill the
+    contact list of the world with them through fill_contacts.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    """
+
+    def __init__(self, storage: ParticleStorage):
+        self.storage = storage
+
+    def fill_contacts(self, contacts: list[ParticleContact], index: int, limit: int, first: np.ndarray,
+                      second: np.ndarray | None, normals: np.ndarray, depths: np.ndarray,
+                      restitutions: np.ndarray | float) -> int:
+        """
+        Fills the contacts of the list, from the given index, with the given contacts. When there are more contacts
+        than the limit, the deepest ones are kept, and the others are counted in dropped.
+
+        :param contacts: the contact list of the world
+        :param index: the index of the first available contact in the list
+        :param limit: the maximum number of contacts that can be written
+        :param first: the slot of the first particle of each contact
+        :param second: the slot of the second particle of each contact, or None for contacts with the scenery
+        :param normals: the normal of each contact, as an array of shape (n, 3)
+        :param depths: the penetration of each contact
+        :param restitutions: the restitution of each contact, or a single restitution for all of them
+        :return: the number of contacts that have been written
+        """
+        restitutions = np.broadcast_to(restitutions, len(first))
+        self.dropped = max(len(first) - limit, 0)
+        if self.dropped:
+            deepest = np.argpartition(-depths, limit - 1)[:limit]
+            first, normals = first[deepest], normals[deepest]
+            depths, restitutions = depths[deepest], restitutions[deepest]
+            if second is not None:
+                second = second[deepest]
+
+        storage = self.storage
+        handles_a = storage.slot_handle[first].tolist()
+        handles_b = [None] * len(handles_a) if second is None else storage.slot_handle[second].tolist()
+        for i, (handle_a, handle_b, (x, y, z), depth, restitution) in enumerate(
+                zip(handles_a, handles_b, normals.tolist(), depths.tolist(), restitutions.tolist())):
+            contact = contacts[index + i]
+            contact.particles = storage.particle(handle_a), None if handle_b is None else storage.particle(handle_b)
+            contact.contact_normal = Vector(x, y, z)
+            contact.penetration = depth
+            contact.restitution = restitution
+        return len(handles_a)
+
+    def add_contact(self, contact: ParticleContact, limit: int) -> int:
+        """
+        Fills the given contact with the deepest contact found.
+        """
+        return self.add_contacts([contact], 0, min(limit, 1))
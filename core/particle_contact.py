@@ -1,6 +1,13 @@
+import math
+from typing import TYPE_CHECKING
+
 from core.particle import Particle
 from core.vector import Vector
 
+if TYPE_CHECKING:
+    # only the batch resolver stores contacts as arrays, so NumPy stays off the startup path
+    import numpy as np
+
 
 class ParticleContact:
     """
@@ -15,18 +22,23 @@ class ParticleContact:
     :param restitution: the coefficient of normal restitution at the contact
     :param contact_normal: the direction of the contact in the world coordinates
     :param penetration: the depth of penetration at the contact
+    :param accumulated_impulse: the impulse applied along the normal while resolving the contact this frame
+    :param warm_impulse: the part of the accumulated impulse carried over from the previous frame, which the resolver
+    may take back if it keeps the particles apart faster than needed
     """
 
     def __init__(
             self,
-            particles: tuple[Particle, Particle] | Particle,
-            restitution: float,
-            contact_normal: Vector,
-            penetration: float,
+            particles: tuple[Particle, Particle] | Particle = (None, None),
+            restitution: float = 0.0,
+            contact_normal: Vector = Vector.zero(),
+            penetration: float = 0.0,
     ):
+        if isinstance(particles, Particle):
+            particles = particles, None
         if len(particles) == 0:
             raise ValueError("Particles cannot be empty")
-        if len(particles) >= 2:
+        if len(particles) > 2:
             raise ValueError("Particles cannot contain more than two particles")
         if len(particles) == 1:
             particles = particles[0], None
@@ -34,13 +46,30 @@ class ParticleContact:
         self.restitution = restitution
         self.contact_normal = contact_normal
         self.penetration = penetration
+        self.accumulated_impulse = 0.0
+        self.warm_impulse = 0.0
 
     def resolve(self, duration: float):
         """
         Resolves this contact, for both velocity and interpenetration
         :param duration: the duration
         """
+        self._match_awake_state()
         self._resolve_velocity(duration)
+        self.resolve_interpenetration()
+
+    def _match_awake_state(self):
+        """
+        Wakes up the sleeping particle of the contact if the other one is awake. A contact with the scenery never wakes
+        up a particle.
+        """
+        particle_a, particle_b = self.particles
+        if particle_b is None or particle_a.is_awake == particle_b.is_awake:
+            return
+        if particle_a.is_awake:
+            particle_b.set_awake()
+        else:
+            particle_a.set_awake()
 
     def calculate_separating_velocity(self) -> float:
         """
@@ -74,16 +103,31 @@ class ParticleContact:
 
         # We apply the change in velocity to each object in proportion to its inverse mass
         # (i.e., those with lower inverse mass [higher actual mass] get less change in velocity).
-        total_inverse_mass = self.particles[0].inverse_mass
-        if self.particles[1]:
-            total_inverse_mass += self.particles[1].inverse_mass
+        total_inverse_mass = self.total_inverse_mass()
 
         # If all particles have infinite mass, then impulses have no effect.
         if total_inverse_mass <= 0:
             return
 
         # Calculate the impulse to apply.
-        impulse = delta_velocity / total_inverse_mass
+        self.apply_impulse(delta_velocity / total_inverse_mass)
+
+    def total_inverse_mass(self) -> float:
+        """
+        :return: the sum of the inverse masses of the particles of the contact
+        """
+        total_inverse_mass = self.particles[0].inverse_mass
+        if self.particles[1]:
+            total_inverse_mass += self.particles[1].inverse_mass
+        return total_inverse_mass
+
+    def apply_impulse(self, impulse: float):
+        """
+        Applies an impulse along the contact normal, pushing the particles apart if it is positive, and adds it to the
+        accumulated impulse of the contact
+        :param impulse: the magnitude of the impulse
+        """
+        self.accumulated_impulse += impulse
 
         # Find the amount of impulse per unit of inverse mass.
         impulse_per_inverse_mass = self.contact_normal * impulse
@@ -114,28 +158,137 @@ class ParticleContact:
             return
 
         # Find the amount of penetration resolution per unit of inverse mass
-        move_per_inverse_mass = self.contact_normal * (-self.penetration) / total_inverse_mass
+        move_per_inverse_mass = self.contact_normal * self.penetration / total_inverse_mass
 
         # Apply the penetration resolution
         self.particles[0].position += move_per_inverse_mass * self.particles[0].inverse_mass
         if self.particles[1]:
-            self.particles[1].position += move_per_inverse_mass * self.particles[1].inverse_mass
+            self.particles[1].position += move_per_inverse_mass * -self.particles[1].inverse_mass
+
+
+class ParticleContactCache:
+    """
+    Keeps the contacts of the last frame, so that resting contacts start each frame from the impulse that held them the
+    frame before (warm starting) instead of from nothing. Resting stacks and piles then need a few resolver iterations
+    per frame instead of a full pass over their contacts.
+
+    A contact is matched to the contact of the last frame between the same particles, whose normal points the same way
+    to within max_angle. Its accumulated impulse is applied again before the resolver iterates, along with the
+    resolution of its interpenetration. The resolver takes back the part of the carried impulse that keeps the
+    particles apart faster than needed, so contacts that are breaking up are not held together.
+
+    Attach an instance to ParticleContactResolver.cache to enable warm starting. ParticleBatchContactResolver keeps
+    its contacts as arrays instead, through store_arrays and stored_arrays; the contacts stored by one kind of resolver
+    are not matched by the other.
+
+    :param max_angle: the largest angle, in radians, between the normals of matched contacts
+    :param velocity_tolerance: the resolver leaves alone the contacts closing or separating slower than this. Warm
+    started contacts are left with tiny rounding errors, which would otherwise use up every iteration
+    """
+
+    def __init__(self, max_angle: float = 0.5, velocity_tolerance: float = 1e-6):
+        self.min_alignment = math.cos(max_angle)
+        self.velocity_tolerance = velocity_tolerance
+        self.warm_started = 0
+        # the normal and the accumulated impulse of the contacts of the last frame, by pair of particles
+        self._impulses: dict[tuple, list[tuple[Vector, float]]] = {}
+        # the same, as arrays, when stored by a batch resolver
+        self._arrays: tuple['np.ndarray', 'np.ndarray', 'np.ndarray', 'np.ndarray'] | None = None
+
+    def __len__(self) -> int:
+        stored = 0 if self._arrays is None else len(self._arrays[3])
+        return stored + sum(len(entries) for entries in self._impulses.values())
+
+    @staticmethod
+    def _key(contact: ParticleContact) -> tuple:
+        return tuple(None if particle is None else getattr(particle, 'handle', id(particle))
+                     for particle in contact.particles)
+
+    def warm_start(self, contacts: list[ParticleContact], num_contacts: int):
+        """
+        Applies the impulses of the last frame to the matching contacts.
+
+        :param contacts: the contacts of the frame
+        :param num_contacts: the number of contacts used in the list
+        """
+        self.warm_started = 0
+        for contact in contacts[:num_contacts]:
+            contact.accumulated_impulse = 0.0
+            contact.warm_impulse = 0.0
+            entries = self._impulses.get(self._key(contact))
+            if not entries:
+                continue
+            normal = contact.contact_normal
+            for i, (cached_normal, impulse) in enumerate(entries):
+                if cached_normal.scaler_product(normal) >= self.min_alignment:
+                    del entries[i]
+                    if contact.total_inverse_mass() > 0:
+                        contact.apply_impulse(impulse)
+                        contact.warm_impulse = impulse
+                        contact.resolve_interpenetration()
+                        contact.penetration = 0
+                        self.warm_started += 1
+                    break
+
+    def store(self, contacts: list[ParticleContact], num_contacts: int):
+        """
+        Remembers the accumulated impulses of the contacts of the frame, forgetting those of the last frame.
+
+        :param contacts: the contacts of the frame
+        :param num_contacts: the number of contacts used in the list
+        """
+        self._impulses = {}
+        self._arrays = None
+        for contact in contacts[:num_contacts]:
+            if contact.accumulated_impulse > 0:
+                self._impulses.setdefault(self._key(contact), []).append(
+                    (contact.contact_normal, contact.accumulated_impulse))
+
+    def store_arrays(self, first: 'np.ndarray', second: 'np.ndarray', normals: 'np.ndarray', impulses: 'np.ndarray'):
+        """
+        Remembers the accumulated impulses of the contacts of the frame, given as arrays, forgetting those of the last
+        frame.
+
+        :param first: the handle of the first particle of each contact
+        :param second: the handle of the second particle of each contact, or -1 for the scenery
+        :param normals: the normal of each contact, as an array of shape (n, 3)
+        :param impulses: the accumulated impulse of each contact
+        """
+        kept = impulses > 0
+        self._impulses = {}
+        self._arrays = first[kept], second[kept], normals[kept], impulses[kept]
+
+    def stored_arrays(self) -> tuple['np.ndarray', 'np.ndarray', 'np.ndarray', 'np.ndarray'] | None:
+        """
+        :return: the handles, normals and accumulated impulses of the contacts given to store_arrays, or None if the
+        contacts of the last frame were not stored as arrays
+        """
+        return self._arrays
+
+    def clear(self):
+        self._impulses = {}
+        self._arrays = None
 
 
 class ParticleContactResolver:
     """
     The contact resolution routine for particle contacts. One resolver instance can be shared for the whole simulation.
 
+    Each iteration resolves the contact closing the fastest. With a contact cache, contacts are warm started from the
+    last frame first, and an iteration may also take back the carried impulse of the contact separating the fastest.
+
     :param iterations: holds the number of iterations allowed
+    :param cache: the contact cache used for warm starting, or None to start every frame from nothing
     """
 
-    def __init__(self, iterations: int):
+    def __init__(self, iterations: int, cache: ParticleContactCache = None):
         """
         Creates a new contact resolver
         :param iterations: holds the number of iterations allowed
         """
         self.iterations = iterations
         self.iterations_used = 0
+        self.cache = cache
 
     def resolve_contacts(self, contact_list: list[ParticleContact], num_contacts: int, duration: float):
         """
@@ -144,25 +297,56 @@ class ParticleContactResolver:
         :param contact_list: the list of particle contacts
         :param duration: the duration passed
         """
+        tolerance = 0.0
+        if self.cache is not None:
+            self.cache.warm_start(contact_list, num_contacts)
+            tolerance = self.cache.velocity_tolerance
+        else:
+            for contact in contact_list[:num_contacts]:
+                contact.accumulated_impulse = 0.0
+                contact.warm_impulse = 0.0
+
         self.iterations_used = 0
         while self.iterations_used < self.iterations:
-            # Find the contact with the largest closing velocity
-            max_velocity = 0
+            # Find the contact with the largest closing velocity, or the largest separating velocity left by a warm
+            # started impulse
+            max_error = tolerance
             max_index = num_contacts
             for i in range(num_contacts):
                 separation_velocity = contact_list[i].calculate_separating_velocity()
-                if separation_velocity < max_velocity:
-                    max_velocity = separation_velocity
+                error = -separation_velocity if contact_list[i].warm_impulse <= 0 else abs(separation_velocity)
+                if error > max_error:
+                    max_error = error
                     max_index = i
-            contact_list[max_index].resolve(duration)
+
+            # Nothing is closing any more, so there is nothing left to resolve
+            if max_index == num_contacts:
+                break
+
+            contact = contact_list[max_index]
+            separation_velocity = contact.calculate_separating_velocity()
+            if separation_velocity < 0:
+                contact.resolve(duration)
+            else:
+                # take back the part of the carried impulse that pushes the particles apart
+                impulse = min(contact.warm_impulse, separation_velocity / contact.total_inverse_mass())
+                contact.apply_impulse(-impulse)
+                contact.warm_impulse -= impulse
             self.iterations_used += 1
 
+        if self.cache is not None:
+            self.cache.store(contact_list, num_contacts)
+
 
 class ParticleContactGenerator:
     """
-    This is the basic polymorphic interface for contact generators applying particles.
+    This is the basic polymorphic interface for contact generators applying particles. Generators should not report
+    contacts between particles that are all asleep, so that resting particles cost nothing.
     """
 
+    # the number of contacts found by the last call to add_contacts that were left out because of its limit
+    dropped = 0
+
     def add_contact(self, contact: ParticleContact, limit: int) -> int:
         """
         Fills the given contact structure with the generated contact. The contact pointer should point to the first
@@ -173,3 +357,26 @@ class ParticleContactGenerator:
         :return:
         """
         pass
+
+    def add_contacts(self, contacts: list[ParticleContact], index: int, limit: int) -> int:
+        """
+        Fills the contacts of the given list, starting at the given index, with the generated contacts. This is the
+        method called by the world; generators that can report many contacts at once override it. By default, it fills
+        the contact at the index with add_contact.
+
+        :param contacts: the contact list of the world
+        :param index: the index of the first available contact in the list
+        :param limit: the maximum number of contacts that can be written, at least one
+        :return: the number of contacts that have been written
+        """
+        return self.add_contact(contacts[index], limit)
+
+    def count_contacts(self) -> int:
+        """
+        Counts the contacts the generator would report now, without filling any contact or changing any particle. The
+        world calls it on the generators it skips once its contact list is full, to count the contacts dropped.
+        Generators that cannot count their contacts without side effects return 0, so their contacts are not counted.
+
+        :return: the number of contacts
+        """
+        return 0
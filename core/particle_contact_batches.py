@@ -0,0 +1,284 @@
+import numpy as np
+
+from core.particle_contact import ParticleContact, ParticleContactCache, ParticleContactResolver
+from core.particle_storage import ParticleStorage, StoredParticle
+
+
+def color_constraints(first: np.ndarray, second: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Colors constraints between pairs of particles so that no two constraints of the same color share a particle. The
+    constraints of a color can then be solved all at once, and the colors one after the other.
+
+    Each color is a maximal set of constraints, grown in rounds: a constraint joins the color when it has the highest
+    priority among the remaining candidates at both of its particles, and candidates touching a particle it took are
+    dropped from the color. Priorities are a random permutation drawn from the seed, which keeps the rounds few even
+    on long chains, and the colors reproducible.
+
+    :param first: the first particle of each constraint, as any integer id such as a storage slot, or -1 for a particle
+    that does not tie constraints together, such as the scenery or a particle of infinite mass
+    :param second: the second particle of each constraint, in the same form
+    :param seed: the seed of the priorities of the constraints
+    :return: the color of each constraint, from 0
+    """
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    count = len(first)
+    colors = np.full(count, -1, dtype=np.int64)
+    if count == 0:
+        return colors
+    priority = np.random.default_rng(seed).permutation(count)
+    size = max(int(first.max()), int(second.max())) + 2
+    # shared particles are remapped so that -1 points to the last, unused entry of the tables below
+    first = np.where(first < 0, size - 1, first)
+    second = np.where(second < 0, size - 1, second)
+    best = np.full(size, -1, dtype=np.int64)
+    taken = np.zeros(size, dtype=bool)
+
+    uncolored = np.arange(count)
+    color = 0
+    while len(uncolored):
+        candidates = uncolored
+        while len(candidates):
+            a, b, p = first[candidates], second[candidates], priority[candidates]
+            best[a] = -1
+            best[b] = -1
+            np.maximum.at(best, a, p)
+            np.maximum.at(best, b, p)
+            best[size - 1] = count
+            chosen = ((best[a] == p) | (a == size - 1)) & ((best[b] == p) | (b == size - 1))
+            colors[candidates[chosen]] = color
+            taken[a[chosen]] = True
+            taken[b[chosen]] = True
+            taken[size - 1] = False
+            left = ~chosen & ~taken[a] & ~taken[b]
+            candidates = candidates[left]
+        taken[:] = False
+        uncolored = uncolored[colors[uncolored] < 0]
+        color += 1
+    return colors
+
+
+def match_contacts(first: np.ndarray, second: np.ndarray, normals: np.ndarray, cached_first: np.ndarray,
+                   cached_second: np.ndarray, cached_normals: np.ndarray, min_alignment: float) -> np.ndarray:
+    """
+    Matches contacts to the cached contacts of the last frame, as ParticleContactCache.warm_start does: a contact is
+    matched to the first unmatched cached contact between the same particles whose normal is aligned with its own.
+
+    Most pairs of particles have one contact per frame, and are matched all at once. The few pairs with several
+    contacts, such as a particle resting on two planes, are matched one contact at a time.
+
+    :param first: the handle of the first particle of each contact
+    :param second: the handle of the second particle of each contact, or -1 for the scenery
+    :param normals: the normal of each contact, as an array of shape (n, 3)
+    :param cached_first: the handle of the first particle of each cached contact
+    :param cached_second: the handle of the second particle of each cached contact, or -1 for the scenery
+    :param cached_normals: the normal of each cached contact
+    :param min_alignment: the smallest scalar product of the normals of matched contacts
+    :return: the index of the cached contact matched to each contact, or -1
+    """
+    count, cached = len(first), len(cached_first)
+    matched = np.full(count, -1, dtype=np.int64)
+    if count == 0 or cached == 0:
+        return matched
+    pairs = np.concatenate([np.column_stack([cached_first, cached_second]), np.column_stack([first, second])])
+    _, groups = np.unique(pairs, axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+    cached_groups, groups = groups[:cached], groups[cached:]
+    cached_count = np.bincount(cached_groups, minlength=len(pairs))
+    contact_count = np.bincount(groups, minlength=len(pairs))
+
+    # the cached contact of each group, for the groups with a single one
+    only = np.full(len(pairs), -1, dtype=np.int64)
+    only[cached_groups] = np.arange(cached)
+    single = (cached_count[groups] == 1) & (contact_count[groups] == 1)
+    crowded = np.flatnonzero((cached_count[groups] > 0) & ~single)
+    single = np.flatnonzero(single)
+    candidates = only[groups[single]]
+    aligned = np.einsum('ij,ij->i', normals[single], cached_normals[candidates]) >= min_alignment
+    matched[single[aligned]] = candidates[aligned]
+
+    if len(crowded):
+        order = np.argsort(cached_groups, kind='stable')
+        starts = np.searchsorted(cached_groups[order], groups[crowded])
+        free = np.ones(cached, dtype=bool)
+        for i, start, normal in zip(crowded.tolist(), starts.tolist(), normals[crowded]):
+            for j in order[start:start + cached_count[groups[i]]].tolist():
+                if free[j] and normal @ cached_normals[j] >= min_alignment:
+                    matched[i] = j
+                    free[j] = False
+                    break
+    return matched
+
+
+class ParticleBatchContactResolver(ParticleContactResolver):
+    """
+    A contact resolver for the contacts of the particles of a storage, including those of links, that solves many
+    contacts at once with array operations instead of one at a time.
+
+    The resolver of ParticleContactResolver is sequential: each contact sees the velocities left by the one before,
+    which is what makes it converge, but it prevents vectorizing it since consecutive contacts share particles. This
+    resolver colors the contacts with color_constraints so that the contacts of a color share no particle. Solving a
+    whole color at once then gives exactly the result of solving its contacts one after the other, and the colors are
+    solved in sequence, so the sweeps keep the convergence of the sequential resolver.
+
+    Interpenetration is resolved once per frame, color by color. Velocities are then swept over the colors until no
+    contact is closing, or until the number of sweeps reaches the iterations of the resolver; iterations_used counts
+    the sweeps. A contact cache warm starts the contacts as with ParticleContactResolver, matching them with
+    match_contacts and applying their carried impulses color by color.
+
+    Every particle of the contacts must be a StoredParticle of the storage, or None for the scenery.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param iterations: the maximum number of sweeps over the colors
+    :param cache: the contact cache used for warm starting, or None to start every frame from nothing
+    """
+
+    def __init__(self, storage: ParticleStorage, iterations: int, cache: ParticleContactCache = None):
+        super().__init__(iterations, cache)
+        self.storage = storage
+        # the number of colors of the contacts of the last frame
+        self.colors = 0
+
+    def gather(self, contacts: list[ParticleContact]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+                                                               np.ndarray]:
+        """
+        :param contacts: the contacts to resolve
+        :return: the slots of the first and of the second particle of each contact, -1 for the scenery, their normals,
+        penetrations and restitutions
+        :raise ValueError: if a particle of a contact is not a particle of the storage
+        :raise KeyError: if a particle of a contact has been despawned
+        """
+        storage = self.storage
+        handles = np.full((len(contacts), 2), -1, dtype=np.int64)
+        for i, contact in enumerate(contacts):
+            for j, particle in enumerate(contact.particles):
+                if particle is None:
+                    continue
+                if not isinstance(particle, StoredParticle) or particle.storage is not storage:
+                    raise ValueError("Batched contacts must be between particles of the storage of the resolver")
+                handles[i, j] = particle.handle
+        if (handles[:, 0] < 0).any():
+            raise ValueError("The first particle of a contact cannot be empty")
+        slots = np.where(handles >= 0, storage.slots(handles), -1)
+        if (slots[handles >= 0] < 0).any():
+            raise KeyError("Contact particles must be alive")
+        normals = np.array([(c.contact_normal.x, c.contact_normal.y, c.contact_normal.z) for c in contacts],
+                           dtype=float).reshape(-1, 3)
+        penetrations = np.array([c.penetration for c in contacts], dtype=float)
+        restitutions = np.array([c.restitution for c in contacts], dtype=float)
+        return slots[:, 0], slots[:, 1], normals, penetrations, restitutions
+
+    def resolve_contacts(self, contact_list: list[ParticleContact], num_contacts: int, duration: float):
+        """
+        Resolves a set of particle contacts for both penetration and velocity, one color at a time
+
+        :param contact_list: the list of particle contacts
+        :param num_contacts: the number of contacts used in the list
+        :param duration: the duration passed
+        """
+        self.iterations_used = 0
+        self.colors = 0
+        if num_contacts == 0:
+            if self.cache is not None:
+                self.cache.warm_started = 0
+                self.cache.clear()
+            return
+
+        contacts = contact_list[:num_contacts]
+        storage = self.storage
+        first, second, normals, penetrations, restitutions = self.gather(contacts)
+        paired = second >= 0
+        # contacts with the scenery point their second particle at the first, and paired masks it out
+        other = np.where(paired, second, first)
+        inverse_mass_a = storage.inverse_mass[first].astype(float)
+        inverse_mass_b = np.where(paired, storage.inverse_mass[other], 0.0)
+        total_inverse_mass = inverse_mass_a + inverse_mass_b
+        active = total_inverse_mass > 0
+        total_inverse_mass[~active] = 1
+
+        # particles of infinite mass do not move, so they do not tie the contacts sharing them together
+        colors = color_constraints(np.where(inverse_mass_a > 0, first, -1),
+                                   np.where(paired & (inverse_mass_b > 0), second, -1))
+        order = np.argsort(colors, kind='stable')
+        bounds = np.searchsorted(colors[order], np.arange(colors.max() + 2))
+        batches = [order[start:end] for start, end in zip(bounds, bounds[1:])]
+        self.colors = len(batches)
+        batches = [batch[active[batch]] for batch in batches]
+
+        # a contact between an awake and a sleeping particle wakes the sleeping one up
+        awake = storage.awake[first] | (paired & storage.awake[other])
+        woken = np.concatenate([first[awake & ~storage.awake[first]], other[awake & paired & ~storage.awake[other]]])
+        storage.awake[woken] = True
+        storage.sleep_time[woken] = 0
+
+        # the impulses carried over from the last frame are applied before anything else. Their interpenetration is
+        # resolved along with that of the other contacts below
+        tolerance = 0.0
+        warm_impulse = np.zeros(num_contacts)
+        velocity = storage.velocity
+        if self.cache is not None:
+            tolerance = self.cache.velocity_tolerance
+            handles_a = storage.slot_handle[first]
+            handles_b = np.where(paired, storage.slot_handle[other], -1)
+            stored = self.cache.stored_arrays()
+            if stored is not None:
+                cached_a, cached_b, cached_normals, cached_impulses = stored
+                matched = match_contacts(handles_a, handles_b, normals, cached_a, cached_b, cached_normals,
+                                         self.cache.min_alignment)
+                warm = (matched >= 0) & active
+                warm_impulse[warm] = cached_impulses[matched[warm]]
+            self.cache.warm_started = int(np.count_nonzero(warm_impulse))
+            for batch in batches:
+                batch = batch[warm_impulse[batch] > 0]
+                a, b, pair = first[batch], other[batch], paired[batch]
+                kick = normals[batch] * warm_impulse[batch, None]
+                velocity[a] += kick * inverse_mass_a[batch, None]
+                velocity[b[pair]] -= kick[pair] * inverse_mass_b[batch][pair, None]
+
+        # move the particles apart, which does not depend on their velocities
+        position = storage.position
+        for batch in batches:
+            batch = batch[penetrations[batch] > 0]
+            a, b, pair = first[batch], other[batch], paired[batch]
+            move = normals[batch] * (penetrations[batch] / total_inverse_mass[batch])[:, None]
+            position[a] += move * inverse_mass_a[batch, None]
+            position[b[pair]] -= move[pair] * inverse_mass_b[batch][pair, None]
+
+        accumulated = warm_impulse.copy()
+        while self.iterations_used < self.iterations:
+            resolved = 0
+            for batch in batches:
+                a, b, pair, normal = first[batch], other[batch], paired[batch], normals[batch]
+                relative = velocity[a] - np.where(pair[:, None], velocity[b], 0)
+                separating = np.einsum('ij,ij->i', relative, normal)
+
+                # closing contacts bounce back, while warm started contacts separating faster than needed give back
+                # the part of their carried impulse that pushes them apart
+                closing = separating < -tolerance
+                warm = warm_impulse[batch]
+                releasing = (warm > 0) & (separating > tolerance)
+                impulse = np.zeros(len(batch))
+                impulse[closing] = -separating[closing] * (1 + restitutions[batch][closing])
+                impulse[releasing] = -np.minimum(warm[releasing] * total_inverse_mass[batch][releasing],
+                                                 separating[releasing])
+                impulse /= total_inverse_mass[batch]
+                changed = closing | releasing
+                if not changed.any():
+                    continue
+                resolved += int(changed.sum())
+                warm_impulse[batch[releasing]] += impulse[releasing]
+                accumulated[batch] += impulse
+
+                kick = normal[changed] * impulse[changed, None]
+                velocity[a[changed]] += kick * inverse_mass_a[batch][changed, None]
+                pair = pair[changed]
+                velocity[b[changed][pair]] -= kick[pair] * inverse_mass_b[batch][changed][pair, None]
+            if not resolved:
+                break
+            self.iterations_used += 1
+
+        for contact, impulse, warm in zip(contacts, accumulated.tolist(), warm_impulse.tolist()):
+            contact.accumulated_impulse = impulse
+            contact.warm_impulse = warm
+        if self.cache is not None:
+            self.cache.store_arrays(handles_a, handles_b, normals, accumulated)
@@ -0,0 +1,281 @@
+import numpy as np
+
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+class ParticlePayload:
+    """
+    Particles released when a particle dies, like the children of a firework. The children start where their parent
+    died, with the velocity of their parent plus a velocity drawn from their emitter.
+
+    :param emitter: the emitter the children are drawn from
+    :param count: the number of children released by each dying particle
+    """
+
+    def __init__(self, emitter: 'ParticleEmitter', count: int):
+        if count < 0:
+            raise ValueError("Payload count cannot be negative")
+        self.emitter = emitter
+        self.count = count
+
+
+class ParticleEmitter:
+    """
+    Describes a kind of particle that a ParticleEmitterSystem emits: how many are emitted per second, how long they
+    live, the velocity they start with and what they release when they die. An emitter with a rate of zero only emits
+    through bursts and payloads.
+
+    Initial velocities are drawn uniformly, component by component, between min_velocity and max_velocity. Subclasses
+    can override sample_velocities to use another distribution.
+
+    :param rate: the number of particles emitted per second
+    :param min_lifetime: the shortest lifetime of a particle, in seconds
+    :param max_lifetime: the longest lifetime of a particle, in seconds
+    :param position: where the particles are emitted
+    :param min_velocity: the lower bound of the initial velocity
+    :param max_velocity: the upper bound of the initial velocity
+    :param acceleration: the constant acceleration of the particles, such as gravity
+    :param damping: the damping of the particles
+    :param inverse_mass: the inverse mass of the particles
+    :param payloads: the particles released by each particle when it dies
+    """
+
+    def __init__(
+            self,
+            rate: float = 0.0,
+            min_lifetime: float = 1.0,
+            max_lifetime: float = 1.0,
+            position: Vector = Vector.zero(),
+            min_velocity: Vector = Vector.zero(),
+            max_velocity: Vector = Vector.zero(),
+            acceleration: Vector = Vector.zero(),
+            damping: float = 1.0,
+            inverse_mass: float = 1.0,
+            payloads: list[ParticlePayload] = None,
+    ):
+        if rate < 0:
+            raise ValueError("Emission rate cannot be negative")
+        if not 0 <= min_lifetime <= max_lifetime:
+            raise ValueError("Lifetimes must satisfy 0 <= min_lifetime <= max_lifetime")
+        self.rate = rate
+        self.min_lifetime = min_lifetime
+        self.max_lifetime = max_lifetime
+        self.position = position
+        self.min_velocity = min_velocity
+        self.max_velocity = max_velocity
+        self.acceleration = acceleration
+        self.damping = damping
+        self.inverse_mass = inverse_mass
+        self.payloads = payloads or []
+
+    def sample_lifetimes(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        """
+        :return: the lifetimes of count new particles
+        """
+        return rng.uniform(self.min_lifetime, self.max_lifetime, count)
+
+    def sample_velocities(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        """
+        :return: the initial velocities of count new particles, as an array of shape (count, 3)
+        """
+        low = (self.min_velocity.x, self.min_velocity.y, self.min_velocity.z)
+        high = (self.max_velocity.x, self.max_velocity.y, self.max_velocity.z)
+        return rng.uniform(low, high, (count, 3))
+
+
+class ParticleSphericalEmitter(ParticleEmitter):
+    """
+    An emitter whose particles leave in uniformly random directions, with a speed drawn uniformly between min_speed and
+    max_speed, like the burst of a firework shell.
+
+    :param min_speed: the lowest initial speed
+    :param max_speed: the highest initial speed
+    """
+
+    def __init__(self, min_speed: float, max_speed: float, **kwargs):
+        super().__init__(**kwargs)
+        if not 0 <= min_speed <= max_speed:
+            raise ValueError("Speeds must satisfy 0 <= min_speed <= max_speed")
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+
+    def sample_velocities(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        directions = rng.normal(size=(count, 3))
+        directions /= np.maximum(np.linalg.norm(directions, axis=1, keepdims=True), 1e-12)
+        return directions * rng.uniform(self.min_speed, self.max_speed, (count, 1))
+
+
+class ParticleEmitterSystem:
+    """
+    Emits, ages and expires the particles of a set of emitters in a ParticleWorld.
+
+    The particles are spawned in the world storage, which recycles the slots of dead particles, and the system tracks
+    them in its own arrays: their handle, age, lifetime and emitter. There is no Python object per particle, and a call
+    to update ages every particle and expires the dead ones in a single pass over the arrays, so effects with hundreds
+    of thousands of live particles stay cheap.
+
+    Call update once per frame, next to ParticleWorld.run_physics. Particles the system emitted that are despawned by
+    other code are dropped from the system on the next update.
+
+    :param world: the world the particles live in
+    :param capacity: the number of particles the system arrays are preallocated for. They grow as needed
+    :param seed: the seed of the random number generator, for reproducible effects
+    """
+
+    def __init__(self, world: ParticleWorld, capacity: int = 1024, seed: int = None):
+        capacity = max(capacity, 1)
+        self.world = world
+        self.rng = np.random.default_rng(seed)
+        self.emitters: list[ParticleEmitter] = []
+        self.count = 0
+        self.handles = np.zeros(capacity, dtype=np.int64)
+        self.age = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.emitter = np.zeros(capacity, dtype=np.int32)
+        # index of each emitter in self.emitters, whether it emits at its rate, and the fraction of a particle it owes
+        self._emitter_index: dict[ParticleEmitter, int] = {}
+        self._emitting: list[bool] = []
+        self._pending: list[float] = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, emitter: ParticleEmitter):
+        """
+        Adds an emitter to the system, along with the emitters of its payloads, and starts emitting at its rate.
+
+        :param emitter: the emitter
+        """
+        self._emitting[self._index(emitter)] = True
+
+    def remove(self, emitter: ParticleEmitter):
+        """
+        Stops the continuous emission of an emitter. Its live particles keep living until they expire.
+
+        :param emitter: the emitter
+        :raise KeyError: if the emitter was never added
+        """
+        index = self._emitter_index[emitter]
+        self._emitting[index] = False
+        self._pending[index] = 0.0
+
+    def _index(self, emitter: ParticleEmitter) -> int:
+        """
+        :return: the index of the emitter in the system, adding it and its payload emitters if needed. Emitters added
+        this way only emit through bursts and payloads
+        """
+        index = self._emitter_index.get(emitter)
+        if index is None:
+            index = self._emitter_index[emitter] = len(self.emitters)
+            self.emitters.append(emitter)
+            self._emitting.append(False)
+            self._pending.append(0.0)
+            for payload in emitter.payloads:
+                self._index(payload.emitter)
+        return index
+
+    def burst(self, emitter: ParticleEmitter, count: int, position: np.ndarray = None,
+              velocity: np.ndarray = 0.0) -> np.ndarray:
+        """
+        Emits particles from an emitter at once, regardless of its rate.
+
+        :param emitter: the emitter
+        :param count: the number of particles
+        :param position: where the particles start, one position per particle or a single one. Defaults to the
+        position of the emitter
+        :param velocity: a velocity added to the ones drawn from the emitter, one per particle or a single one
+        :return: the handles of the new particles
+        """
+        if position is None:
+            position = (emitter.position.x, emitter.position.y, emitter.position.z)
+        index = self._index(emitter)
+        acceleration = emitter.acceleration
+        handles = self.world.spawn_many(
+            count,
+            position=position,
+            velocity=emitter.sample_velocities(self.rng, count) + velocity,
+            acceleration=(acceleration.x, acceleration.y, acceleration.z),
+            damping=emitter.damping,
+            inverse_mass=emitter.inverse_mass,
+        )
+
+        end = self.count + count
+        if end > len(self.handles):
+            self._grow(end)
+        self.handles[self.count:end] = handles
+        self.age[self.count:end] = 0
+        self.lifetime[self.count:end] = emitter.sample_lifetimes(self.rng, count)
+        self.emitter[self.count:end] = index
+        self.count = end
+        return handles
+
+    def _grow(self, capacity: int):
+        """
+        Grows the system arrays geometrically, to at least the given capacity.
+        """
+        capacity = max(capacity, 2 * len(self.handles))
+        for name in ('handles', 'age', 'lifetime', 'emitter'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def update(self, duration: float):
+        """
+        Ages every particle by the given duration, despawns the ones that reached their lifetime, releases their
+        payloads, and emits the particles owed by the rate of each emitter.
+
+        :param duration: the duration of the frame
+        """
+        n = self.count
+        age = self.age[:n]
+        age += duration
+        slots = self.world.storage.slots(self.handles[:n])
+        expired = age >= self.lifetime[:n]
+        dead = expired | (slots < 0)
+
+        if dead.any():
+            expired &= slots >= 0
+            storage = self.world.storage
+            dying_slots = slots[expired]
+            dying_emitters = self.emitter[:n][expired]
+            positions = storage.position[dying_slots]
+            velocities = storage.velocity[dying_slots]
+            self.world.despawn_many(self.handles[:n][expired])
+
+            keep = ~dead
+            kept = int(keep.sum())
+            for name in ('handles', 'age', 'lifetime', 'emitter'):
+                column = getattr(self, name)
+                column[:kept] = column[:n][keep]
+            self.count = kept
+
+            self._release_payloads(dying_emitters, positions, velocities)
+
+        for index, emitter in enumerate(self.emitters):
+            if self._emitting[index] and emitter.rate > 0:
+                owed = self._pending[index] + emitter.rate * duration
+                count = int(owed)
+                self._pending[index] = owed - count
+                if count:
+                    self.burst(emitter, count)
+
+    def _release_payloads(self, emitters: np.ndarray, positions: np.ndarray, velocities: np.ndarray):
+        """
+        Spawns the payloads of dying particles. The work is done per emitter, not per particle.
+
+        :param emitters: the emitter index of each dying particle
+        :param positions: the position of each dying particle
+        :param velocities: the velocity of each dying particle
+        """
+        for index in np.unique(emitters).tolist():
+            payloads = self.emitters[index].payloads
+            if not payloads:
+                continue
+            parents = emitters == index
+            for payload in payloads:
+                if payload.count:
+                    self.burst(payload.emitter, int(parents.sum()) * payload.count,
+                               position=np.repeat(positions[parents], payload.count, axis=0),
+                               velocity=np.repeat(velocities[parents], payload.count, axis=0))
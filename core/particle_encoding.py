@@ -0,0 +1,218 @@
+import struct
+import zlib
+
+import numpy as np
+
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+# Every encoded frame starts with this header: a magic number, the size of the payload in bytes, the kind of frame, the
+# size in bytes of the deltas, whether the payload is compressed, the number of the keyframe the frame refers to, the
+# frame number, the simulated time and the number of particles of the keyframe
+ENCODED_MAGIC = b'PWQ1'
+ENCODED_HEADER = struct.Struct('<4sIBBBIQdI')
+KEYFRAME = 0
+DELTA_FRAME = 1
+
+# The quantization of a keyframe, at the start of its payload: the minimum and maximum of the position bounds, the
+# largest speed, and the bits per position and velocity component
+QUANTIZATION = struct.Struct('<6ddBB')
+
+
+def _unsigned_dtype(bits: int) -> np.dtype:
+    return np.dtype('<u2') if bits <= 16 else np.dtype('<u4')
+
+
+class ParticleQuantization:
+    """
+    Maps positions inside an axis-aligned box, and velocities up to a largest speed, to unsigned integers of the given
+    number of bits per component. Values outside the bounds are clamped to them; values inside are reconstructed with
+    an error of at most half a quantization step, given by position_error and velocity_error.
+
+    :param minimum: the corner of the position bounds with the lowest coordinates
+    :param maximum: the corner of the position bounds with the highest coordinates
+    :param max_speed: the largest velocity component represented
+    :param position_bits: the bits of each position component, from 1 to 32
+    :param velocity_bits: the bits of each velocity component, from 1 to 32
+    """
+
+    def __init__(self, minimum: Vector, maximum: Vector, max_speed: float, position_bits: int = 16,
+                 velocity_bits: int = 12):
+        if not (1 <= position_bits <= 32 and 1 <= velocity_bits <= 32):
+            raise ValueError("Components must have from 1 to 32 bits")
+        if minimum.x >= maximum.x or minimum.y >= maximum.y or minimum.z >= maximum.z or max_speed <= 0:
+            raise ValueError("Bounds must not be empty")
+        self.minimum = np.array((minimum.x, minimum.y, minimum.z))
+        self.maximum = np.array((maximum.x, maximum.y, maximum.z))
+        self.max_speed = max_speed
+        self.position_bits = position_bits
+        self.velocity_bits = velocity_bits
+        self._position_step = (self.maximum - self.minimum) / (2 ** position_bits - 1)
+        self._velocity_step = 2 * max_speed / (2 ** velocity_bits - 1)
+
+    @property
+    def position_error(self) -> np.ndarray:
+        """
+        :return: the largest error of each component of the positions inside the bounds
+        """
+        return self._position_step / 2
+
+    @property
+    def velocity_error(self) -> float:
+        """
+        :return: the largest error of each component of the velocities below the largest speed
+        """
+        return self._velocity_step / 2
+
+    def quantize(self, positions: np.ndarray, velocities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the quantized positions and velocities, as int64 arrays of shape (n, 3)
+        """
+        position = np.rint((positions - self.minimum) / self._position_step)
+        velocity = np.rint((velocities + self.max_speed) / self._velocity_step)
+        return (np.clip(position, 0, 2 ** self.position_bits - 1).astype(np.int64),
+                np.clip(velocity, 0, 2 ** self.velocity_bits - 1).astype(np.int64))
+
+    def reconstruct(self, positions: np.ndarray, velocities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the positions and velocities of the given quantized values
+        """
+        return (self.minimum + positions * self._position_step,
+                velocities * self._velocity_step - self.max_speed)
+
+    def pack(self) -> bytes:
+        return QUANTIZATION.pack(*self.minimum, *self.maximum, self.max_speed, self.position_bits, self.velocity_bits)
+
+    @staticmethod
+    def unpack(data: bytes, offset: int = 0) -> 'ParticleQuantization':
+        *bounds, max_speed, position_bits, velocity_bits = QUANTIZATION.unpack_from(data, offset)
+        return ParticleQuantization(Vector(*bounds[:3]), Vector(*bounds[3:]), max_speed, position_bits, velocity_bits)
+
+
+class ParticleStateEncoder:
+    """
+    Encodes the frames of a world compactly, for streaming or recording. Positions and velocities are quantized, see
+    ParticleQuantization, and most frames only hold the difference from the last keyframe:
+
+    - a keyframe holds the handles and the quantized state of every live particle. One is sent every keyframe_interval
+      frames, and whenever particles were spawned or despawned since the last keyframe
+    - a delta frame holds, for the particles that are awake or have moved since the keyframe, the difference between
+      their quantized state and the one in the keyframe, in the narrowest integers that fit. Sleeping particles that
+      have not moved since the keyframe are skipped
+
+    Since delta frames only depend on their keyframe, a decoder can skip any of them, for example when a slow client
+    drops frames; the reconstruction error never accumulates, and stays within the error of the quantization. Payloads
+    are compressed with zlib, which shrinks the small deltas of slow particles further.
+
+    The encode method can be given to ParticleWorldServer as its encode argument.
+
+    :param quantization: the quantization of the positions and velocities
+    :param keyframe_interval: the number of frames between two keyframes
+    :param compress: whether the payloads are compressed
+    """
+
+    def __init__(self, quantization: ParticleQuantization, keyframe_interval: int = 30, compress: bool = True):
+        if keyframe_interval < 1:
+            raise ValueError("Keyframe interval must be at least one frame")
+        self.quantization = quantization
+        self.keyframe_interval = keyframe_interval
+        self.compress = compress
+        self.keyframes = 0
+        self._since_keyframe = 0
+        self._handles = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros((0, 3), dtype=np.int64)
+        self._velocities = np.zeros((0, 3), dtype=np.int64)
+
+    def encode(self, world: ParticleWorld, frame: int, simulated_time: float) -> bytes:
+        """
+        Encodes the state of the live particles of a world.
+
+        :param world: the world
+        :param frame: the number of the frame
+        :param simulated_time: the simulated time of the frame
+        :return: the header and payload of the encoded frame
+        """
+        storage = world.storage
+        slots = storage.live_slots()
+        handles = storage.slot_handle[slots]
+        positions, velocities = self.quantization.quantize(storage.position[slots], storage.velocity[slots])
+
+        if self._since_keyframe % self.keyframe_interval == 0 or not np.array_equal(handles, self._handles):
+            self._since_keyframe = 1
+            self.keyframes += 1
+            self._handles, self._positions, self._velocities = handles, positions, velocities
+            unsigned = _unsigned_dtype(max(self.quantization.position_bits, self.quantization.velocity_bits))
+            payload = b''.join((self.quantization.pack(), handles.astype('<i8').tobytes(),
+                                positions.astype(unsigned).tobytes(), velocities.astype(unsigned).tobytes()))
+            return self._frame(KEYFRAME, unsigned.itemsize, frame, simulated_time, payload)
+
+        self._since_keyframe += 1
+        position_delta = positions - self._positions
+        velocity_delta = velocities - self._velocities
+        changed = position_delta.any(axis=1) | velocity_delta.any(axis=1)
+        sent = storage.awake[slots] | changed
+        deltas = np.concatenate([position_delta[sent], velocity_delta[sent]], axis=1)
+        largest = int(np.abs(deltas).max(initial=0))
+        signed = np.dtype('<i1') if largest < 2 ** 7 else np.dtype('<i2') if largest < 2 ** 15 else \
+            np.dtype('<i4') if largest < 2 ** 31 else np.dtype('<i8')
+        payload = np.packbits(sent).tobytes() + deltas.astype(signed).tobytes()
+        return self._frame(DELTA_FRAME, signed.itemsize, frame, simulated_time, payload)
+
+    def _frame(self, kind: int, width: int, frame: int, simulated_time: float, payload: bytes) -> bytes:
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+        return ENCODED_HEADER.pack(ENCODED_MAGIC, len(payload), kind, width, self.compress, self.keyframes, frame,
+                                   simulated_time, len(self._handles)) + payload
+
+
+class ParticleStateDecoder:
+    """
+    Decodes the frames of a ParticleStateEncoder. A delta frame can only be decoded after its keyframe, but any frame
+    can be skipped.
+    """
+
+    def __init__(self):
+        self.quantization: ParticleQuantization | None = None
+        self.keyframe = -1
+        self.handles = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros((0, 3), dtype=np.int64)
+        self._velocities = np.zeros((0, 3), dtype=np.int64)
+
+    def decode(self, data: bytes) -> tuple[int, float, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Decodes a frame.
+
+        :param data: the header and payload of the frame
+        :return: the frame number, the simulated time, and the handle, position and velocity of every particle
+        :raise ValueError: if the data is not an encoded frame, or if it is a delta frame whose keyframe was not decoded
+        """
+        magic, size, kind, width, compressed, keyframe, frame, simulated_time, count = ENCODED_HEADER.unpack_from(data)
+        if magic != ENCODED_MAGIC:
+            raise ValueError("Data is not an encoded particle world frame")
+        payload = data[ENCODED_HEADER.size:ENCODED_HEADER.size + size]
+        if compressed:
+            payload = zlib.decompress(payload)
+
+        if kind == KEYFRAME:
+            self.quantization = ParticleQuantization.unpack(payload)
+            offset = QUANTIZATION.size
+            self.handles = np.frombuffer(payload, '<i8', count, offset).astype(np.int64)
+            offset += 8 * count
+            unsigned = np.dtype(f'<u{width}')
+            self._positions = np.frombuffer(payload, unsigned, 3 * count, offset).reshape(count, 3).astype(np.int64)
+            offset += 3 * count * width
+            self._velocities = np.frombuffer(payload, unsigned, 3 * count, offset).reshape(count, 3).astype(np.int64)
+            self.keyframe = keyframe
+            positions, velocities = self._positions, self._velocities
+        else:
+            if keyframe != self.keyframe:
+                raise ValueError(f"Keyframe {keyframe} of the frame was not decoded")
+            mask_size = (count + 7) // 8
+            sent = np.unpackbits(np.frombuffer(payload, np.uint8, mask_size), count=count).astype(bool)
+            deltas = np.frombuffer(payload, np.dtype(f'<i{width}'), offset=mask_size).reshape(-1, 6)
+            positions, velocities = self._positions.copy(), self._velocities.copy()
+            positions[sent] += deltas[:, :3]
+            velocities[sent] += deltas[:, 3:]
+
+        positions, velocities = self.quantization.reconstruct(positions, velocities)
+        return frame, simulated_time, self.handles, positions, velocities
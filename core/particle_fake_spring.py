@@ -0,0 +1,124 @@
+import numpy as np
+
+from core.particle_force_generator import ParticleBatchForceGenerator, damped_spring_coefficients
+from core.particle_storage import ParticleStorage
+
+
+class ParticleFakeSpringBatchForceGenerator(ParticleBatchForceGenerator):
+    """
+    The batch counterpart of ParticleFakeSpringForceGenerator: many stiff damped springs, each tying a particle of a
+    storage to a fixed anchor, such as the particles of a jelly wobbling around their rest shape. The motion of each
+    spring over the step is solved in closed form, so the springs stay stable however stiff they are, and they may be
+    over-damped or critically damped as well as under-damped.
+
+    The factors of the closed form only depend on the spring constant, the damping and the duration of the step. They
+    are computed once per distinct pair of spring constant and damping and cached for the duration of the last step,
+    so that every spring is then advanced by the same few array operations.
+
+    Springs refer to their particles by handle, so they survive the compaction of the storage. A spring whose particle
+    was despawned no longer applies any force.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    """
+
+    def __init__(self, storage: ParticleStorage):
+        super().__init__(storage)
+        self.handles = np.zeros(0, dtype=np.int64)
+        self.anchors = np.zeros((0, 3))
+        self.spring_constant = np.zeros(0)
+        self.damping = np.zeros(0)
+        # the distinct pairs of spring constant and damping, and the pair of each spring
+        self._parameters = np.zeros((0, 2))
+        self._parameter = np.zeros(0, dtype=np.int64)
+        # the factors of the offset and of the velocity of each spring, for the duration they were computed for
+        self._duration = None
+        self._factors = np.zeros((0, 2))
+        self._acceleration_factors = np.zeros((0, 2))
+        # whether every particle has a single spring, so that forces can be added without summing duplicates
+        self._single = True
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def add_springs(self, handles: np.ndarray, anchors: np.ndarray, spring_constant: np.ndarray | float,
+                    damping: np.ndarray | float) -> np.ndarray:
+        """
+        Adds many springs at once. The spring constants and damping are either one value per spring or a single value
+        broadcast to all of them.
+
+        :param handles: the handles of the particles
+        :param anchors: the anchor of each spring, as an array of shape (n, 3), or a single anchor for all of them
+        :param spring_constant: the spring constants
+        :param damping: the damping on the oscillation of the springs
+        :return: the indices of the new springs
+        """
+        handles = np.asarray(handles, dtype=np.int64).reshape(-1)
+        if (self.storage.slots(handles) < 0).any():
+            raise KeyError("Spring particles must be alive")
+        count = len(handles)
+        indices = np.arange(len(self.handles), len(self.handles) + count)
+        self.handles = np.concatenate([self.handles, handles])
+        self.anchors = np.concatenate([self.anchors, np.broadcast_to(np.asarray(anchors, dtype=float), (count, 3))])
+        self.spring_constant = np.concatenate([self.spring_constant, np.broadcast_to(spring_constant, count)])
+        self.damping = np.concatenate([self.damping, np.broadcast_to(damping, count)])
+
+        self._parameters, self._parameter = np.unique(np.column_stack([self.spring_constant, self.damping]), axis=0,
+                                                      return_inverse=True)
+        self._parameter = self._parameter.reshape(-1)
+        self._duration = None
+        self._single = len(np.unique(self.handles)) == len(self.handles)
+        return indices
+
+    def factors(self, duration: float) -> np.ndarray:
+        """
+        :param duration: the duration of the step
+        :return: the factors of the starting offset and velocity of each spring in its offset after the duration, as
+        an array of shape (n, 2)
+        """
+        if duration != self._duration:
+            table = np.array([damped_spring_coefficients(float(spring_constant), float(damping), duration)
+                              for spring_constant, damping in self._parameters]).reshape(-1, 2)
+            self._factors = table.take(self._parameter, axis=0)
+            # the acceleration taking each particle to its target within the step is the offset and the velocity
+            # weighted by these
+            self._acceleration_factors = np.column_stack([(self._factors[:, 0] - 1) / duration ** 2,
+                                                          self._factors[:, 1] / duration ** 2 - 1 / duration])
+            self._duration = duration
+        return self._factors
+
+    def update_forces(self, duration: float):
+        if duration <= 0 or not len(self.handles):
+            return
+        storage = self.storage
+        self.factors(duration)
+        factors = self._acceleration_factors
+        slots = storage.slots(self.handles)
+        inverse_mass = storage.inverse_mass.take(slots)
+        keep = (slots >= 0) & (inverse_mass > 0)
+        keep &= storage.awake.take(slots)
+        if keep.all():
+            anchors = self.anchors
+        else:
+            moving = np.flatnonzero(keep)
+            slots, inverse_mass = slots.take(moving), inverse_mass.take(moving)
+            anchors, factors = self.anchors.take(moving, axis=0), factors.take(moving, axis=0)
+
+        def spring_forces(chunk: slice) -> tuple[np.ndarray, np.ndarray]:
+            chunk_slots, chunk_factors = slots[chunk], factors[chunk]
+            force = storage.position.take(chunk_slots, axis=0)
+            force -= anchors[chunk]
+            force *= chunk_factors[:, :1]
+            force += storage.velocity.take(chunk_slots, axis=0) * chunk_factors[:, 1:]
+            force /= inverse_mass[chunk, None]
+            return chunk_slots, force
+
+        if self._single:
+            # the chunks add to separate particles
+            def add_forces(chunk: slice):
+                chunk_slots, force = spring_forces(chunk)
+                storage.force_accum[chunk_slots] += force
+
+            storage.pool.map(add_forces, len(slots))
+        else:
+            size = storage.size
+            storage.force_accum[:size] += storage.pool.accumulate(spring_forces, len(slots), size)
@@ -0,0 +1,197 @@
+import numpy as np
+
+from core.particle_force_generator import ParticleBatchForceGenerator
+from core.particle_storage import ParticleStorage
+from core.vector import Vector
+
+
+class ParticleGridField:
+    """
+    A field sampled on a regular 2D or 3D grid, such as wind velocity, fluid density or the height of the water. Values
+    between grid points are interpolated linearly along each axis, and positions outside the grid take the value of the
+    nearest edge.
+
+    The field may also come from a time series of grids, such as weather or ocean data, given as an array of shape
+    (frames, *grid, channels). The series is usually memory-mapped from a .npy file with load_series, so that only the
+    frames in use are read from disk; set_time blends the two frames around the given time into values.
+
+    :param values: the value at each grid point, as an array of shape (*grid, channels)
+    :param origin: the position of the first grid point
+    :param spacing: the distance between grid points, along every axis or along each of them
+    :param axes: the world axes the grid axes follow, x, y and z being 0, 1 and 2. Defaults to (0, 1, 2) for a 3D grid
+    and to (0, 2) for a 2D grid, which lies on the XZ plane
+    """
+
+    def __init__(self, values: np.ndarray, origin: Vector = Vector.zero(), spacing: float | tuple = 1.0,
+                 axes: tuple[int, ...] = None):
+        values = np.asarray(values)
+        if values.ndim not in (3, 4):
+            raise ValueError("Field values must have the shape (*grid, channels) of a 2D or 3D grid")
+        self.dimensions = values.ndim - 1
+        self.axes = axes if axes is not None else ((0, 1, 2) if self.dimensions == 3 else (0, 2))
+        if len(self.axes) != self.dimensions:
+            raise ValueError("There must be one axis per grid dimension")
+        self.origin = np.array((origin.x, origin.y, origin.z))[list(self.axes)]
+        self.spacing = np.broadcast_to(np.asarray(spacing, dtype=float), (self.dimensions,)).copy()
+        if (self.spacing <= 0).any():
+            raise ValueError("Grid spacing must be positive")
+        self.values = values
+        self.frames: np.ndarray | None = None
+        self.frame_duration = 0.0
+
+    @property
+    def channels(self) -> int:
+        return self.values.shape[-1]
+
+    @staticmethod
+    def load_series(path: str, frame_duration: float, origin: Vector = Vector.zero(), spacing: float | tuple = 1.0,
+                    axes: tuple[int, ...] = None) -> 'ParticleGridField':
+        """
+        Memory-maps a time series of grids from a .npy file holding an array of shape (frames, *grid, channels).
+
+        :param path: the path of the file
+        :param frame_duration: the time between two frames of the series
+        :return: the field, set to the first frame
+        """
+        return ParticleGridField.from_series(np.load(path, mmap_mode='r'), frame_duration, origin, spacing, axes)
+
+    @staticmethod
+    def from_series(frames: np.ndarray, frame_duration: float, origin: Vector = Vector.zero(),
+                    spacing: float | tuple = 1.0, axes: tuple[int, ...] = None) -> 'ParticleGridField':
+        """
+        Creates a field following a time series of grids.
+
+        :param frames: the grid of each frame, as an array of shape (frames, *grid, channels)
+        :param frame_duration: the time between two frames of the series
+        :return: the field, set to the first frame
+        """
+        if frame_duration <= 0:
+            raise ValueError("Frame duration must be positive")
+        field = ParticleGridField(np.asarray(frames[0], dtype=float), origin, spacing, axes)
+        field.frames = frames
+        field.frame_duration = frame_duration
+        return field
+
+    def set_time(self, time: float):
+        """
+        Sets the values of the field to those of the time series at the given time, blending the frames around it.
+        Times past the last frame hold the last frame.
+
+        :param time: the time, 0 being the first frame
+        """
+        if self.frames is None:
+            raise ValueError("Field has no time series")
+        position = min(max(time / self.frame_duration, 0.0), len(self.frames) - 1.0)
+        first = min(int(position), len(self.frames) - 2) if len(self.frames) > 1 else 0
+        fraction = position - first
+        self.values = np.asarray(self.frames[first], dtype=float)
+        if fraction > 0:
+            self.values = self.values * (1 - fraction) + np.asarray(self.frames[first + 1], dtype=float) * fraction
+
+    def sample(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Interpolates the field at the given positions, linearly along each grid axis.
+
+        :param positions: the positions, as an array of shape (n, 3)
+        :return: the value of the field at each position, as an array of shape (n, channels)
+        """
+        shape = np.array(self.values.shape[:-1])
+        coordinates = (positions[:, list(self.axes)] - self.origin) / self.spacing
+        coordinates = np.clip(coordinates, 0, shape - 1)
+        lower = np.minimum(coordinates.astype(np.int64), np.maximum(shape - 2, 0))
+        fraction = coordinates - lower
+        upper = np.minimum(lower + 1, shape - 1)
+
+        result = np.zeros((len(positions), self.channels))
+        # add the contribution of each corner of the cell holding each position
+        for corner in range(2 ** self.dimensions):
+            weight = np.ones(len(positions))
+            index = []
+            for axis in range(self.dimensions):
+                if corner >> axis & 1:
+                    weight *= fraction[:, axis]
+                    index.append(upper[:, axis])
+                else:
+                    weight *= 1 - fraction[:, axis]
+                    index.append(lower[:, axis])
+            result += self.values[tuple(index)] * weight[:, None]
+        return result
+
+
+class ParticleFieldForceGenerator(ParticleBatchForceGenerator):
+    """
+    A batch force generator applying drag and buoyancy relative to fields that vary in space, such as the wind over a
+    region or the waves of an ocean, to every awake particle at once. Register it with ParticleForceRegistry.add_batch.
+
+    Drag is computed like in ParticleDragForceGenerator, on the velocity of each particle relative to the local wind.
+    Buoyancy pushes particles up with the weight of the liquid they displace, like ParticleBuoyancyForceGenerator, with
+    the local water height and liquid density: a particle more than max_depth above the water gets no force, and one
+    more than max_depth below it gets the full force, the force growing linearly in between.
+
+    Each field is optional: without a wind field the air is still, without a water height field there is no buoyancy,
+    and without a density field the liquid density is uniform.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param wind: the velocity of the air, a field with 3 channels
+    :param water_height: the height of the water surface, a 2D field with 1 channel
+    :param density: the density of the liquid, a field with 1 channel
+    :param k1: the velocity drag coefficient
+    :param k2: the velocity squared drag coefficient
+    :param max_depth: the submersion depth at which the buoyancy force is at its maximum
+    :param volume: the volume of each particle
+    :param liquid_density: the density of the liquid when there is no density field
+    :param gravity: the gravity acceleration in the world
+    """
+
+    def __init__(
+            self,
+            storage: ParticleStorage,
+            wind: ParticleGridField = None,
+            water_height: ParticleGridField = None,
+            density: ParticleGridField = None,
+            k1: float = 0.0,
+            k2: float = 0.0,
+            max_depth: float = 1.0,
+            volume: float = 0.0,
+            liquid_density: float = 1000.0,
+            gravity: float = 9.81,
+    ):
+        super().__init__(storage)
+        if wind is not None and wind.channels != 3:
+            raise ValueError("Wind field must have 3 channels")
+        if water_height is not None and (water_height.channels != 1 or water_height.dimensions != 2):
+            raise ValueError("Water height field must be a 2D field with 1 channel")
+        if density is not None and density.channels != 1:
+            raise ValueError("Density field must have 1 channel")
+        if max_depth <= 0:
+            raise ValueError("Maximum depth must be positive")
+        self.wind = wind
+        self.water_height = water_height
+        self.density = density
+        self.k1 = k1
+        self.k2 = k2
+        self.max_depth = max_depth
+        self.volume = volume
+        self.liquid_density = liquid_density
+        self.gravity = gravity
+
+    def update_forces(self, duration: float):
+        storage = self.storage
+        slots = storage.awake_slots()
+        positions = storage.position[slots]
+        force = np.zeros((len(slots), 3))
+
+        if self.k1 or self.k2:
+            relative_velocity = storage.velocity[slots]
+            if self.wind is not None:
+                relative_velocity = relative_velocity - self.wind.sample(positions)
+            speed = np.linalg.norm(relative_velocity, axis=1)
+            force -= relative_velocity * (self.k1 + self.k2 * speed)[:, None]
+
+        if self.water_height is not None and self.volume:
+            depth = self.water_height.sample(positions)[:, 0] - positions[:, 1]
+            submerged = np.clip((depth + self.max_depth) / (2 * self.max_depth), 0, 1)
+            density = self.density.sample(positions)[:, 0] if self.density is not None else self.liquid_density
+            force[:, 1] += density * self.volume * self.gravity * submerged
+
+        storage.force_accum[slots] += force
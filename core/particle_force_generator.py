@@ -1,8 +1,13 @@
-import numpy as np
+import functools
+import math
+from typing import TYPE_CHECKING
 
 from core.particle import Particle
 from core.vector import Vector
 
+if TYPE_CHECKING:
+    from core.particle_storage import ParticleStorage
+
 
 class ParticleForceGenerator:
     """
@@ -242,29 +247,68 @@ class ParticleFakeSpringForceGenerator(ParticleForceGenerator):
         self.damping = damping
 
     def update_force(self, particle: Particle, duration: float):
-        if particle.has_infinite_mass():
+        if particle.has_infinite_mass() or duration <= 0:
             return
 
         # relive position of the particle to the anchor
         position = particle.position - self.anchor
 
-        # calculate the constants and check whether they are in bounds
-        gamma = 0.5 * (4 * self.spring_constant - self.damping ** 2) ** 0.5
-
-        if gamma == 0:
-            return
-
-        c = position * self.damping / 2 / gamma + particle.velocity / gamma
-
         # calculate target position
-        target = position * np.cos(gamma * duration) + c * np.sin(gamma * duration)
-        target *= np.exp(-0.5 * duration * self.damping)
+        position_factor, velocity_factor = damped_spring_coefficients(self.spring_constant, self.damping, duration)
+        target = position * position_factor + particle.velocity * velocity_factor
 
         # calculate the resulting acceleration and force
-        acceleration = (target - position) / (duration ** 2) - particle.velocity * duration
+        acceleration = (target - position) / (duration ** 2) - particle.velocity / duration
         particle.add_force(acceleration * particle.mass)
 
 
+@functools.lru_cache(maxsize=256)
+def damped_spring_coefficients(spring_constant: float, damping: float, duration: float) -> tuple[float, float]:
+    """
+    Solves the motion of a damped spring x'' = -spring_constant * x - damping * x' over the given duration. Whether the
+    spring is under-damped, critically damped or over-damped, the offset after the duration is a linear combination of
+    the starting offset and velocity, whose factors only depend on the arguments and are cached.
+
+    :return: the factors of the starting offset and of the starting velocity in the offset after the duration
+    """
+    decay = math.exp(-0.5 * damping * duration)
+    discriminant = 4 * spring_constant - damping ** 2
+    if discriminant > 0:
+        # under-damped: the offset oscillates while decaying
+        gamma = 0.5 * math.sqrt(discriminant)
+        cos, sin = math.cos(gamma * duration), math.sin(gamma * duration)
+        return decay * (cos + 0.5 * damping * sin / gamma), decay * sin / gamma
+    if discriminant < 0:
+        # over-damped: gamma is imaginary, and the sine and cosine become hyperbolic
+        gamma = 0.5 * math.sqrt(-discriminant)
+        cosh, sinh = math.cosh(gamma * duration), math.sinh(gamma * duration)
+        return decay * (cosh + 0.5 * damping * sinh / gamma), decay * sinh / gamma
+    # critically damped
+    return decay * (1 + 0.5 * damping * duration), decay * duration
+
+
+class ParticleBatchForceGenerator:
+    """
+    A force generator that adds forces to many particles of a storage at once, working on the storage arrays instead of
+    on Particle objects. It is registered on its own with ParticleForceRegistry.add_batch, rather than once per particle,
+    and decides itself which particles it applies to. Particles that are not alive and awake should be left untouched,
+    so a batch force generator never wakes up a sleeping particle, even when its force changes: wake them up through
+    the awake column of the storage when needed.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    """
+
+    def __init__(self, storage: 'ParticleStorage'):
+        self.storage = storage
+
+    def update_forces(self, duration: float):
+        """
+        Calculates the forces of the particles and adds them to the force_accum column of the storage.
+        :param duration: the duration of the force applied
+        """
+        pass
+
+
 class ParticleForceRegistration:
     """
     Keeps track of one force generator and the particle it applies to
@@ -277,22 +321,122 @@ class ParticleForceRegistration:
 
 class ParticleForceRegistry:
     """
-    Holds all the force generators and the particle they apply to
+    Holds all the force generators and the particle they apply to.
+
+    Every registration gets an integer handle, which stays valid until the registration is removed. The registrations
+    are stored in dense parallel lists: removing one moves the last registration into its place, so adding and removing
+    are O(1) and update_forces never iterates over holes, however many registrations have come and gone. As a result
+    the order in which generators run is not the order in which they were added.
+
+    Batch force generators are registered on their own, and run after the generators of single particles.
 
     :param registry: the list of particle force generators
     """
 
     def __init__(self, registry: list[ParticleForceRegistration] = None):
-        self.registry = registry or []
+        self._particles: list[Particle] = []
+        self._generators: list[ParticleForceGenerator] = []
+        self._handles: list[int] = []
+        # row of each handle in the dense lists
+        self._rows: dict[int, int] = {}
+        # handles of the registrations of each particle and of each generator, dicts being used as ordered sets
+        self._by_particle: dict[Particle, dict[int, None]] = {}
+        self._by_generator: dict[ParticleForceGenerator, dict[int, None]] = {}
+        self._batches: dict[int, ParticleBatchForceGenerator] = {}
+        self._next_handle = 0
+        for registration in registry or []:
+            self.add(registration.particle, registration.particle_force_generator)
+
+    def __len__(self) -> int:
+        return len(self._handles) + len(self._batches)
+
+    @property
+    def registry(self) -> list[ParticleForceRegistration]:
+        """
+        :return: a snapshot of the registrations, in the order in which update_forces runs them
+        """
+        return [ParticleForceRegistration(particle, generator)
+                for particle, generator in zip(self._particles, self._generators)]
+
+    def items(self):
+        """
+        :return: an iterator over the (particle, force generator) pairs, in the order in which update_forces runs them
+        """
+        return zip(self._particles, self._generators)
 
-    def add(self, particle: Particle, particle_force_generator: ParticleForceGenerator):
+    def add(self, particle: Particle, particle_force_generator: ParticleForceGenerator) -> int:
         """
         Registers the given force generator to apply to the given particle.
 
         :param particle: the particle whose force should be registered
         :param particle_force_generator: the force generator to apply to the particle
+        :return: the handle of the registration
+        """
+        handle = self._next_handle
+        self._next_handle += 1
+        self._rows[handle] = len(self._handles)
+        self._particles.append(particle)
+        self._generators.append(particle_force_generator)
+        self._handles.append(handle)
+        self._by_particle.setdefault(particle, {})[handle] = None
+        self._by_generator.setdefault(particle_force_generator, {})[handle] = None
+        return handle
+
+    def add_batch(self, batch_force_generator: ParticleBatchForceGenerator) -> int:
+        """
+        Registers the given batch force generator.
+
+        :param batch_force_generator: the batch force generator
+        :return: the handle of the registration
+        """
+        handle = self._next_handle
+        self._next_handle += 1
+        self._batches[handle] = batch_force_generator
+        return handle
+
+    @property
+    def batches(self) -> list[ParticleBatchForceGenerator]:
+        """
+        :return: the registered batch force generators, in the order in which update_forces runs them
         """
-        self.registry.append(ParticleForceRegistration(particle, particle_force_generator))
+        return list(self._batches.values())
+
+    def discard(self, handle: int) -> bool:
+        """
+        Removes the registration with the given handle. If the handle is not registered, this method will have no
+        effect.
+
+        :param handle: the handle returned by add or add_batch
+        :return: True if a registration was removed, False otherwise
+        """
+        if self._batches.pop(handle, None) is not None:
+            return True
+        row = self._rows.pop(handle, None)
+        if row is None:
+            return False
+        particle = self._particles[row]
+        generator = self._generators[row]
+
+        # move the last registration into the freed row
+        last_particle = self._particles.pop()
+        last_generator = self._generators.pop()
+        last_handle = self._handles.pop()
+        if last_handle != handle:
+            self._particles[row] = last_particle
+            self._generators[row] = last_generator
+            self._handles[row] = last_handle
+            self._rows[last_handle] = row
+
+        self._unindex(self._by_particle, particle, handle)
+        self._unindex(self._by_generator, generator, handle)
+        return True
+
+    @staticmethod
+    def _unindex(index: dict, key, handle: int):
+        handles = index[key]
+        del handles[handle]
+        if not handles:
+            del index[key]
 
     def remove(self, particle: Particle, particle_force_generator: ParticleForceGenerator):
         """
@@ -303,25 +447,92 @@ class ParticleForceRegistry:
         :param particle_force_generator: the force generator to remove from the particle
 
         """
-        temp = []
-        for i in range(len(self.registry)):
-            if self.registry[i].particle == particle and self.registry[
-                i].particle_force_generator == particle_force_generator:
-                temp.append(i)
+        for handle in list(self._by_particle.get(particle, ())):
+            if self._generators[self._rows[handle]] is particle_force_generator:
+                self.discard(handle)
 
-        self.registry = temp
+    def remove_particle(self, particle: Particle) -> int:
+        """
+        Removes every force generator registered to the given particle, for example once it has been destroyed.
+
+        :param particle: the particle whose registrations should be removed
+        :return: the number of registrations removed
+        """
+        handles = list(self._by_particle.get(particle, ()))
+        for handle in handles:
+            self.discard(handle)
+        return len(handles)
+
+    def remove_generator(self, particle_force_generator: ParticleForceGenerator | ParticleBatchForceGenerator) -> int:
+        """
+        Removes the given force generator from every particle it is registered to, or the given batch force generator.
+
+        :param particle_force_generator: the force generator whose registrations should be removed
+        :return: the number of registrations removed
+        """
+        handles = list(self._by_generator.get(particle_force_generator, ()))
+        handles += [handle for handle, batch in self._batches.items() if batch is particle_force_generator]
+        for handle in handles:
+            self.discard(handle)
+        return len(handles)
 
     def clear(self):
         """
         Clears all registered force generators.
         """
-        pass
+        self._particles.clear()
+        self._generators.clear()
+        self._handles.clear()
+        self._rows.clear()
+        self._by_particle.clear()
+        self._by_generator.clear()
+        self._batches.clear()
+
+    def wake(self, handle: int) -> bool:
+        """
+        Wakes up the particle of the registration with the given handle, for example after a parameter of its force
+        generator has changed. Generators of sleeping particles are not run, so changing one does not wake its
+        particle up on its own. If the handle is not registered, this method will have no effect.
+
+        :param handle: the handle returned by add
+        :return: True if the handle is registered, False otherwise
+        """
+        row = self._rows.get(handle)
+        if row is None:
+            return False
+        particle = self._particles[row]
+        if not particle.is_awake:
+            particle.set_awake()
+        return True
+
+    def wake_generator(self, particle_force_generator: ParticleForceGenerator) -> int:
+        """
+        Wakes up every particle the given force generator is registered to, for example after moving the anchor of an
+        anchored spring.
+
+        :param particle_force_generator: the force generator whose particles should be woken up
+        :return: the number of registrations of the generator
+        """
+        handles = list(self._by_generator.get(particle_force_generator, ()))
+        for handle in handles:
+            self.wake(handle)
+        return len(handles)
 
     def update_forces(self, duration: float):
         """
-        Calls all registered force generators to update the particle forces.
+        Calls all registered force generators to update the particle forces. Generators of sleeping particles are
+        skipped, unless the generator links the particle to another one that is moving, which wakes the particle up.
+        A sleeping particle whose generator has changed in another way must be woken up with wake or wake_generator.
         :param duration: the duration of the force applied
         """
 
-        for reg in self.registry:
-            reg.particle_force_generator.update_force(reg.particle, duration)
+        for particle, generator in zip(self._particles, self._generators):
+            if not particle.is_awake:
+                other = getattr(generator, 'other', None)
+                if other is None or not other.is_moving:
+                    continue
+                particle.set_awake()
+            generator.update_force(particle, duration)
+
+        for batch in self._batches.values():
+            batch.update_forces(duration)
@@ -0,0 +1,132 @@
+from typing import Callable
+
+from core.particle_state import ParticleState
+
+# Recomputes state.force_accum for the current positions and velocities of the state
+ForceUpdate = Callable[[ParticleState], None]
+
+
+class ParticleIntegrator:
+    """
+    Advances every particle of a ParticleState forward in time in one pass over the arrays. An integrator is chosen per
+    world through ParticleWorld.integrator.
+
+    On entry state.force_accum holds the forces at the start of the step. Integrators of a higher order evaluate the
+    forces again at intermediate states through the update_forces callback, which must overwrite state.force_accum for
+    the positions and velocities currently held by the state. Like Particle.integrate, the accumulated forces are
+    cleared once the step is done, and damping is applied to the final velocity.
+
+    :param order: the order of accuracy of the integrator, used to scale error estimates
+    :param pointwise: whether each particle is advanced from its own state only, without evaluating the forces again,
+    so that the rows of the state can be integrated in separate chunks
+    """
+
+    order = 1
+    pointwise = False
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        """
+        Integrates the state forward in time by the given duration.
+
+        :param state: the particles to integrate, updated in place
+        :param duration: the time step of the integration
+        :param update_forces: recomputes the forces of the state at its current positions and velocities
+        """
+        pass
+
+    @staticmethod
+    def _finish(state: ParticleState, duration: float):
+        """
+        Imposes drag on the velocities and clears the forces, as done at the end of Particle.integrate.
+        """
+        state.velocity *= (state.damping ** duration)[:, None]
+        state.force_accum[:] = 0
+
+
+class ParticleEulerIntegrator(ParticleIntegrator):
+    """
+    First-order explicit Euler integration, the array version of Particle.integrate. The position is moved with the
+    velocity at the start of the step, which makes stiff systems gain energy unless the step is very small.
+    """
+
+    pointwise = True
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        acceleration = state.total_acceleration()
+        state.position += state.velocity * duration
+        state.velocity += acceleration * duration
+        self._finish(state, duration)
+
+
+class ParticleSemiImplicitEulerIntegrator(ParticleIntegrator):
+    """
+    First-order semi-implicit (symplectic) Euler integration. The velocity is updated first and the position is moved
+    with the new velocity, which keeps the energy of oscillating systems bounded at the same cost as explicit Euler.
+    """
+
+    pointwise = True
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        state.velocity += state.total_acceleration() * duration
+        self._finish(state, duration)
+        state.position += state.velocity * duration
+
+
+class ParticleVelocityVerletIntegrator(ParticleIntegrator):
+    """
+    Second-order velocity Verlet integration, in its kick-drift-kick (leapfrog) form. The forces are evaluated once more
+    per step, at the new positions. It is symplectic and time reversible, so orbits and spring networks keep their
+    energy over long runs.
+    """
+
+    order = 2
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        half_step = 0.5 * duration
+        state.velocity += state.total_acceleration() * half_step
+        state.position += state.velocity * duration
+
+        update_forces(state)
+        state.velocity += state.total_acceleration() * half_step
+        self._finish(state, duration)
+
+
+class ParticleRK4Integrator(ParticleIntegrator):
+    """
+    Fourth-order Runge-Kutta integration. The forces are evaluated three more times per step, at intermediate states.
+    It is the most accurate choice for systems driven only by force generators, such as gravitating bodies. Contacts
+    change velocities instantaneously between steps, which breaks its smoothness assumptions.
+    """
+
+    order = 4
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        half_step = 0.5 * duration
+        position = state.position.copy()
+        velocity = state.velocity.copy()
+
+        k1_position = velocity
+        k1_velocity = state.total_acceleration()
+
+        state.position[:] = position + k1_position * half_step
+        state.velocity[:] = velocity + k1_velocity * half_step
+        update_forces(state)
+        k2_position = state.velocity.copy()
+        k2_velocity = state.total_acceleration()
+
+        state.position[:] = position + k2_position * half_step
+        state.velocity[:] = velocity + k2_velocity * half_step
+        update_forces(state)
+        k3_position = state.velocity.copy()
+        k3_velocity = state.total_acceleration()
+
+        state.position[:] = position + k3_position * duration
+        state.velocity[:] = velocity + k3_velocity * duration
+        update_forces(state)
+        k4_position = state.velocity.copy()
+        k4_velocity = state.total_acceleration()
+
+        sixth_step = duration / 6
+        state.position[:] = position + (k1_position + 2 * (k2_position + k3_position) + k4_position) * sixth_step
+        state.velocity[:] = velocity + (k1_velocity + 2 * (k2_velocity + k3_velocity) + k4_velocity) * sixth_step
+        self._finish(state, duration)
@@ -1,11 +1,12 @@
 from core.particle import Particle
-from core.particle_contact import ParticleContact
+from core.particle_contact import ParticleContact, ParticleContactGenerator
 
 
-class ParticleLink:
+class ParticleLink(ParticleContactGenerator):
     """
     Links connect two particles together, generating a contact if they violate the constraints of the link. It is used
     as a base class for cables and rods, and could be used as a base class for springs with a limit to their externsion.
+    Links are contact generators, so they can be added to the contact generators of a world.
 
     :param particles: holds the pair of particles that are connected by this link
     """
@@ -24,6 +25,29 @@ class ParticleLink:
         relative_position = particle_a.position - particle_b.position
         return relative_position.magnitude()
 
+    def add_contact(self, contact: ParticleContact, limit: int) -> int:
+        """
+        Fills the given contact with the contact of the link. A link between two sleeping particles is skipped, and a
+        sleeping particle is woken up when the particle at the other end of the link moves.
+        """
+        particle_a, particle_b = self.particles
+        if not particle_a.is_awake and not particle_b.is_awake:
+            return 0
+        if not particle_a.is_awake and particle_b.is_moving:
+            particle_a.set_awake()
+        elif not particle_b.is_awake and particle_a.is_moving:
+            particle_b.set_awake()
+        return self.fill_contact(contact, limit)
+
+    def count_contacts(self) -> int:
+        """
+        Fills a scratch contact instead of a contact of the world, and wakes no particle up.
+        """
+        particle_a, particle_b = self.particles
+        if not particle_a.is_awake and not particle_b.is_awake:
+            return 0
+        return self.fill_contact(ParticleContact(), 1)
+
     def fill_contact(self, contact: ParticleContact, limit: float) -> int:
         """
         Fills the given contact structure wth the contact needed to keep th link from violating its constraint. The
@@ -69,7 +93,7 @@ class ParticleCable(ParticleLink):
 
         # Calculate the normal
         normal = particle_b.position - particle_a.position
-        normal.normalize()
+        normal = normal.normalize()
         contact.contact_normal = normal
 
         contact.penetration = length - self.max_length
@@ -106,7 +130,7 @@ class ParticleRod(ParticleLink):
 
         # Calculate the normal
         normal = particle_b.position - particle_a.position
-        normal.normalize()
+        normal = normal.normalize()
 
         # The contact normal depends on whether we're extending or compressing
         if current_length > self.length:
@@ -0,0 +1,322 @@
+import os
+
+import numpy as np
+
+from core.particle_static_contact import ParticleStaticContactGenerator
+from core.particle_storage import ParticleStorage
+
+
+class ParticleTriangleMesh:
+    """
+    A static triangle mesh, such as the geometry of a level.
+
+    :param vertices: the positions of the vertices, as an array of shape (v, 3)
+    :param triangles: the indices of the three vertices of each triangle, as an array of shape (t, 3). Triangles of
+    zero area are dropped, as they cannot be collided with
+    """
+
+    def __init__(self, vertices: np.ndarray, triangles: np.ndarray):
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        if len(triangles) and (triangles.min() < 0 or triangles.max() >= len(vertices)):
+            raise ValueError("Triangle refers to a vertex that does not exist")
+        a, b, c = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+        area = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+        self.vertices = vertices
+        self.triangles = triangles[area > 0]
+
+    def __len__(self) -> int:
+        return len(self.triangles)
+
+    def corners(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: the positions of the first, second and third vertex of every triangle, as arrays of shape (t, 3)
+        """
+        return tuple(self.vertices[self.triangles[:, i]] for i in range(3))
+
+    @staticmethod
+    def load(path: str) -> 'ParticleTriangleMesh':
+        """
+        Loads a mesh from a file: a Wavefront .obj file, whose polygons are split into triangles, or a .npz file
+        holding `vertices` and `triangles` arrays, as written by save.
+
+        :param path: the path of the file
+        :return: the mesh
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.npz':
+            with np.load(path) as data:
+                return ParticleTriangleMesh(data['vertices'], data['triangles'])
+        if extension == '.obj':
+            return ParticleTriangleMesh._load_obj(path)
+        raise ValueError(f"Unsupported mesh file type: {extension}")
+
+    @staticmethod
+    def _load_obj(path: str) -> 'ParticleTriangleMesh':
+        vertices = []
+        triangles = []
+        with open(path) as file:
+            for line in file:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == 'v':
+                    vertices.append([float(value) for value in fields[1:4]])
+                elif fields[0] == 'f':
+                    # vertices are given as v, v/vt, v//vn or v/vt/vn, counted from 1, or from the end if negative
+                    polygon = []
+                    for field in fields[1:]:
+                        index = int(field.split('/')[0])
+                        polygon.append(index - 1 if index > 0 else len(vertices) + index)
+                    for i in range(1, len(polygon) - 1):
+                        triangles.append((polygon[0], polygon[i], polygon[i + 1]))
+        return ParticleTriangleMesh(np.array(vertices).reshape(-1, 3), np.array(triangles).reshape(-1, 3))
+
+    def save(self, path: str):
+        """
+        Saves the mesh to a .npz file, which loads faster than a text format.
+
+        :param path: the path of the file
+        """
+        np.savez(path, vertices=self.vertices, triangles=self.triangles)
+
+
+class ParticleMeshBVH:
+    """
+    A bounding volume hierarchy over the triangles of a static mesh: a binary tree of axis-aligned boxes, each bounding
+    the triangles below it. It is built once, by splitting the triangles at the median of their centroids along the
+    longest axis, and stored in flat arrays.
+
+    Queries are batched: many boxes descend the tree together, one level per array operation.
+
+    :param mesh: the mesh
+    :param leaf_size: the largest number of triangles in a leaf
+    """
+
+    def __init__(self, mesh: ParticleTriangleMesh, leaf_size: int = 4):
+        if leaf_size < 1:
+            raise ValueError("Leaves must hold at least one triangle")
+        a, b, c = mesh.corners()
+        triangle_min = np.minimum(np.minimum(a, b), c)
+        triangle_max = np.maximum(np.maximum(a, b), c)
+        centroids = (a + b + c) / 3
+
+        order = np.arange(len(mesh))
+        node_min, node_max, children, start, count = [], [], [], [], []
+
+        def add_node(first: int, end: int) -> int:
+            node_min.append(None)
+            node_max.append(None)
+            children.append((-1, -1))
+            start.append(first)
+            count.append(end - first)
+            return len(start) - 1
+
+        pending = [add_node(0, len(order))] if len(order) else []
+        while pending:
+            node = pending.pop()
+            first, end = start[node], start[node] + count[node]
+            triangles = order[first:end]
+            node_min[node] = triangle_min[triangles].min(axis=0)
+            node_max[node] = triangle_max[triangles].max(axis=0)
+            if end - first <= leaf_size:
+                continue
+
+            extent = centroids[triangles].max(axis=0) - centroids[triangles].min(axis=0)
+            axis = int(np.argmax(extent))
+            middle = (end - first) // 2
+            order[first:end] = triangles[np.argpartition(centroids[triangles, axis], middle)]
+            children[node] = add_node(first, first + middle), add_node(first + middle, end)
+            pending.extend(children[node])
+
+        self.node_min = np.array(node_min).reshape(-1, 3)
+        self.node_max = np.array(node_max).reshape(-1, 3)
+        self.children = np.array(children, dtype=np.int64).reshape(-1, 2)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+        self.order = order
+        # the corners and the bounding boxes of the triangles, in the order of the leaves
+        self.a, self.b, self.c = a[order], b[order], c[order]
+        self.triangle_min, self.triangle_max = triangle_min[order], triangle_max[order]
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def query(self, minimum: np.ndarray, maximum: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the triangles whose bounding box overlaps each of the given boxes.
+
+        :param minimum: the lowest corner of each box, as an array of shape (q, 3)
+        :param maximum: the highest corner of each box, as an array of shape (q, 3)
+        :return: the index of the box and the index of the triangle, in the order of the leaves, of every overlap
+        """
+        boxes = np.arange(len(minimum))
+        nodes = np.zeros(len(minimum), dtype=np.int64)
+        if len(self) == 0:
+            boxes = nodes = nodes[:0]
+
+        found_boxes, found_triangles = [], []
+        while len(boxes):
+            overlap = ((minimum[boxes] <= self.node_max[nodes]) & (maximum[boxes] >= self.node_min[nodes])).all(axis=1)
+            boxes, nodes = boxes[overlap], nodes[overlap]
+            leaf = self.children[nodes, 0] < 0
+
+            # every triangle of an overlapped leaf is a candidate
+            leaf_boxes, leaf_nodes = boxes[leaf], nodes[leaf]
+            counts = self.count[leaf_nodes]
+            first = np.repeat(self.start[leaf_nodes], counts)
+            position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            found_boxes.append(np.repeat(leaf_boxes, counts))
+            found_triangles.append(first + position)
+
+            # the overlapped inner nodes are replaced by their children
+            boxes = np.repeat(boxes[~leaf], 2)
+            nodes = self.children[nodes[~leaf]].reshape(-1)
+
+        if not found_boxes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        boxes, triangles = np.concatenate(found_boxes), np.concatenate(found_triangles)
+        overlap = ((minimum[boxes] <= self.triangle_max[triangles])
+                   & (maximum[boxes] >= self.triangle_min[triangles])).all(axis=1)
+        return boxes[overlap], triangles[overlap]
+
+
+def closest_points_on_triangles(points: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Finds the closest point to each point on the matching triangle, by checking which of the vertex, edge and face
+    regions of the triangle the point projects into.
+
+    :param points: the points, as an array of shape (n, 3)
+    :param a: the first vertex of each triangle, as an array of shape (n, 3)
+    :param b: the second vertex of each triangle
+    :param c: the third vertex of each triangle
+    :return: the closest points, as an array of shape (n, 3)
+    """
+    def dot(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return np.einsum('ij,ij->i', u, v)
+
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        on_ab = d1 / (d1 - d3)
+        on_ac = d2 / (d2 - d6)
+        on_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        total = va + vb + vc
+        v, w = vb / total, vc / total
+
+    # the regions are tested in order, the first one matching wins
+    regions = [
+        (d1 <= 0) & (d2 <= 0),
+        (d3 >= 0) & (d4 <= d3),
+        (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+        (d6 >= 0) & (d5 <= d6),
+        (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+        (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+    ]
+    closest = [
+        a,
+        b,
+        a + ab * on_ab[:, None],
+        c,
+        a + ac * on_ac[:, None],
+        b + (c - b) * on_bc[:, None],
+    ]
+    face = a + ab * v[:, None] + ac * w[:, None]
+    return np.select([region[:, None] for region in regions], closest, face)
+
+
+class ParticleMeshContactGenerator(ParticleStaticContactGenerator):
+    """
+    Generates the contacts between the particles of a world and a static triangle mesh. A particle collides with the
+    mesh when it is closer to a triangle than its radius plus the thickness of the mesh, and is pushed away from the
+    closest point of the closest triangle: triangles have no inside, so particles are kept off both of their sides.
+
+    The triangles near each particle are found with a bounding volume hierarchy, built once when the generator is
+    created, so the cost of a frame grows with the number of particles near the mesh rather than with the number of
+    triangles. Each particle reports at most one contact, with the triangle it penetrates most.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param mesh: the mesh, which must not change once given
+    :param restitution: the coefficient of restitution of contacts with the mesh
+    :param thickness: added to the radius of the particles, so that particles of zero radius can collide
+    :param leaf_size: the largest number of triangles in a leaf of the hierarchy
+    :param continuous: whether fast particles are swept against the mesh, see ParticleStaticContactGenerator
+    """
+
+    def __init__(self, storage: ParticleStorage, mesh: ParticleTriangleMesh, restitution: float = 0.0,
+                 thickness: float = 0.0, leaf_size: int = 4, continuous: bool = False):
+        super().__init__(storage, thickness, continuous)
+        self.mesh = mesh
+        self.bvh = ParticleMeshBVH(mesh, leaf_size)
+        self.restitution = restitution
+        # the normal of each triangle, in the order of the leaves, used when a particle lies on a triangle
+        normals = np.cross(self.bvh.b - self.bvh.a, self.bvh.c - self.bvh.a)
+        self.normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+
+    def find_contacts(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        storage = self.storage
+        slots = self.testing_slots()
+        positions = storage.position[slots]
+        reach = self.reach(slots)
+        particles, triangles = self.bvh.query(positions - reach[:, None], positions + reach[:, None])
+
+        points = positions[particles]
+        bvh = self.bvh
+        offsets = points - closest_points_on_triangles(points, bvh.a[triangles], bvh.b[triangles], bvh.c[triangles])
+        distances = np.linalg.norm(offsets, axis=1)
+        depths = reach[particles] - distances
+        touching = depths > 0
+        particles, triangles = particles[touching], triangles[touching]
+        offsets, distances, depths = offsets[touching], distances[touching], depths[touching]
+
+        # keep the deepest contact of each particle
+        deepest = np.lexsort((-depths, particles))
+        deepest = deepest[np.r_[True, particles[deepest][1:] != particles[deepest][:-1]]] if len(deepest) else deepest
+        offsets, distances, depths = offsets[deepest], distances[deepest], depths[deepest]
+
+        normals = self.normals[triangles[deepest]]
+        on_triangle = distances <= 1e-12
+        normals[~on_triangle] = offsets[~on_triangle] / distances[~on_triangle, None]
+        return slots[particles[deepest]], normals, depths, np.full(len(depths), self.restitution)
+
+    def sweep(self, slots: np.ndarray, start: np.ndarray,
+              end: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the first triangle each particle passes through. A particle hits a triangle when its motion crosses the
+        plane of the triangle within its reach of the triangle, and the time of impact is when it came within its reach
+        of that plane. This treats the particle as a point against the edges of the triangles, which errs on the side
+        of a later impact there.
+        """
+        reach = self.reach(slots)
+        bvh = self.bvh
+        rows, triangles = bvh.query(np.minimum(start, end) - reach[:, None], np.maximum(start, end) + reach[:, None])
+
+        normals = self.normals[triangles]
+        start_side = np.einsum('ij,ij->i', start[rows] - bvh.a[triangles], normals)
+        end_side = np.einsum('ij,ij->i', end[rows] - bvh.a[triangles], normals)
+        crossing = (start_side != 0) & (np.sign(start_side) != np.sign(end_side))
+        rows, triangles, normals = rows[crossing], triangles[crossing], normals[crossing]
+        start_side, end_side = start_side[crossing], end_side[crossing]
+
+        # where the motion crosses the plane of the triangle, which must be within reach of the triangle itself
+        fraction = start_side / (start_side - end_side)
+        points = start[rows] + (end[rows] - start[rows]) * fraction[:, None]
+        closest = closest_points_on_triangles(points, bvh.a[triangles], bvh.b[triangles], bvh.c[triangles])
+        inside = np.linalg.norm(points - closest, axis=1) <= reach[rows]
+        rows, triangles, normals = rows[inside], triangles[inside], normals[inside]
+        start_side, end_side = start_side[inside], end_side[inside]
+
+        # the particle is pushed back to the side it came from, and hits when it comes within reach of the plane
+        side = np.sign(start_side)
+        times = np.clip((np.abs(start_side) - reach[rows]) / (np.abs(start_side) + side * -end_side), 0, 1)
+        first = np.lexsort((times, rows))
+        first = first[np.r_[True, rows[first][1:] != rows[first][:-1]]] if len(first) else first
+        return (rows[first], times[first], normals[first] * side[first, None],
+                np.full(len(first), self.restitution))
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+
+from core.particle_force_generator import ParticleBatchForceGenerator
+from core.particle_storage import ParticleStorage
+from core.vector import Vector
+
+
+class ParticleMeshGravityForceGenerator(ParticleBatchForceGenerator):
+    """
+    A batch force generator applying the mutual gravitation of all the particles of a storage with the particle-mesh
+    method, as an alternative to registering a ParticleGravitationalForceGenerator for every pair of particles. Its cost
+    grows as O(n + m log m) for n particles on a grid of m cells, instead of O(n^2).
+
+    The particles live in a periodic box, split into a cubic grid of cells. Each step:
+
+    - the mass of every particle is deposited onto the 8 grid points around it with cloud-in-cell weights
+    - Poisson's equation for the potential of the resulting density is solved with fast Fourier transforms
+    - the gravitational field is the finite difference gradient of the potential
+    - the field is interpolated back to every particle with the same weights, so that a particle exerts no force on
+      itself and the forces between two particles are equal and opposite
+
+    Forces are smoothed over about two cells, so the grid should be fine enough for the distances of interest. Particles
+    of infinite mass are ignored, and only particles that are awake are pushed, though sleeping particles still attract.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param box_size: the size of the periodic box
+    :param cells: the number of cells along each side of the box
+    :param gravitational_constant: the gravitational constant
+    :param origin: the lowest corner of the box
+    """
+
+    def __init__(self, storage: ParticleStorage, box_size: float, cells: int, gravitational_constant: float,
+                 origin: Vector = Vector.zero()):
+        super().__init__(storage)
+        if box_size <= 0 or cells < 2:
+            raise ValueError("Box size must be positive and the grid must have at least 2 cells per side")
+        self.box_size = box_size
+        self.cells = cells
+        self.gravitational_constant = gravitational_constant
+        self.origin = np.array((origin.x, origin.y, origin.z))
+        self.cell_size = box_size / cells
+
+        # -4 pi G / k^2 for the discrete Laplacian of every mode of the real FFT of the grid, zero for the mean density
+        k = 2 * np.pi * np.fft.fftfreq(cells, self.cell_size)
+        k_last = 2 * np.pi * np.fft.rfftfreq(cells, self.cell_size)
+        laplacian = [(2 * np.sin(axis * self.cell_size / 2) / self.cell_size) ** 2 for axis in (k, k, k_last)]
+        k_squared = laplacian[0][:, None, None] + laplacian[1][None, :, None] + laplacian[2][None, None, :]
+        k_squared[0, 0, 0] = 1
+        self._green = -4 * math.pi * gravitational_constant / k_squared
+        self._green[0, 0, 0] = 0
+
+    def _weights(self, positions: np.ndarray) -> tuple[list[np.ndarray], list[np.ndarray]]:
+        """
+        Computes the cloud-in-cell weights of the given positions.
+
+        :return: the flat index of each of the 8 grid points around every position, and the weight of each
+        """
+        n = self.cells
+        coordinates = (positions - self.origin) / self.cell_size
+        lower = np.floor(coordinates)
+        fraction = coordinates - lower
+        lower = lower.astype(np.int64) % n
+        upper = (lower + 1) % n
+
+        indices, weights = [], []
+        for corner in range(8):
+            index = np.zeros(len(positions), dtype=np.int64)
+            weight = np.ones(len(positions))
+            for axis in range(3):
+                if corner >> axis & 1:
+                    index = index * n + upper[:, axis]
+                    weight *= fraction[:, axis]
+                else:
+                    index = index * n + lower[:, axis]
+                    weight *= 1 - fraction[:, axis]
+            indices.append(index)
+            weights.append(weight)
+        return indices, weights
+
+    def potential(self, positions: np.ndarray, masses: np.ndarray) -> np.ndarray:
+        """
+        Deposits the given masses onto the grid and solves for the gravitational potential.
+
+        :param positions: the positions of the masses, as an array of shape (n, 3)
+        :param masses: the masses
+        :return: the potential at every grid point, as an array of shape (cells, cells, cells)
+        """
+        return self._solve(*self._weights(positions), masses)
+
+    def _solve(self, indices: list[np.ndarray], weights: list[np.ndarray], masses: np.ndarray) -> np.ndarray:
+        """
+        Solves for the potential of masses whose cloud-in-cell weights are given.
+        """
+        n = self.cells
+        mass = np.zeros(n ** 3)
+        for index, weight in zip(indices, weights):
+            mass += np.bincount(index, weight * masses, minlength=n ** 3)
+        density = mass.reshape(n, n, n) / self.cell_size ** 3
+        return np.fft.irfftn(np.fft.rfftn(density) * self._green, s=density.shape, axes=(0, 1, 2))
+
+    def field(self, potential: np.ndarray) -> list[np.ndarray]:
+        """
+        :param potential: the potential at every grid point
+        :return: each component of the gravitational field at every grid point, as flat arrays of cells ** 3 values
+        """
+        return [(np.roll(potential, 1, axis) - np.roll(potential, -1, axis)).ravel() / (2 * self.cell_size)
+                for axis in range(3)]
+
+    def update_forces(self, duration: float):
+        storage = self.storage
+        slots = storage.live_slots()
+        slots = slots[storage.inverse_mass[slots] > 0]
+        if len(slots) == 0:
+            return
+        positions = storage.position[slots]
+        masses = 1 / storage.inverse_mass[slots]
+        indices, weights = self._weights(positions)
+        field = self.field(self._solve(indices, weights, masses))
+
+        awake = storage.awake[slots]
+        if not awake.all():
+            slots, masses = slots[awake], masses[awake]
+            indices, weights = [index[awake] for index in indices], [weight[awake] for weight in weights]
+        force = np.zeros((len(slots), 3))
+        for axis, component in enumerate(field):
+            for index, weight in zip(indices, weights):
+                force[:, axis] += component.take(index) * weight
+        storage.force_accum[slots] += force * masses[:, None]
@@ -0,0 +1,226 @@
+import itertools
+
+import numpy as np
+
+from core.particle_array_contact import ParticleArrayContactGenerator
+from core.particle_contact import ParticleContact
+from core.particle_storage import ParticleStorage
+
+# Offsets from a cell to the neighbouring cells that come after it, so that each pair of neighbouring cells is visited
+# once. The cell itself comes first
+HALF_NEIGHBOURHOOD = [(0, 0, 0)] + [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)]
+
+
+class ParticleSpatialGrid:
+    """
+    A uniform grid of cubic cells used to find the pairs of points closer than a given distance. The points are sorted
+    by cell, and every cell is matched with itself and its neighbouring cells, all cells at once, so finding the pairs
+    costs O(n log n) rather than O(n^2).
+
+    :param cell_size: the size of the cells, at least the largest distance queried
+    """
+
+    def __init__(self, cell_size: float):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive")
+        self.cell_size = cell_size
+        self.order = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self._strides = np.zeros(3, dtype=np.int64)
+
+    def build(self, positions: np.ndarray):
+        """
+        Sorts the points by cell.
+
+        :param positions: the points, as an array of shape (n, 3)
+        """
+        cells = np.floor(positions / self.cell_size).astype(np.int64)
+        if len(cells):
+            # pad the grid by one cell on each side, so that the neighbours of every cell have a valid key
+            cells -= cells.min(axis=0) - 1
+            extent = cells.max(axis=0) + 2
+            self._strides = np.array((extent[1] * extent[2], extent[2], 1), dtype=np.int64)
+        keys = cells @ self._strides
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def pairs(self, positions: np.ndarray, distance: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the pairs of points closer than the given distance. The grid must have been built with the same points.
+
+        :param positions: the points, as an array of shape (n, 3)
+        :param distance: the largest distance between the points of a pair, at most the cell size
+        :return: the indices of the first and of the second point of each pair, each pair being reported once
+        """
+        if distance > self.cell_size:
+            raise ValueError("Distance cannot exceed the cell size")
+        first, second = [], []
+        sorted_rows = np.arange(len(self.keys))
+        for offset in HALF_NEIGHBOURHOOD:
+            neighbour_keys = self.keys + np.dot(offset, self._strides)
+            start = np.searchsorted(self.keys, neighbour_keys, side='left')
+            end = np.searchsorted(self.keys, neighbour_keys, side='right')
+            if offset == (0, 0, 0):
+                # within a cell, only pair each point with the points sorted after it
+                start = sorted_rows + 1
+            counts = np.maximum(end - start, 0)
+            rows = np.repeat(sorted_rows, counts)
+            neighbours = np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                                                        counts)
+            first.append(self.order[rows])
+            second.append(self.order[neighbours])
+
+        first, second = np.concatenate(first), np.concatenate(second)
+        delta = positions.take(first, axis=0) - positions.take(second, axis=0)
+        close = np.flatnonzero(np.einsum('ij,ij->i', delta, delta) < distance ** 2)
+        return first.take(close), second.take(close)
+
+
+class ParticleNeighbourList:
+    """
+    A Verlet neighbour list: caches the pairs of particles closer than cutoff + skin, so that short-range interactions
+    find their pairs without a broad phase every step. Particles move little between steps, so the pairs closer than
+    cutoff remain among the cached pairs until some particle has moved more than skin / 2 since the list was built;
+    update then rebuilds the list. It is also rebuilt when particles are spawned, despawned or moved to other slots.
+
+    Generators read the pairs after calling update, either all the candidate pairs with pairs or only those closer
+    than cutoff with close_pairs.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param cutoff: the largest distance at which particles interact
+    :param skin: the extra distance kept in the list, trading larger lists for fewer rebuilds
+    """
+
+    def __init__(self, storage: ParticleStorage, cutoff: float, skin: float):
+        if cutoff <= 0 or skin < 0:
+            raise ValueError("Cutoff must be positive and skin cannot be negative")
+        self.storage = storage
+        self.cutoff = cutoff
+        self.skin = skin
+        self.grid = ParticleSpatialGrid(cutoff + skin)
+        self.builds = 0
+        self.first = np.zeros(0, dtype=np.int64)
+        self.second = np.zeros(0, dtype=np.int64)
+        # the slots and handles of the particles, and their positions, when the list was built
+        self._slots = np.zeros(0, dtype=np.int64)
+        self._handles = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros((0, 3))
+        self._version = -1
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    def needs_rebuild(self) -> bool:
+        """
+        :return: True if some pair closer than cutoff may be missing from the list
+        """
+        storage = self.storage
+        slots = storage.live_slots()
+        if (storage.version != self._version or not np.array_equal(slots, self._slots)
+                or not np.array_equal(storage.slot_handle[slots], self._handles)):
+            return True
+        moved = storage.position[slots] - self._positions
+        return len(slots) > 0 and np.einsum('ij,ij->i', moved, moved).max() > (self.skin / 2) ** 2
+
+    def update(self) -> bool:
+        """
+        Rebuilds the list if needed.
+
+        :return: True if the list was rebuilt
+        """
+        if not self.needs_rebuild():
+            return False
+        self.rebuild()
+        return True
+
+    def rebuild(self):
+        """
+        Rebuilds the list from the current positions of the particles.
+        """
+        storage = self.storage
+        self._slots = storage.live_slots()
+        self._handles = storage.slot_handle[self._slots]
+        self._positions = storage.position[self._slots]
+        self._version = storage.version
+        self.grid.build(self._positions)
+        first, second = self.grid.pairs(self._positions, self.cutoff + self.skin)
+        self.first, self.second = self._slots[first], self._slots[second]
+        self.builds += 1
+
+    def pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the slots of the first and of the second particle of every cached pair
+        """
+        return self.first, self.second
+
+    def close_pairs(self, cutoff: float = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the cached pairs whose particles are closer than the cutoff at their current positions.
+
+        :param cutoff: the largest distance, at most the cutoff of the list. Defaults to the cutoff of the list
+        :return: the slots of the first and of the second particle of each pair, the offset from the second to the first
+        as an array of shape (n, 3) and the distance between them
+        """
+        cutoff = self.cutoff if cutoff is None else cutoff
+        positions = self.storage.position
+
+        def close_chunk(chunk: slice) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+            first, second = self.first[chunk], self.second[chunk]
+            # take is much faster than fancy indexing for selecting the rows of these large arrays
+            delta = positions.take(first, axis=0) - positions.take(second, axis=0)
+            distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+            close = np.flatnonzero(distance < cutoff)
+            return first.take(close), second.take(close), delta.take(close, axis=0), distance.take(close)
+
+        chunks = self.storage.pool.map(close_chunk, len(self.first))
+        if len(chunks) == 1:
+            return chunks[0]
+        return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
+
+
+class ParticleCollisionContactGenerator(ParticleArrayContactGenerator):
+    """
+    Generates the contacts between particles whose spheres overlap, finding the candidate pairs with a neighbour list.
+    The cutoff of the list must be at least the largest sum of the radii of two particles. Pairs of sleeping particles
+    are skipped.
+
+    :param neighbours: the neighbour list of the particles
+    :param restitution: the coefficient of restitution of the contacts
+    """
+
+    def __init__(self, neighbours: ParticleNeighbourList, restitution: float = 0.0):
+        super().__init__(neighbours.storage)
+        self.neighbours = neighbours
+        self.restitution = restitution
+
+    def find_contacts(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: the slots of the first and of the second particle of each contact, its normal, pointing towards the
+        first particle, and its penetration
+        """
+        neighbours = self.neighbours
+        neighbours.update()
+        storage = neighbours.storage
+        first, second, delta, distance = neighbours.close_pairs()
+        depth = storage.radius[first] + storage.radius[second] - distance
+        touching = (depth > 0) & (storage.awake[first] | storage.awake[second])
+        first, second, delta, distance, depth = (first[touching], second[touching], delta[touching],
+                                                 distance[touching], depth[touching])
+        # particles at the same position are pushed apart along an arbitrary axis
+        normal = np.tile((1.0, 0.0, 0.0), (len(first), 1))
+        apart = distance > 0
+        normal[apart] = delta[apart] / distance[apart, None]
+        return first, second, normal, depth
+
+    def add_contacts(self, contacts: list[ParticleContact], index: int, limit: int) -> int:
+        """
+        Fills the contacts of the list, from the given index, with the overlapping pairs. When there are more contacts
+        than the limit, the deepest ones are kept.
+        """
+        if limit <= 0:
+            return 0
+        first, second, normals, depths = self.find_contacts()
+        return self.fill_contacts(contacts, index, limit, first, second, normals, depths, self.restitution)
+
+    def count_contacts(self) -> int:
+        return len(self.find_contacts()[0])
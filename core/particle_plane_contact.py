@@ -0,0 +1,103 @@
+import numpy as np
+
+from core.particle_static_contact import ParticleStaticContactGenerator
+from core.particle_storage import ParticleStorage
+from core.vector import Vector
+
+
+class ParticlePlaneContactGenerator(ParticleStaticContactGenerator):
+    """
+    Generates the contacts between the particles of a world and a set of half-spaces, such as floors, walls and the
+    sides of a container box. Every particle is tested against every plane in a single array operation, and a contact
+    is reported for each particle penetrating a plane, taking its radius into account.
+
+    A plane is given by its normal n and offset d: the solid side holds the points p with p . n < d, and particles are
+    pushed back along n.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param continuous: whether fast particles are swept against the planes, see ParticleStaticContactGenerator
+    """
+
+    def __init__(self, storage: ParticleStorage, continuous: bool = False):
+        super().__init__(storage, continuous=continuous)
+        self.normals = np.zeros((0, 3))
+        self.offsets = np.zeros(0)
+        self.restitutions = np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add_plane(self, normal: Vector, offset: float, restitution: float = 0.0):
+        """
+        Adds a half-space to the generator.
+
+        :param normal: the direction particles are pushed back in, normalized by this method
+        :param offset: the distance of the plane from the origin along the normal
+        :param restitution: the coefficient of restitution of contacts with this plane
+        """
+        magnitude = normal.magnitude()
+        if magnitude == 0:
+            raise ValueError("Plane normal cannot be zero")
+        self.normals = np.vstack([self.normals, (normal.x / magnitude, normal.y / magnitude, normal.z / magnitude)])
+        self.offsets = np.append(self.offsets, offset / magnitude)
+        self.restitutions = np.append(self.restitutions, restitution)
+
+    def add_box(self, minimum: Vector, maximum: Vector, restitution: float = 0.0):
+        """
+        Adds the six walls of an axis-aligned box that keeps the particles inside it.
+
+        :param minimum: the corner of the box with the lowest coordinates
+        :param maximum: the corner of the box with the highest coordinates
+        :param restitution: the coefficient of restitution of contacts with the walls
+        """
+        if minimum.x > maximum.x or minimum.y > maximum.y or minimum.z > maximum.z:
+            raise ValueError("Box minimum must not exceed its maximum")
+        for axis, low, high in ((Vector(1, 0, 0), minimum.x, maximum.x),
+                                (Vector(0, 1, 0), minimum.y, maximum.y),
+                                (Vector(0, 0, 1), minimum.z, maximum.z)):
+            self.add_plane(axis, low, restitution)
+            self.add_plane(-axis, -high, restitution)
+
+    def penetrations(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the particles penetrating a plane.
+
+        :return: the slot of each penetrating particle, the plane it penetrates and the depth of the penetration, in
+        increasing slot order. A particle penetrating several planes is listed once per plane
+        """
+        storage = self.storage
+        testing = self.testing_slots()
+        if len(testing) == 0 or len(self.offsets) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        def penetrating(chunk: slice) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+            slots = testing[chunk]
+            depth = self.offsets + self.reach(slots)[:, None] - storage.position.take(slots, axis=0) @ self.normals.T
+            rows, planes = np.nonzero(depth > 0)
+            return slots.take(rows), planes, depth[rows, planes]
+
+        chunks = storage.pool.map(penetrating, len(testing))
+        if len(chunks) == 1:
+            return chunks[0]
+        return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
+
+    def find_contacts(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        slots, planes, depths = self.penetrations()
+        return slots, self.normals[planes], depths, self.restitutions[planes]
+
+    def sweep(self, slots: np.ndarray, start: np.ndarray,
+              end: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the first plane each particle crosses, going from outside the plane to inside it.
+        """
+        reach = self.reach(slots)[:, None]
+        start_gap = start @ self.normals.T - self.offsets - reach
+        end_gap = end @ self.normals.T - self.offsets - reach
+        crossing = (start_gap >= 0) & (end_gap < 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            times = np.where(crossing, start_gap / (start_gap - end_gap), np.inf)
+
+        planes = np.argmin(times, axis=1) if len(self.offsets) else np.zeros(len(slots), dtype=np.int64)
+        rows = np.flatnonzero(crossing.any(axis=1))
+        planes = planes[rows]
+        return rows, times[rows, planes], self.normals[planes], self.restitutions[planes]
@@ -0,0 +1,244 @@
+import asyncio
+import struct
+import time
+
+import numpy as np
+
+from core.particle_encoding import ENCODED_HEADER, ENCODED_MAGIC
+from core.particle_world import ParticleWorld
+
+# Every frame starts with this header: a magic number, the size of the payload in bytes, the frame number, the
+# simulated time, the number of particles and the size of the floating point values in bytes. Frames encoded by a
+# ParticleStateEncoder start with the same magic number and payload size
+FRAME_MAGIC = b'PWF1'
+FRAME_HEADER = struct.Struct('<4sIQdII')
+FRAME_PREFIX = struct.Struct('<4sI')
+
+# The size of the header of each kind of frame, by magic number
+HEADER_SIZES = {FRAME_MAGIC: FRAME_HEADER.size, ENCODED_MAGIC: ENCODED_HEADER.size}
+
+
+def frame_dtype(precision: type) -> np.dtype:
+    """
+    :param precision: the dtype of the floating point values, np.float32 or np.float64
+    :return: the dtype of the record of one particle in a frame
+    """
+    return np.dtype([('handle', '<i8'), ('position', np.dtype(precision).newbyteorder('<'), 3),
+                     ('velocity', np.dtype(precision).newbyteorder('<'), 3)])
+
+
+def encode_frame(world: ParticleWorld, frame: int, simulated_time: float) -> bytes:
+    """
+    Packs the handle, position and velocity of every live particle of a world into a frame, with the floating point
+    values in the precision of the world.
+
+    :param world: the world
+    :param frame: the number of the frame
+    :param simulated_time: the simulated time of the frame
+    :return: the header and payload of the frame
+    """
+    storage = world.storage
+    slots = storage.live_slots()
+    records = np.empty(len(slots), dtype=frame_dtype(storage.precision))
+    records['handle'] = storage.slot_handle[slots]
+    records['position'] = storage.position[slots]
+    records['velocity'] = storage.velocity[slots]
+    payload = records.tobytes()
+    header = FRAME_HEADER.pack(FRAME_MAGIC, len(payload), frame, simulated_time, len(slots),
+                               storage.position.itemsize)
+    return header + payload
+
+
+def decode_frame(data: bytes) -> tuple[int, float, np.ndarray]:
+    """
+    Unpacks a frame packed by encode_frame.
+
+    :param data: the header and payload of the frame
+    :return: the frame number, the simulated time and the records of the particles, with the fields handle, position
+    and velocity
+    """
+    magic, size, frame, simulated_time, count, float_size = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Data is not a particle world frame")
+    dtype = frame_dtype(np.float32 if float_size == 4 else np.float64)
+    records = np.frombuffer(data, dtype=dtype, count=count, offset=FRAME_HEADER.size)
+    return frame, simulated_time, records
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """
+    Reads the next frame sent by a ParticleWorldServer.
+
+    :param reader: the stream connected to the server
+    :return: the header and payload of the frame, to be given to decode_frame, or to ParticleStateDecoder.decode if the
+    server encodes its frames with a ParticleStateEncoder
+    :raise asyncio.IncompleteReadError: if the server closed the connection
+    """
+    prefix = await reader.readexactly(FRAME_PREFIX.size)
+    magic, size = FRAME_PREFIX.unpack(prefix)
+    if magic not in HEADER_SIZES:
+        raise ValueError("Stream is not a particle world stream")
+    return prefix + await reader.readexactly(HEADER_SIZES[magic] - FRAME_PREFIX.size + size)
+
+
+class ParticleWorldSubscriber:
+    """
+    A client connected to a ParticleWorldServer. Frames wait in a short queue until they are written to the client;
+    when the queue is full, the oldest frame is dropped, so a slow client skips frames instead of delaying the
+    simulation or making the server buffer without bound.
+
+    :param writer: the stream to the client
+    :param max_pending: the most frames waiting to be written
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, max_pending: int):
+        self.writer = writer
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max_pending)
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, frame: bytes | None):
+        """
+        Queues a frame for the client, dropping the oldest frame waiting if the queue is full.
+
+        :param frame: the frame, or None to stop sending
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def stop(self):
+        """
+        Makes send return, dropping the frames not yet written.
+        """
+        self.push(None)
+        self.writer.transport.abort()
+
+    async def send(self):
+        """
+        Writes the queued frames to the client until it disconnects. Waiting for the stream to drain applies the
+        backpressure of the client to its own queue only.
+        """
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is None:
+                    break
+                self.writer.write(frame)
+                await self.writer.drain()
+                self.sent += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+
+
+class ParticleWorldServer:
+    """
+    Steps a particle world in the background and streams the state of every frame to any number of local clients, over
+    TCP or a Unix socket. Each frame is a binary packed array of the handle, position and velocity of every particle,
+    see encode_frame; clients read frames with read_frame and unpack them with decode_frame.
+
+    The simulation runs at its own pace and never waits for the clients: each step runs in a worker thread so that the
+    event loop keeps serving the clients meanwhile, and each client has its own queue of pending frames, from which
+    stalled clients lose their oldest frames.
+
+    :param world: the world simulated
+    :param duration: the simulated duration of each frame
+    :param frame_rate: the most frames simulated per second of wall-clock time. The world runs as fast as it can if None
+    :param max_pending: the most frames waiting to be written to each client
+    :param encode: packs a frame of the world, given the world, the frame number and the simulated time
+    """
+
+    def __init__(self, world: ParticleWorld, duration: float, frame_rate: float = None, max_pending: int = 2,
+                 encode=encode_frame):
+        if max_pending < 1:
+            raise ValueError("Clients must be able to have at least one pending frame")
+        self.world = world
+        self.duration = duration
+        self.frame_rate = frame_rate
+        self.max_pending = max_pending
+        self.encode = encode
+        self.frame = 0
+        self.simulated_time = 0.0
+        self.subscribers: list[ParticleWorldSubscriber] = []
+        self._servers: list[asyncio.Server] = []
+        # the tasks serving the connected clients
+        self._handlers: set[asyncio.Task] = set()
+
+    async def start_tcp(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """
+        Starts accepting clients over TCP.
+
+        :param host: the address to listen on
+        :param port: the port to listen on, 0 picking a free port
+        :return: the port listened on
+        """
+        server = await asyncio.start_server(self._connected, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def start_unix(self, path: str):
+        """
+        Starts accepting clients over a Unix socket.
+
+        :param path: the path of the socket
+        """
+        self._servers.append(await asyncio.start_unix_server(self._connected, path))
+
+    async def _connected(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = ParticleWorldSubscriber(writer, self.max_pending)
+        self.subscribers.append(subscriber)
+        self._handlers.add(asyncio.current_task())
+        try:
+            await subscriber.send()
+        finally:
+            self.subscribers.remove(subscriber)
+            self._handlers.discard(asyncio.current_task())
+
+    def publish(self, frame: bytes):
+        """
+        Queues a frame for every client.
+        """
+        for subscriber in self.subscribers:
+            subscriber.push(frame)
+
+    async def step(self):
+        """
+        Simulates one frame in a worker thread and publishes it.
+        """
+        await asyncio.to_thread(self.world.run_physics, self.duration)
+        self.frame += 1
+        self.simulated_time += self.duration
+        self.publish(self.encode(self.world, self.frame, self.simulated_time))
+
+    async def run(self, frames: int = None):
+        """
+        Simulates and publishes frames, paced by the frame rate if there is one.
+
+        :param frames: the number of frames to simulate. Runs until cancelled if None
+        """
+        period = 1 / self.frame_rate if self.frame_rate else 0.0
+        deadline = time.perf_counter()
+        count = 0
+        while frames is None or count < frames:
+            await self.step()
+            count += 1
+            deadline += period
+            # always yield, so that the clients are served even when the world runs as fast as it can
+            await asyncio.sleep(max(deadline - time.perf_counter(), 0))
+
+    async def close(self):
+        """
+        Stops accepting clients and disconnects every client.
+        """
+        for server in self._servers:
+            server.close()
+        handlers = list(self._handlers)
+        for subscriber in self.subscribers:
+            subscriber.stop()
+        await asyncio.gather(*handlers)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
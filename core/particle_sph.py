@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+
+from core.particle_force_generator import ParticleBatchForceGenerator
+from core.particle_neighbours import ParticleNeighbourList
+from core.particle_storage import ParticleStorage
+
+
+class ParticleSPHForceGenerator(ParticleBatchForceGenerator):
+    """
+    A batch force generator simulating a liquid with smoothed-particle hydrodynamics: every particle of the storage is
+    a small parcel of fluid, and the pressure and viscosity forces between them are computed from kernel sums over the
+    pairs of particles closer than the smoothing length. The kernels are those of Müller et al., "Particle-Based Fluid
+    Simulation for Interactive Applications": poly6 for the density, spiky for the pressure gradient and the viscosity
+    kernel for the velocity Laplacian.
+
+    The forces are symmetric between the particles of a pair, so momentum is conserved. Pressure follows the density
+    linearly and is never negative, so particles of a free surface do not clump together.
+
+    The pairs come from a neighbour list, whose spatial grid is rebuilt only when particles have moved more than half
+    its skin. Every particle of the storage that is alive and of finite mass is part of the fluid; add gravity as the
+    acceleration of the particles and keep them in with contact generators such as ParticlePlaneContactGenerator.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param smoothing_length: the radius of the kernels, about twice the spacing of the particles at rest
+    :param rest_density: the density of the fluid at rest
+    :param stiffness: how much the pressure grows with the density
+    :param viscosity: the dynamic viscosity of the fluid
+    :param skin: the skin of the neighbour list. Defaults to a fifth of the smoothing length
+    """
+
+    def __init__(self, storage: ParticleStorage, smoothing_length: float, rest_density: float, stiffness: float,
+                 viscosity: float = 0.0, skin: float = None):
+        super().__init__(storage)
+        if smoothing_length <= 0 or rest_density <= 0:
+            raise ValueError("Smoothing length and rest density must be positive")
+        self.smoothing_length = smoothing_length
+        self.rest_density = rest_density
+        self.stiffness = stiffness
+        self.viscosity = viscosity
+        self.neighbours = ParticleNeighbourList(storage, smoothing_length,
+                                                smoothing_length / 5 if skin is None else skin)
+        # the density and pressure of every slot of the storage, as of the last update
+        self.density = np.zeros(0)
+        self.pressure = np.zeros(0)
+
+        h = smoothing_length
+        self._poly6 = 315 / (64 * math.pi * h ** 9)
+        self._spiky_gradient = -45 / (math.pi * h ** 6)
+        self._viscosity_laplacian = 45 / (math.pi * h ** 6)
+
+    def update_forces(self, duration: float):
+        storage = self.storage
+        size = storage.size
+        fluid = storage.alive[:size] & (storage.inverse_mass[:size] > 0)
+        mass = np.zeros(size)
+        mass[fluid] = 1 / storage.inverse_mass[:size][fluid]
+
+        self.neighbours.update()
+        first, second, delta, distance = self.neighbours.close_pairs()
+        in_fluid = fluid.take(first) & fluid.take(second)
+        if not in_fluid.all():
+            keep = np.flatnonzero(in_fluid)
+            first, second, delta, distance = first.take(keep), second.take(keep), delta.take(keep, axis=0), \
+                distance.take(keep)
+        first_mass, second_mass = mass.take(first), mass.take(second)
+        h = self.smoothing_length
+
+        # every particle contributes to its own density
+        kernel = self._poly6 * (h ** 2 - distance ** 2) ** 3
+        density = mass * (self._poly6 * h ** 6)
+        density += np.bincount(first, second_mass * kernel, minlength=size)
+        density += np.bincount(second, first_mass * kernel, minlength=size)
+        pressure = np.maximum(self.stiffness * (density - self.rest_density), 0)
+        self.density, self.pressure = density, pressure
+
+        # the magnitude of the force between the particles of each pair, pushing them apart, and the direction from the
+        # second to the first. The first particle gets the force and the second the opposite force
+        first_density, second_density = density.take(first), density.take(second)
+        pair_mass = first_mass * second_mass
+        magnitude = -pair_mass * self._spiky_gradient * (h - distance) ** 2 * (
+                pressure.take(first) / first_density ** 2 + pressure.take(second) / second_density ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            force = delta * np.where(distance > 0, magnitude / distance, 0)[:, None]
+        if self.viscosity:
+            scale = self.viscosity * pair_mass * self._viscosity_laplacian * (h - distance) / (
+                    first_density * second_density)
+            velocity = storage.velocity
+            force += (velocity.take(second, axis=0) - velocity.take(first, axis=0)) * scale[:, None]
+
+        slots = np.flatnonzero(fluid & storage.awake[:size])
+        for axis in range(3):
+            total = (np.bincount(first, force[:, axis], minlength=size)
+                     - np.bincount(second, force[:, axis], minlength=size))
+            storage.force_accum[slots, axis] += total.take(slots)
@@ -0,0 +1,320 @@
+import numpy as np
+
+from core.particle_force_generator import ParticleBatchForceGenerator
+from core.particle_integrator import ParticleIntegrator, ForceUpdate
+from core.particle_state import ParticleState
+from core.particle_storage import ParticleStorage
+
+
+class ParticleSpringNetwork(ParticleBatchForceGenerator):
+    """
+    A batch force generator holding many damped springs between the particles of a storage, such as the edges of a
+    cloth or the segments of a rope. Each spring pulls its ends together when stretched and pushes them apart when
+    compressed, with a damping force opposing the rate at which its length changes.
+
+    Registered with ParticleForceRegistry.add_batch, the network works with any integrator. Stiff networks need very
+    short steps with explicit integrators though, so the network also provides the Jacobian of its forces, which
+    ParticleImplicitEulerIntegrator uses to take long steps stably.
+
+    Springs refer to their ends by handle, so they survive the compaction of the storage. A spring with an end that was
+    despawned no longer applies any force.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    """
+
+    def __init__(self, storage: ParticleStorage):
+        super().__init__(storage)
+        self.first = np.zeros(0, dtype=np.int64)
+        self.second = np.zeros(0, dtype=np.int64)
+        self.stiffness = np.zeros(0)
+        self.rest_length = np.zeros(0)
+        self.damping = np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    def add_springs(self, first: np.ndarray, second: np.ndarray, stiffness: np.ndarray | float,
+                    rest_length: np.ndarray | float = None, damping: np.ndarray | float = 0.0) -> np.ndarray:
+        """
+        Adds many springs at once. Every argument but the handles is either one value per spring or a single value
+        broadcast to all of them.
+
+        :param first: the handles of the particles at one end of the springs
+        :param second: the handles of the particles at the other end
+        :param stiffness: the spring constants
+        :param rest_length: the rest lengths. Defaults to the current distance between the ends
+        :param damping: the damping coefficients, in force per unit of length change rate
+        :return: the indices of the new springs
+        """
+        first = np.asarray(first, dtype=np.int64).reshape(-1)
+        second = np.asarray(second, dtype=np.int64).reshape(-1)
+        if len(first) != len(second):
+            raise ValueError("Springs must have as many first ends as second ends")
+        first_slots, second_slots = self.storage.slots(first), self.storage.slots(second)
+        if (first_slots < 0).any() or (second_slots < 0).any():
+            raise KeyError("Spring ends must be alive")
+        if rest_length is None:
+            delta = self.storage.position[first_slots] - self.storage.position[second_slots]
+            rest_length = np.sqrt(np.einsum('ij,ij->i', delta, delta, dtype=np.float64))
+
+        count = len(first)
+        indices = np.arange(len(self.first), len(self.first) + count)
+        self.first = np.concatenate([self.first, first])
+        self.second = np.concatenate([self.second, second])
+        self.stiffness = np.concatenate([self.stiffness, np.broadcast_to(stiffness, count)])
+        self.rest_length = np.concatenate([self.rest_length, np.broadcast_to(rest_length, count)])
+        self.damping = np.concatenate([self.damping, np.broadcast_to(damping, count)])
+        return indices
+
+    def add_spring(self, first: int, second: int, stiffness: float, rest_length: float = None,
+                   damping: float = 0.0) -> int:
+        """
+        Adds a spring between two particles.
+
+        :return: the index of the new spring
+        """
+        return int(self.add_springs([first], [second], stiffness, rest_length, damping)[0])
+
+    def live_springs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: the indices of the springs whose ends are both alive, and the slots of their first and second ends
+        """
+        first, second = self.storage.slots(self.first), self.storage.slots(self.second)
+        live = np.flatnonzero((first >= 0) & (second >= 0))
+        return live, first[live], second[live]
+
+    def _geometry(self, springs: np.ndarray, delta: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the unit direction from the second end to the first of each spring, and its length
+        """
+        length = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        # springs of zero length push along an arbitrary axis
+        direction = np.tile((1.0, 0.0, 0.0), (len(springs), 1))
+        apart = length > 0
+        direction[apart] = delta[apart] / length[apart, None]
+        return direction, length
+
+    def forces(self, springs: np.ndarray, delta: np.ndarray, relative_velocity: np.ndarray) -> np.ndarray:
+        """
+        Computes the forces of some springs.
+
+        :param springs: the indices of the springs
+        :param delta: the offset from the second end of each spring to the first
+        :param relative_velocity: the velocity of the first end of each spring relative to the second
+        :return: the force of each spring on its first end, the second end getting the opposite force
+        """
+        direction, length = self._geometry(springs, delta)
+        stretch = length - self.rest_length[springs]
+        rate = np.einsum('ij,ij->i', relative_velocity, direction)
+        return direction * -(self.stiffness[springs] * stretch + self.damping[springs] * rate)[:, None]
+
+    def jacobians(self, springs: np.ndarray, delta: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the derivatives of the forces of some springs, as the 3x3 blocks K and D such that the force on the
+        first end changes by -K dx - D dv when the offset between the ends changes by dx and their relative velocity by
+        dv. The part of K from the rotation of a compressed spring is dropped, so that K stays positive semi-definite
+        and the systems solved by implicit integration stay well-posed.
+
+        :param springs: the indices of the springs
+        :param delta: the offset from the second end of each spring to the first
+        :return: the stiffness blocks K and the damping blocks D, as arrays of shape (n, 3, 3)
+        """
+        direction, length = self._geometry(springs, delta)
+        outer = direction[:, :, None] * direction[:, None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            transverse = np.where(length > 0, 1 - self.rest_length[springs] / length, 0)
+        transverse = np.maximum(transverse, 0)[:, None, None]
+        stiffness = self.stiffness[springs, None, None] * (outer + transverse * (np.eye(3) - outer))
+        return stiffness, self.damping[springs, None, None] * outer
+
+    def update_forces(self, duration: float):
+        storage = self.storage
+        springs, first, second = self.live_springs()
+
+        def spring_forces(chunk: slice) -> tuple[np.ndarray, np.ndarray]:
+            ends = first[chunk], second[chunk]
+            force = self.forces(springs[chunk], storage.position.take(ends[0], axis=0) - storage.position.take(
+                ends[1], axis=0), storage.velocity.take(ends[0], axis=0) - storage.velocity.take(ends[1], axis=0))
+            return np.concatenate(ends), np.concatenate([force, -force])
+
+        size = storage.size
+        awake = storage.awake[:size]
+        total = storage.pool.accumulate(spring_forces, len(springs), size)
+        storage.force_accum[:size][awake] += total[awake]
+
+
+class ParticleImplicitEulerIntegrator(ParticleIntegrator):
+    """
+    First-order implicit (backward) Euler integration of spring networks, linearized once per step as in Baraff and
+    Witkin, "Large Steps in Cloth Simulation". The forces of the springs are taken at the end of the step rather than
+    at its start, which removes the step limit of stiff springs: cloth and stiff ropes can run at 30-60 Hz instead of
+    the kHz explicit integrators need. The price is some artificial damping of fast oscillations.
+
+    The networks must also be registered as batch force generators, so that state.force_accum holds their forces at
+    the start of the step along with every other force, which is integrated explicitly. The change of velocity dv is
+    then the solution of
+
+        (M + h D + h^2 K) dv = h (f - h K v)
+
+    where M holds the masses, f the forces, and K and D the stiffness and damping Jacobians of the springs. The matrix
+    is assembled in block sparse form, one 3x3 block per spring, and the system is solved with the conjugate gradient
+    method, preconditioned with the inverse of its 3x3 diagonal blocks and started from the solution of the last step.
+    Particles not being integrated, such as sleeping particles, are fixed ends, and particles of infinite mass move
+    with their acceleration only, like with explicit integrators.
+
+    :param networks: the spring networks integrated implicitly
+    :param tolerance: the conjugate gradient iterations stop once the residual is below this fraction of the right-hand
+    side
+    :param max_iterations: the most conjugate gradient iterations run per step
+    :param warm_start: whether the solver starts from the change of velocity of the last step, rather than from zero
+    """
+
+    def __init__(self, networks: list[ParticleSpringNetwork], tolerance: float = 1e-6, max_iterations: int = 200,
+                 warm_start: bool = True):
+        super().__init__()
+        self.networks = networks
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.warm_start = warm_start
+        # the conjugate gradient iterations run by the last step
+        self.iterations = 0
+        self._last_change = np.zeros((0, 3))
+
+    @staticmethod
+    def _state_rows(state: ParticleState, slots: np.ndarray) -> np.ndarray:
+        """
+        :return: the row of the state holding each of the given storage slots, or -1 for slots it does not hold
+        """
+        rows = state.rows
+        if isinstance(rows, slice):
+            found = slots - (rows.start or 0)
+            held = (found >= 0) & (found < len(state))
+        else:
+            found = np.minimum(np.searchsorted(rows, slots), max(len(rows) - 1, 0))
+            held = (rows[found] == slots) if len(rows) else np.zeros(len(slots), dtype=bool)
+        return np.where(held, found, -1)
+
+    def _assemble(self, state: ParticleState, duration: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Assembles the off-diagonal blocks h D + h^2 K of every spring, with the rows of its ends in the state.
+
+        :return: the rows of the first and second ends of every spring, -1 for fixed ends, and its blocks
+        """
+        first_rows, second_rows, blocks = [], [], []
+        for network in self.networks:
+            springs, first_slots, second_slots = network.live_springs()
+            first, second = self._state_rows(state, first_slots), self._state_rows(state, second_slots)
+            # the ends being integrated are at their position in the state, the fixed ends at their position in storage
+            start = network.storage.position[first_slots].astype(np.float64)
+            start[first >= 0] = state.position[first[first >= 0]]
+            end = network.storage.position[second_slots].astype(np.float64)
+            end[second >= 0] = state.position[second[second >= 0]]
+            stiffness, damping = network.jacobians(springs, start - end)
+            first_rows.append(first)
+            second_rows.append(second)
+            blocks.append((duration * damping + duration ** 2 * stiffness, stiffness))
+        if not blocks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 2, 3, 3))
+        return (np.concatenate(first_rows), np.concatenate(second_rows),
+                np.stack([np.concatenate([b for b, _ in blocks]), np.concatenate([k for _, k in blocks])], axis=1))
+
+    def integrate(self, state: ParticleState, duration: float, update_forces: ForceUpdate):
+        count = len(state)
+        inverse_mass = state.inverse_mass.astype(np.float64)
+        free = inverse_mass > 0
+        mass = np.zeros(count)
+        mass[free] = 1 / inverse_mass[free]
+
+        first, second, blocks = self._assemble(state, duration)
+        system, stiffness = blocks[:, 0], blocks[:, 1]
+        # fixed ends point to an extra row, which holds zero vectors and whose sums are dropped
+        first = np.where(first >= 0, first, count)
+        second = np.where(second >= 0, second, count)
+        components = (np.concatenate([first, second])[:, None] * 3 + np.arange(3)).ravel()
+
+        def difference(vector: np.ndarray) -> np.ndarray:
+            """
+            :return: the difference of the given per-particle vector between the first and second end of every spring
+            """
+            padded = np.zeros((count + 1, 3))
+            padded[:count] = vector
+            return padded.take(first, axis=0) - padded.take(second, axis=0)
+
+        def spread(values: np.ndarray) -> np.ndarray:
+            """
+            :return: the sum of the given per-spring vectors on the first end of every spring, minus their sum on the
+            second end
+            """
+            total = np.bincount(components, np.concatenate([values, -values]).ravel(), minlength=3 * (count + 1))
+            return total[:3 * count].reshape(count, 3)
+
+        def multiply(vector: np.ndarray) -> np.ndarray:
+            """
+            :return: (M + h D + h^2 K) times the given vector, with zero rows for particles of infinite mass
+            """
+            result = vector * mass[:, None] + spread(np.einsum('nij,nj->ni', system, difference(vector)))
+            result[~free] = 0
+            return result
+
+        # particles of infinite mass ignore forces and only follow their acceleration, like with explicit integrators
+        known = np.zeros((count, 3))
+        known[~free] = state.acceleration[~free] * duration
+
+        # right-hand side h (f - h K v), with the spring forces already in the accumulated forces, minus the effect of
+        # the known changes of velocity
+        force = state.force_accum.astype(np.float64) + state.acceleration * mass[:, None]
+        force -= duration * spread(np.einsum('nij,nj->ni', stiffness, difference(state.velocity)))
+        rhs = duration * force - multiply(known)
+        rhs[~free] = 0
+
+        # block Jacobi preconditioner, from the 3x3 diagonal blocks of the system
+        diagonal = np.zeros((count + 1, 3, 3))
+        diagonal[:, [0, 1, 2], [0, 1, 2]] = np.append(mass, 0)[:, None]
+        np.add.at(diagonal, first, system)
+        np.add.at(diagonal, second, system)
+        diagonal = diagonal[:count]
+        diagonal[~free] = np.eye(3)
+        preconditioner = np.linalg.inv(diagonal)
+        preconditioner[~free] = 0
+
+        change = self._solve(multiply, rhs, preconditioner)
+        self._last_change = change
+        change = change + known
+
+        state.velocity += change
+        self._finish(state, duration)
+        state.position += state.velocity * duration
+
+    def _solve(self, multiply, rhs: np.ndarray, preconditioner: np.ndarray) -> np.ndarray:
+        """
+        Solves the system with the preconditioned conjugate gradient method.
+
+        :param multiply: multiplies a vector by the matrix of the system
+        :param rhs: the right-hand side
+        :param preconditioner: the inverse of the diagonal blocks of the matrix
+        :return: the solution
+        """
+        solution = np.zeros_like(rhs)
+        if self.warm_start and self._last_change.shape == rhs.shape:
+            solution = self._last_change.copy()
+            solution[~preconditioner.any(axis=(1, 2))] = 0
+
+        residual = rhs - multiply(solution)
+        target = self.tolerance * np.sqrt(np.einsum('ij,ij->', rhs, rhs))
+        direction = np.einsum('nij,nj->ni', preconditioner, residual)
+        residual_dot = np.einsum('ij,ij->', residual, direction)
+        self.iterations = 0
+        while self.iterations < self.max_iterations and np.sqrt(np.einsum('ij,ij->', residual, residual)) > target:
+            product = multiply(direction)
+            curvature = np.einsum('ij,ij->', direction, product)
+            if curvature <= 0:
+                break
+            step = residual_dot / curvature
+            solution += step * direction
+            residual -= step * product
+            preconditioned = np.einsum('nij,nj->ni', preconditioner, residual)
+            new_residual_dot = np.einsum('ij,ij->', residual, preconditioned)
+            direction = preconditioned + direction * (new_residual_dot / residual_dot)
+            residual_dot = new_residual_dot
+            self.iterations += 1
+        return solution
@@ -0,0 +1,118 @@
+import numpy as np
+
+from core.particle_array_contact import ParticleArrayContactGenerator
+from core.particle_contact import ParticleContact
+from core.particle_storage import ParticleStorage
+
+
+class ParticleStaticContactGenerator(ParticleArrayContactGenerator):
+    """
+    The base class of the generators of contacts between the particles of a storage and static scenery. Subclasses find
+    all the contacts at once on the storage arrays, in find_contacts, and this class fills the contact list of the world
+    with them. Contacts with the scenery have a single particle, and their normal points out of the scenery.
+
+    Particles that are asleep are never tested, as the scenery does not move.
+
+    A particle moving further than its reach (its radius plus the thickness of the scenery) in a step can tunnel through
+    thin scenery without ever being found touching it. With continuous collision detection, the motion of those
+    particles during the last step, from ParticleStorage.previous_position to their position, is swept against the
+    scenery by the sweep method of subclasses. A particle whose motion hits the scenery is clamped back to where it hit,
+    and reports a contact there instead of its contacts at the end of the step. Only the fast particles pay for it, so
+    the world can keep a large time step.
+
+    :param storage: the storage of the particles, usually ParticleWorld.storage
+    :param thickness: added to the radius of the particles, so that particles of zero radius can collide
+    :param continuous: whether fast particles are swept against the scenery
+    """
+
+    def __init__(self, storage: ParticleStorage, thickness: float = 0.0, continuous: bool = False):
+        super().__init__(storage)
+        self.thickness = thickness
+        self.continuous = continuous
+
+    def testing_slots(self) -> np.ndarray:
+        """
+        :return: the slots of the particles to test against the scenery: those that are alive and awake
+        """
+        return self.storage.awake_slots()
+
+    def reach(self, slots: np.ndarray) -> np.ndarray:
+        """
+        :return: the distance from the scenery under which each of the given particles touches it
+        """
+        return self.storage.radius[slots] + self.thickness
+
+    def find_contacts(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the contacts between the particles and the scenery.
+
+        :return: the slot of the particle of each contact, its normal as an array of shape (n, 3), its penetration and
+        its restitution
+        """
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(0), np.zeros(0)
+
+    def sweep(self, slots: np.ndarray, start: np.ndarray,
+              end: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sweeps the motion of some particles against the scenery, and finds where each first hits it.
+
+        :param slots: the slots of the particles
+        :param start: the position of each particle at the start of the step, as an array of shape (n, 3)
+        :param end: the position of each particle at the end of the step
+        :return: the rows of the particles that hit the scenery, in the given slots, the time of impact of each as a
+        fraction of the step, the normal of the scenery where it was hit and the restitution there
+        """
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, 3)), np.zeros(0)
+
+    def continuous_contacts(self, clamp: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sweeps the particles that moved further than their reach during the last step, clamps the ones that hit the
+        scenery back to their position at the time of impact, and reports their contacts there.
+
+        :param clamp: whether the particles that hit the scenery are moved back. Without clamping, the contacts are
+        only found
+        :return: the contacts of the clamped particles, like find_contacts. They have no penetration
+        """
+        storage = self.storage
+        slots = self.testing_slots()
+        motion = storage.position[slots] - storage.previous_position[slots]
+        fast = np.einsum('ij,ij->i', motion, motion) > self.reach(slots) ** 2
+        slots, motion = slots[fast], motion[fast]
+
+        start = storage.previous_position[slots]
+        rows, times, normals, restitutions = self.sweep(slots, start, start + motion)
+        slots = slots[rows]
+        if clamp:
+            storage.position[slots] = start[rows] + motion[rows] * times[:, None]
+        return slots, normals, np.zeros(len(slots)), restitutions
+
+    def _collect_contacts(self, clamp: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :param clamp: whether the particles caught by continuous collision detection are clamped
+        :return: the contacts found, including the continuous ones when enabled
+        """
+        if not self.continuous:
+            return self.find_contacts()
+        swept = self.continuous_contacts(clamp)
+        found = self.find_contacts()
+        if len(swept[0]) == 0:
+            return found
+        kept = ~np.isin(found[0], swept[0])
+        return tuple(np.concatenate([swept_column, found_column[kept]])
+                     for swept_column, found_column in zip(swept, found))
+
+    def add_contacts(self, contacts: list[ParticleContact], index: int, limit: int) -> int:
+        """
+        Fills the contacts of the list, from the given index, with the contacts found. When there are more contacts
+        than the limit, the deepest ones are kept.
+        """
+        if limit <= 0:
+            return 0
+        slots, normals, depths, restitutions = self._collect_contacts()
+        return self.fill_contacts(contacts, index, limit, slots, None, normals, depths, restitutions)
+
+    def count_contacts(self) -> int:
+        """
+        Counts the contacts found, without clamping the particles caught by continuous collision detection.
+        """
+        return len(self._collect_contacts(clamp=False)[0])
@@ -0,0 +1,305 @@
+import numpy as np
+
+from core.particle import Particle
+from core.particle_state import ParticleState
+from core.particle_threads import ParticleThreadPool
+from core.vector import Vector
+
+# A handle packs the index of its entry in the handle table in its low bits and the generation of that entry in its high
+# bits. The generation changes every time the entry is freed, so a stale handle never reaches a particle spawned later
+HANDLE_INDEX_BITS = 32
+HANDLE_INDEX_MASK = (1 << HANDLE_INDEX_BITS) - 1
+
+
+class ParticleStorage(ParticleState):
+    """
+    Holds the particles of a world in preallocated state arrays. Each particle lives in a slot (a row of the arrays)
+    and is known to the outside by a handle.
+
+    Free slots are kept on a free list, so spawning and despawning particles never allocates, until the storage is full
+    and its capacity doubles. Despawning leaves a hole in the arrays; every particle lives in a slot below `size`, and
+    once too many of those slots are holes the storage is compacted, moving the particles to the front of the arrays.
+    Handles stay valid across compaction, while slots do not: code caching slots should watch `version`, which changes
+    whenever particles move.
+
+    A hole holds no velocity, acceleration or force, so integrating it leaves it where it is.
+
+    Besides the state integrated, the storage holds the radius of each particle and its position at the start of the
+    last step, used by collision detection, and its sleep state.
+
+    The kernels working on the storage arrays split their work across the threads of its pool, see ParticleThreadPool.
+
+    :param capacity: the number of slots preallocated
+    :param compact_ratio: the storage is compacted once fewer than this fraction of the slots below size hold a particle
+    :param precision: the dtype of the floating point columns, np.float32 or np.float64
+    """
+
+    COLUMNS = {
+        **ParticleState.COLUMNS,
+        'previous_position': (3, float, 0.0),
+        'radius': (0, float, 0.0),
+        'alive': (0, bool, False),
+        'awake': (0, bool, False),
+        'sleep_time': (0, float, 0.0),
+        'slot_handle': (0, np.int64, -1),
+    }
+
+    def __init__(self, capacity: int = 64, compact_ratio: float = 0.5, precision: type = np.float64):
+        capacity = max(capacity, 1)
+        super().__init__(capacity, precision)
+        self.compact_ratio = compact_ratio
+        self.size = 0
+        self.count = 0
+        self.version = 0
+        self.pool = ParticleThreadPool()
+
+        # stacks of the free slots and of the free entries of the handle table, which always have the same height
+        self._free_slots = np.arange(capacity - 1, -1, -1, dtype=np.int64)
+        self._free_handles = np.arange(capacity - 1, -1, -1, dtype=np.int64)
+        self._free_count = capacity
+
+        # slot and generation of each entry of the handle table
+        self._handle_slot = np.full(capacity, -1, dtype=np.int64)
+        self._handle_generation = np.zeros(capacity, dtype=np.int64)
+
+        self._views: dict[int, StoredParticle] = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.alive)
+
+    def allocate(self, count: int, position: np.ndarray | tuple = 0.0) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Takes slots off the free list for new particles, growing the storage if there are not enough free slots. The
+        new particles are awake, with the state of a default Particle at the given position. Their previous position is
+        the same, so that they are not swept from anywhere else before their first step.
+
+        :param count: the number of particles to allocate
+        :param position: the positions of the particles, as an array of shape (count, 3) or (3,)
+        :return: the slots and the handles of the new particles
+        """
+        if count > self._free_count:
+            self._grow(self.capacity - self._free_count + count)
+
+        top = self._free_count
+        slots = self._free_slots[top - count:top][::-1].copy()
+        indices = self._free_handles[top - count:top][::-1].copy()
+        self._free_count -= count
+
+        handles = (self._handle_generation[indices] << HANDLE_INDEX_BITS) | indices
+        self._handle_slot[indices] = slots
+        for name, (_, _, default) in ParticleState.COLUMNS.items():
+            getattr(self, name)[slots] = default
+        self.position[slots] = position
+        self.previous_position[slots] = self.position[slots]
+        self.radius[slots] = 0
+        self.slot_handle[slots] = handles
+        self.alive[slots] = True
+        self.awake[slots] = True
+        self.sleep_time[slots] = 0
+
+        self.count += count
+        if count:
+            self.size = max(self.size, int(slots.max()) + 1)
+        return slots, handles
+
+    def release(self, handles: np.ndarray) -> list['StoredParticle']:
+        """
+        Returns the slots of the given particles to the free list, and invalidates their handles.
+
+        :param handles: the handles of the particles to release
+        :return: the stored particles that were handed out for the released handles, now detached from the storage
+        """
+        handles = np.asarray(handles, dtype=np.int64).reshape(-1)
+        slots = self.slots(handles)
+        if (slots < 0).any():
+            raise KeyError("Cannot release a particle that is not alive")
+        if len(np.unique(handles)) != len(handles):
+            raise KeyError("Cannot release a particle twice")
+
+        indices = handles & HANDLE_INDEX_MASK
+        self._handle_slot[indices] = -1
+        self._handle_generation[indices] += 1
+
+        for name, (_, _, default) in self.COLUMNS.items():
+            getattr(self, name)[slots] = default
+
+        top = self._free_count
+        self._free_slots[top:top + len(slots)] = slots
+        self._free_handles[top:top + len(slots)] = indices
+        self._free_count += len(slots)
+        self.count -= len(slots)
+        if self.count == 0:
+            self.size = 0
+
+        views = []
+        if self._views:
+            for handle in handles.tolist():
+                view = self._views.pop(handle, None)
+                if view is not None:
+                    views.append(view)
+        return views
+
+    def _grow(self, capacity: int):
+        """
+        Grows the storage geometrically, to at least the given capacity.
+        """
+        old_capacity = self.capacity
+        capacity = max(capacity, 2 * old_capacity)
+        self.resize(capacity)
+
+        # the new slots go to the bottom of the free stacks, so that the slots already free are reused first. The stacks
+        # keep room for every slot, so that releasing particles never reallocates them
+        new_entries = np.arange(capacity - 1, old_capacity - 1, -1, dtype=np.int64)
+        top = self._free_count
+        used = np.empty(old_capacity - top, dtype=np.int64)
+        self._free_slots = np.concatenate([new_entries, self._free_slots[:top], used])
+        self._free_handles = np.concatenate([new_entries, self._free_handles[:top], used])
+        self._free_count = top + len(new_entries)
+
+        self._handle_slot = np.concatenate([self._handle_slot, np.full(capacity - old_capacity, -1, dtype=np.int64)])
+        self._handle_generation = np.concatenate([self._handle_generation,
+                                                  np.zeros(capacity - old_capacity, dtype=np.int64)])
+
+    def compact(self):
+        """
+        Moves every particle to the front of the arrays, in slot order, so that there are no holes below size.
+        """
+        live = np.flatnonzero(self.alive[:self.size])
+        count = len(live)
+        for name, (_, _, default) in self.COLUMNS.items():
+            column = getattr(self, name)
+            column[:count] = column[live]
+            column[count:self.size] = default
+        self._handle_slot[self.slot_handle[:count] & HANDLE_INDEX_MASK] = np.arange(count)
+
+        self._free_slots[:self._free_count] = np.arange(self.capacity - 1, count - 1, -1)
+        self.size = count
+        self.version += 1
+
+    def compact_if_sparse(self) -> bool:
+        """
+        Compacts the storage if fewer than compact_ratio of the slots below size hold a particle.
+
+        :return: True if the storage was compacted
+        """
+        if self.count >= self.compact_ratio * self.size:
+            return False
+        self.compact()
+        return True
+
+    def live_slots(self) -> np.ndarray:
+        """
+        :return: the slots holding a particle, in increasing order
+        """
+        return np.flatnonzero(self.alive[:self.size])
+
+    def awake_slots(self) -> np.ndarray:
+        """
+        :return: the slots holding a particle that is awake, in increasing order
+        """
+        return np.flatnonzero(self.alive[:self.size] & self.awake[:self.size])
+
+    def slots(self, handles: np.ndarray) -> np.ndarray:
+        """
+        :param handles: the handles of some particles
+        :return: the slot of each particle, or -1 for a handle whose particle is not alive
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        indices = handles & HANDLE_INDEX_MASK
+        in_table = indices < len(self._handle_slot)
+        indices = np.where(in_table, indices, 0)
+        slots = self._handle_slot[indices]
+        current = in_table & (self._handle_generation[indices] == handles >> HANDLE_INDEX_BITS)
+        return np.where(current, slots, -1)
+
+    def slot(self, handle: int) -> int:
+        """
+        :param handle: the handle of a particle
+        :return: the slot of the particle
+        :raise KeyError: if the particle is not alive
+        """
+        index = handle & HANDLE_INDEX_MASK
+        if (index >= len(self._handle_slot) or self._handle_slot[index] < 0
+                or self._handle_generation[index] != handle >> HANDLE_INDEX_BITS):
+            raise KeyError(f"Particle handle {handle} is not alive")
+        return int(self._handle_slot[index])
+
+    def contains(self, handle: int) -> bool:
+        """
+        :param handle: the handle of a particle
+        :return: True if the particle is alive, False otherwise
+        """
+        return self.slots(np.array([handle]))[0] >= 0
+
+    def particle(self, handle: int) -> 'StoredParticle':
+        """
+        :param handle: the handle of a particle
+        :return: the particle bound to the slot of the handle. The same object is returned for as long as the particle
+        is alive, so it can be used as a key, for example in a ParticleForceRegistry
+        """
+        view = self._views.get(handle)
+        if view is None:
+            self.slot(handle)
+            view = self._views[handle] = StoredParticle(self, handle)
+        return view
+
+
+def _vector_column(name: str) -> property:
+    def get(particle: 'StoredParticle') -> Vector:
+        storage = particle.storage
+        x, y, z = getattr(storage, name)[storage.slot(particle.handle)].tolist()
+        return Vector(x, y, z)
+
+    def set(particle: 'StoredParticle', vector: Vector):
+        storage = particle.storage
+        getattr(storage, name)[storage.slot(particle.handle)] = (vector.x, vector.y, vector.z)
+
+    return property(get, set)
+
+
+def _scalar_column(name: str, cast: type) -> property:
+    def get(particle: 'StoredParticle'):
+        storage = particle.storage
+        return cast(getattr(storage, name)[storage.slot(particle.handle)])
+
+    def set(particle: 'StoredParticle', value):
+        storage = particle.storage
+        getattr(storage, name)[storage.slot(particle.handle)] = value
+
+    return property(get, set)
+
+
+class StoredParticle(Particle):
+    """
+    A particle whose state lives in a slot of a ParticleStorage, so that code written against Particle, such as force
+    generators, contacts and links, works on the particles of a world. Every attribute reads and writes the storage
+    arrays.
+
+    Reading a vector attribute returns a copy: `particle.position.x = 1` has no effect, assign a whole vector instead.
+    Once the particle has been despawned, accessing its state raises a KeyError.
+
+    :param storage: the storage holding the particle
+    :param handle: the handle of the particle in the storage
+    """
+
+    position = _vector_column('position')
+    velocity = _vector_column('velocity')
+    acceleration = _vector_column('acceleration')
+    force_accum = _vector_column('force_accum')
+    damping = _scalar_column('damping', float)
+    inverse_mass = _scalar_column('inverse_mass', float)
+    radius = _scalar_column('radius', float)
+    is_awake = _scalar_column('awake', bool)
+    sleep_time = _scalar_column('sleep_time', float)
+
+    def __init__(self, storage: ParticleStorage, handle: int):
+        self.storage = storage
+        self.handle = handle
+
+    @property
+    def is_alive(self) -> bool:
+        """
+        :return: True if the particle is still in its storage, False once it has been despawned
+        """
+        return self.storage.contains(self.handle)
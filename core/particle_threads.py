@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import numpy as np
+
+Result = TypeVar('Result')
+
+
+class ParticleThreadPool:
+    """
+    A persistent pool of threads that the array kernels of a world split their work across. Large NumPy operations
+    release the GIL, so kernels working on separate chunks of the same arrays run in parallel within the process,
+    without copying the arrays to other processes.
+
+    Work over n items is split into at most one chunk per thread, each at least min_chunk items long, so small worlds
+    run on the calling thread as before. The chunks only depend on n and on the number of threads, and results are
+    always combined in chunk order, so a run is reproducible whatever order the threads finish in.
+
+    :param threads: the number of threads. With a single thread, every kernel runs on the calling thread
+    :param min_chunk: the fewest items worth handing to another thread
+    """
+
+    def __init__(self, threads: int = 1, min_chunk: int = 16384):
+        if threads < 1:
+            raise ValueError("Pool must have at least one thread")
+        if min_chunk < 1:
+            raise ValueError("Chunks must hold at least one item")
+        self.threads = threads
+        self.min_chunk = min_chunk
+        self._executor: ThreadPoolExecutor | None = None
+
+    def chunks(self, count: int) -> list[slice]:
+        """
+        :param count: the number of items
+        :return: the consecutive chunks the items are split into
+        """
+        chunks = max(min(self.threads, count // self.min_chunk), 1)
+        bounds = [count * i // chunks for i in range(chunks + 1)]
+        return [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+
+    def map(self, kernel: Callable[[slice], Result], count: int) -> list[Result]:
+        """
+        Runs a kernel on every chunk of some items.
+
+        :param kernel: works on the items of the given chunk. Kernels running at the same time must not write to the
+        same array elements
+        :param count: the number of items
+        :return: the result of the kernel for each chunk, in chunk order
+        """
+        chunks = self.chunks(count)
+        if len(chunks) == 1:
+            return [kernel(chunks[0])]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='particle')
+        return list(self._executor.map(kernel, chunks))
+
+    def accumulate(self, kernel: Callable[[slice], tuple[np.ndarray, np.ndarray]], count: int,
+                   size: int) -> np.ndarray:
+        """
+        Sums values scattered to rows by a kernel, such as the forces of pairs of particles. Each chunk sums its values
+        into its own buffer, and the buffers are added up in chunk order once every chunk is done.
+
+        :param kernel: returns, for the items of the given chunk, the row each value goes to and the values, as an array
+        of shape (n, width)
+        :param count: the number of items
+        :param size: the number of rows
+        :return: the sum of the values of each row, as an array of shape (size, width)
+        """
+        def scatter(chunk: slice) -> np.ndarray:
+            rows, values = kernel(chunk)
+            return np.column_stack([np.bincount(rows, values[:, column], minlength=size)
+                                    for column in range(values.shape[1])]).reshape(size, values.shape[1])
+
+        buffers = self.map(scatter, count)
+        total = buffers[0]
+        for buffer in buffers[1:]:
+            total += buffer
+        return total
+
+    def close(self):
+        """
+        Stops the threads. The pool starts new ones if it is used again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
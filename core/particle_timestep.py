@@ -0,0 +1,155 @@
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from core.particle_integrator import ParticleIntegrator, ParticleEulerIntegrator
+
+if TYPE_CHECKING:
+    from core.particle_world import ParticleWorld
+
+
+class ParticleAdaptiveTimestep:
+    """
+    Chooses the time step of a particle world while it runs, so that calm stretches are crossed in a few large steps and
+    violent ones in many small steps. Attach an instance to ParticleWorld.timestep; run_physics then splits the duration
+    it is given into as many steps as needed.
+
+    Every step is bounded by a stability limit, and checked against an error estimate:
+
+    - the stability limit is a CFL-style bound, so that no particle travels more than `courant` times `length_scale`
+      in one step, together with a fraction of the shortest period among the springs in the force registry;
+    - the error is estimated by step doubling: the step is taken once whole and once as two halves, and the difference
+      between the two positions is the error. A step whose error is above the tolerance is taken again with a smaller
+      duration, and the duration of the next step is scaled by how far the error was from the tolerance.
+
+    :param min_step: the shortest step ever taken, even when the error is above the tolerance
+    :param max_step: the longest step ever taken
+    :param tolerance: the largest position error accepted for a single step
+    :param courant: the fraction of the length scale a particle may travel in one step
+    :param length_scale: the length of the smallest feature of the scene, such as a particle size. No CFL limit is
+    applied if it is not given
+    :param spring_fraction: the fraction of the shortest spring period a step may last
+    :param integrator: the integrator used to take the steps. If not given, the world's integrator is used, or explicit
+    Euler like Particle.integrate when the world has none
+    """
+
+    def __init__(self,
+                 min_step: float,
+                 max_step: float,
+                 tolerance: float,
+                 courant: float = 0.5,
+                 length_scale: float = None,
+                 spring_fraction: float = 0.05,
+                 integrator: ParticleIntegrator = None):
+        if not 0 < min_step <= max_step:
+            raise ValueError("Steps must be positive, with min_step not above max_step")
+        self.min_step = min_step
+        self.max_step = max_step
+        self.tolerance = tolerance
+        self.courant = courant
+        self.length_scale = length_scale
+        self.spring_fraction = spring_fraction
+        self.integrator = integrator
+        self.safety = 0.9
+        self.max_growth = 4.0
+
+        # the step proposed for the next call, updated from the error estimates
+        self.step = min_step
+        # the steps taken during the last call to ParticleWorld.run_physics
+        self.steps: list[float] = []
+        self.last_step = 0.0
+        self.last_error = 0.0
+        self.rejected = 0
+
+    def _integrator(self, world: 'ParticleWorld') -> ParticleIntegrator:
+        return self.integrator or world.integrator or ParticleEulerIntegrator()
+
+    def stability_limit(self, world: 'ParticleWorld') -> float:
+        """
+        Computes the longest stable step for the current state of the world, from the fastest particle and the stiffest
+        spring.
+
+        :param world: the world being simulated
+        :return: the stability limit, or max_step if nothing limits the step
+        """
+        limit = self.max_step
+
+        storage = world.storage
+        if self.length_scale is not None and storage.count:
+            velocity = storage.velocity[:storage.size]
+            max_speed = math.sqrt(float(np.max(np.einsum('ij,ij->i', velocity, velocity))))
+            if max_speed > 0:
+                limit = min(limit, self.courant * self.length_scale / max_speed)
+
+        for particle, generator in world.registry.items():
+            spring_constant = getattr(generator, 'spring_constant', None)
+            if not spring_constant or particle.has_infinite_mass():
+                continue
+            period = 2 * math.pi * math.sqrt(particle.mass / spring_constant)
+            limit = min(limit, self.spring_fraction * period)
+
+        return limit
+
+    def propose(self, world: 'ParticleWorld', remaining: float) -> float:
+        """
+        Proposes the duration of the next step, before it is taken.
+
+        :param world: the world being simulated
+        :param remaining: the time left to simulate in this call to run_physics
+        :return: the duration of the next step
+        """
+        step = max(min(self.step, self.stability_limit(world)), self.min_step)
+        return min(step, remaining)
+
+    def integrate(self, world: 'ParticleWorld', duration: float) -> float:
+        """
+        Integrates the particles of the world for at most the given duration, under error control. The forces of the
+        world must have been updated for this duration.
+
+        :param world: the world being simulated
+        :param duration: the proposed duration of the step
+        :return: the duration of the step actually taken, which is shorter than the proposed one if its error was above
+        the tolerance
+        """
+        integrator = self._integrator(world)
+        rows = world._integration_rows()
+        start = world.storage.select(rows).copy()
+        step = duration
+
+        while True:
+            whole = start.copy()
+            integrator.integrate(whole, step, lambda state: world._update_state_forces(state, step))
+
+            halves = start.copy()
+            half_step = 0.5 * step
+            update_forces = lambda state: world._update_state_forces(state, half_step)
+            integrator.integrate(halves, half_step, update_forces)
+            update_forces(halves)
+            integrator.integrate(halves, half_step, update_forces)
+
+            error = float(np.max(np.abs(halves.position - whole.position), initial=0.0))
+            error /= 2 ** integrator.order - 1
+            if error <= self.tolerance or step <= self.min_step:
+                break
+
+            # reject the step, and retry it from the start with a shorter duration
+            self.rejected += 1
+            step = max(step * max(self._scale(error, integrator.order), 0.1), self.min_step)
+            world._update_state_forces(start, step)
+
+        world.storage.assign(rows, halves)
+
+        self.last_step = step
+        self.last_error = error
+        self.steps.append(step)
+        self.step = min(step * min(self._scale(error, integrator.order), self.max_growth), self.max_step)
+        return step
+
+    def _scale(self, error: float, order: int) -> float:
+        """
+        :return: the factor bringing the error of a step of the given order to the tolerance
+        """
+        if error == 0:
+            return self.max_growth
+        return self.safety * (self.tolerance / error) ** (1 / (order + 1))
@@ -1,37 +1,201 @@
+import time
+from typing import TYPE_CHECKING
+
 from core.particle import Particle
 from core.particle_contact import ParticleContact, ParticleContactResolver, ParticleContactGenerator
 from core.particle_force_generator import ParticleForceRegistry
+from core.particle_world_stats import ParticleWorldStats
+from core.vector import Vector
+
+if TYPE_CHECKING:
+    # The storage and the array machinery need NumPy, which is only loaded once the world holds particles
+    import numpy as np
+
+    from core.particle_integrator import ParticleIntegrator
+    from core.particle_state import ParticleState
+    from core.particle_storage import ParticleStorage, StoredParticle
+    from core.particle_timestep import ParticleAdaptiveTimestep
 
 
 class ParticleWorld:
     """
     Keeps track of a set of particles, an provides the mens to update them all
+
+    The particles live in the preallocated arrays of a ParticleStorage and are added and removed with spawn and
+    despawn. A spawned particle is known by its handle, which stays valid for as long as the particle lives, even when
+    the storage is compacted. The storage is created on first use, so importing and creating a world does not load
+    NumPy.
     """
 
-    def __init__(self, max_contacts: int, iterations: int):
+    def __init__(self, max_contacts: int, iterations: int, integrator: 'ParticleIntegrator' = None, capacity: int = 64,
+                 precision: type = None, threads: int = 1):
         """
         Creates a new particle simulator that can handle up to the given number of contacts per frame. You can also
         optionally give a number of contact-resolution iterations to use. If you don't give a number of iterations,then
         twice the number of contacts will be used
         :param max_contacts:
+        :param integrator: integrates all the particles at once on the storage arrays. If not given, explicit Euler
+        integration is used, like Particle.integrate
+        :param capacity: the number of particles preallocated in the storage, which grows as needed
+        :param precision: the dtype of the particle state, np.float32 or np.float64 if not given. Single precision
+        halves the memory and bandwidth of large worlds, at the cost of some drift over long runs
+        :param threads: the number of threads the integration and the array kernels of force and contact generators
+        split large worlds across
         :return:
         """
-        self.particles: list[Particle] = []
-        self.contacts = []
+        if precision is not None:
+            # whoever passes a dtype has loaded NumPy already
+            from core.particle_state import PRECISIONS
+            if precision not in PRECISIONS:
+                raise ValueError("Precision must be np.float32 or np.float64")
+        self._capacity = capacity
+        self._precision = precision
+        self._storage: ParticleStorage | None = None
+        self._threads = 1
+        self.threads = threads
+        self.contacts = [ParticleContact() for _ in range(max_contacts)]
         self.max_contacts = max_contacts
         self.iterations = iterations
         self.calculater_iterations = (iterations == 0)
         self.registry: ParticleForceRegistry = ParticleForceRegistry()
-        self.resolver: ParticleContactResolver = ParticleContactResolver(10)
+        self.resolver: ParticleContactResolver = ParticleContactResolver(iterations)
         self.contact_gen: list[ParticleContactGenerator] = []
+        self.integrator = integrator
+        self.timestep: ParticleAdaptiveTimestep | None = None
+        # particles whose kinetic energy stays below sleep_energy for sleep_delay seconds are put to sleep. Sleeping is
+        # disabled while sleep_energy is None
+        self.sleep_energy: float | None = None
+        self.sleep_delay = 1.0
+        self.contacts_dropped = 0
+        self.stats: ParticleWorldStats | None = None
+        self._default_integrator: ParticleIntegrator | None = None
+        # storage rows integrated during the current step
+        self._rows: slice | np.ndarray = slice(0, 0)
+
+    @property
+    def storage(self) -> 'ParticleStorage':
+        """
+        :return: the storage of the particles of the world, created with its thread pool on first use
+        """
+        if self._storage is None:
+            from core.particle_storage import ParticleStorage
+            from core.particle_threads import ParticleThreadPool
+            if self._precision is None:
+                self._storage = ParticleStorage(self._capacity)
+            else:
+                self._storage = ParticleStorage(self._capacity, precision=self._precision)
+            self._storage.pool = ParticleThreadPool(self._threads)
+        return self._storage
+
+    @property
+    def threads(self) -> int:
+        """
+        :return: the number of threads the array kernels of the world split their work across
+        """
+        return self._threads
+
+    @threads.setter
+    def threads(self, threads: int):
+        if threads < 1:
+            raise ValueError("Pool must have at least one thread")
+        self._threads = threads
+        if self._storage is not None:
+            from core.particle_threads import ParticleThreadPool
+            pool = self._storage.pool
+            pool.close()
+            self._storage.pool = ParticleThreadPool(threads, pool.min_chunk)
+
+    @property
+    def particles(self) -> 'tuple[StoredParticle, ...]':
+        """
+        :return: the particles of the world, in storage order, as a read-only snapshot. Particles are only added and
+        removed with spawn, spawn_many, despawn and despawn_many
+        """
+        if self._storage is None:
+            return ()
+        handles = self.storage.slot_handle[self.storage.live_slots()].tolist()
+        return tuple(self.storage.particle(handle) for handle in handles)
+
+    def particle(self, handle: int) -> 'StoredParticle':
+        """
+        :param handle: the handle of a particle of the world
+        :return: the particle with the given handle
+        :raise KeyError: if the particle has been despawned
+        """
+        return self.storage.particle(handle)
+
+    def spawn(self, particle: Particle = None) -> 'StoredParticle':
+        """
+        Adds a particle to the world, copying the state of the given particle into a free slot of the storage.
+
+        :param particle: the particle to copy. A default Particle is spawned if not given
+        :return: the particle of the world, bound to its slot. Its handle attribute identifies it
+        """
+        position = Vector.zero() if particle is None else particle.position
+        slots, handles = self.storage.allocate(1, (position.x, position.y, position.z))
+        spawned = self.storage.particle(int(handles[0]))
+        if particle is not None:
+            from core.particle_state import FIELDS
+            for name in FIELDS:
+                setattr(spawned, name, getattr(particle, name))
+            spawned.is_awake = particle.is_awake
+        return spawned
+
+    def spawn_many(self,
+                   count: int,
+                   position: 'np.ndarray' = 0.0,
+                   velocity: 'np.ndarray' = 0.0,
+                   acceleration: 'np.ndarray' = 0.0,
+                   damping: 'np.ndarray | float' = 1.0,
+                   inverse_mass: 'np.ndarray | float' = 1.0,
+                   radius: 'np.ndarray | float' = 0.0) -> 'np.ndarray':
+        """
+        Adds many particles to the world at once, without creating any Particle object. Every argument is either one
+        value per particle or a single value broadcast to all of them.
+
+        :param count: the number of particles to add
+        :param position: the positions, as an array of shape (count, 3) or (3,)
+        :param velocity: the velocities, as an array of shape (count, 3) or (3,)
+        :param acceleration: the accelerations, as an array of shape (count, 3) or (3,)
+        :param damping: the damping of the particles
+        :param inverse_mass: the inverse masses of the particles
+        :param radius: the radii of the particles, used by collision detection
+        :return: the handles of the new particles
+        """
+        storage = self.storage
+        slots, handles = storage.allocate(count, position)
+        storage.velocity[slots] = velocity
+        storage.acceleration[slots] = acceleration
+        storage.damping[slots] = damping
+        storage.inverse_mass[slots] = inverse_mass
+        storage.radius[slots] = radius
+        return handles
+
+    def despawn(self, particle: 'StoredParticle | int'):
+        """
+        Removes a particle from the world, along with the force generators registered to it. Its slot is reused by the
+        next particle spawned.
+
+        :param particle: the particle to remove, or its handle
+        """
+        self.despawn_many([getattr(particle, 'handle', particle)])
+
+    def despawn_many(self, handles: 'np.ndarray'):
+        """
+        Removes many particles from the world at once, along with the force generators registered to them.
+
+        :param handles: the handles of the particles to remove
+        """
+        for particle in self.storage.release(handles):
+            self.registry.remove_particle(particle)
 
     def start_frame(self):
         """
         Initializes the world for a simulation frame. This clears the force accumulators for particles in the for the
         particles in the world. After calling this,the particles can have their forces for the frame added.
         """
-        for particle in self.particles:
-            particle.clear_accumulator()
+        if self._storage is not None:
+            self._storage.force_accum[:self._storage.size] = 0
 
     def generate_contacts(self) -> int:
         """
@@ -42,16 +206,20 @@ class ParticleWorld:
         """
         limit = self.max_contacts
         contact_i = 0
-        for g in self.contact_gen:
-            next_contact = self.contacts[contact_i]
-            used = g.add_contact(next_contact, limit)
-            limit -= used
-            contact_i += used
-
+        self.contacts_dropped = 0
+        for i, g in enumerate(self.contact_gen):
             # we have run out of contacts to fill. This means we're missing contacts.
             if limit <= 0:
+                if self.stats is not None:
+                    self.contacts_dropped += sum(skipped.count_contacts() for skipped in self.contact_gen[i:])
                 break
 
+            used = g.add_contacts(self.contacts, contact_i, limit)
+            limit -= used
+            contact_i += used
+            if self.stats is not None:
+                self.contacts_dropped += g.dropped
+
         # Return the number of contacts used;
         return self.max_contacts - limit
 
@@ -61,20 +229,140 @@ class ParticleWorld:
 
         :param duration: the duration
         """
-        for particle in self.particles:
-            # remove all forces from the accumulator
-            particle.integrate(duration)
+        integrator = self.integrator or self._default_integrator
+        if integrator is None:
+            from core.particle_integrator import ParticleEulerIntegrator
+            integrator = self._default_integrator = ParticleEulerIntegrator()
+        rows = self._integration_rows()
+        count = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        if integrator.pointwise:
+            self.storage.pool.map(lambda chunk: self._integrate_rows(integrator, rows, chunk, duration), count)
+        else:
+            self._integrate_rows(integrator, rows, slice(0, count), duration)
+
+    def _integrate_rows(self, integrator: 'ParticleIntegrator', rows: 'slice | np.ndarray', chunk: slice,
+                        duration: float):
+        """
+        Integrates a chunk of the rows of the step. Chunks of a slice of rows are integrated in place.
+
+        :param integrator: the integrator of the world
+        :param rows: the rows integrated this step, from _integration_rows
+        :param chunk: the part of the rows to integrate
+        :param duration: the duration of the step
+        """
+        if isinstance(rows, slice):
+            rows = slice(rows.start + chunk.start, rows.start + chunk.stop)
+        else:
+            rows = rows[chunk]
+        state = self.storage.select(rows)
+        integrator.integrate(state, duration, lambda s: self._update_state_forces(s, duration))
+        if not isinstance(rows, slice):
+            self.storage.assign(rows, state)
+
+    def _integration_rows(self) -> 'slice | np.ndarray':
+        """
+        Finds the storage rows to integrate this step: those of the particles that are alive and awake. Holes left by
+        despawned particles are inert, so when no particle is asleep every row below the storage size is integrated,
+        and a slice is returned so that the integrator works on the arrays in place.
+
+        :return: the rows, as a slice or as an array of row indices
+        """
+        storage = self.storage
+        asleep = storage.alive[:storage.size] & ~storage.awake[:storage.size]
+        if asleep.any():
+            self._rows = storage.awake_slots()
+        else:
+            self._rows = slice(0, storage.size)
+        return self._rows
+
+    def _update_state_forces(self, state: 'ParticleState', duration: float):
+        """
+        Recomputes the forces of the rows being integrated, at the positions and velocities held by the given state.
+        Used by integrators that evaluate forces more than once per step.
+
+        :param state: the rows of the storage being integrated, as selected by integrate
+        :param duration: the duration of the step
+        """
+        storage = self.storage
+        storage.position[self._rows] = state.position
+        storage.velocity[self._rows] = state.velocity
+        self.start_frame()
+        self.registry.update_forces(duration)
+        state.force_accum[:] = storage.force_accum[self._rows]
+
+    def update_sleep(self, duration: float):
+        """
+        Puts to sleep the particles whose kinetic energy has stayed below sleep_energy for sleep_delay seconds.
+
+        :param duration: the duration of the step that was just simulated
+        """
+        if self._storage is None:
+            return
+        storage = self.storage
+        size = storage.size
+        awake = storage.alive[:size] & storage.awake[:size]
+        calm = awake & (storage.select(slice(0, size)).kinetic_energy() < self.sleep_energy)
+
+        sleep_time = storage.sleep_time[:size]
+        sleep_time[awake & ~calm] = 0
+        sleep_time[calm] += duration
+
+        falling_asleep = calm & (sleep_time >= self.sleep_delay)
+        storage.awake[:size][falling_asleep] = False
+        storage.velocity[:size][falling_asleep] = 0
+        storage.force_accum[:size][falling_asleep] = 0
+        sleep_time[falling_asleep] = 0
 
     def run_physics(self, duration: float):
         """
-        processes all the physics for the particle world
+        processes all the physics for the particle world. With an adaptive timestep, the duration is split into as many
+        steps as the timestep controller chooses.
         :param duration: the duration
         """
+        if self.timestep is None:
+            self._run_step(duration)
+        else:
+            self.timestep.steps = []
+            remaining = duration
+            while remaining > duration * 1e-9:
+                remaining -= self._run_step(self.timestep.propose(self, remaining))
+
+        # slots are only cached within a step, so despawned slots can be reclaimed now
+        if self._storage is not None:
+            self._storage.compact_if_sparse()
+
+    def _integrate_step(self, duration: float) -> float:
+        """
+        Integrates the particles, under the error control of the adaptive timestep if there is one.
+
+        :param duration: the duration of the step
+        :return: the duration actually integrated
+        """
+        # a world that never held a particle has nothing to integrate
+        if self._storage is None:
+            return duration
+        storage = self.storage
+        storage.previous_position[:storage.size] = storage.position[:storage.size]
+        if self.timestep is None:
+            self.integrate(duration)
+            return duration
+        return self.timestep.integrate(self, duration)
+
+    def _run_step(self, duration: float) -> float:
+        """
+        Runs a single step of the physics.
+
+        :param duration: the duration of the step
+        :return: the duration actually simulated, which an adaptive timestep may have shortened
+        """
+        if self.stats is not None:
+            return self._run_step_recorded(duration)
+
         # first apply the force generators
         self.registry.update_forces(duration)
 
         # then integrate the objects
-        self.integrate(duration)
+        duration = self._integrate_step(duration)
 
         # generate contacts
         used_contacts = self.generate_contacts()
@@ -84,3 +372,44 @@ class ParticleWorld:
             self.resolver.iterations = used_contacts * 2
         self.resolver.resolve_contacts(self.contacts, used_contacts, duration)
 
+        if self.sleep_energy is not None:
+            self.update_sleep(duration)
+        return duration
+
+    def _run_step_recorded(self, duration: float) -> float:
+        """
+        Same as _run_step, but times every phase and records the step in the world stats.
+
+        :param duration: the duration of the step
+        :return: the duration actually simulated
+        """
+        start = time.perf_counter()
+        self.registry.update_forces(duration)
+        forces_done = time.perf_counter()
+
+        duration = self._integrate_step(duration)
+        integrate_done = time.perf_counter()
+
+        used_contacts = self.generate_contacts()
+        contacts_done = time.perf_counter()
+
+        if self.calculater_iterations:
+            self.resolver.iterations = used_contacts * 2
+        self.resolver.resolve_contacts(self.contacts, used_contacts, duration)
+        if self.sleep_energy is not None:
+            self.update_sleep(duration)
+        resolve_done = time.perf_counter()
+
+        self.stats.record({
+            'update_forces': forces_done - start,
+            'integrate': integrate_done - forces_done,
+            'generate_contacts': contacts_done - integrate_done,
+            'resolve_contacts': resolve_done - contacts_done,
+            'frame': resolve_done - start,
+            'step': duration,
+            'contacts': used_contacts,
+            'iterations': self.resolver.iterations_used,
+            'contacts_dropped': self.contacts_dropped,
+            'warm_started': self.resolver.cache.warm_started if self.resolver.cache is not None else 0,
+        })
+        return duration
@@ -0,0 +1,94 @@
+import math
+from collections import deque
+
+# The phases of ParticleWorld.run_physics, in the order they are run
+PHASES = ('update_forces', 'integrate', 'generate_contacts', 'resolve_contacts')
+
+# Every metric recorded for a frame. Phase and frame metrics are wall-clock durations in seconds, the step is the
+# simulated duration of the frame
+METRICS = PHASES + ('frame', 'step', 'contacts', 'iterations', 'contacts_dropped', 'warm_started')
+
+
+class ParticleWorldStats:
+    """
+    Collects per-frame statistics of a particle world: how long each phase of run_physics took, the duration simulated,
+    how many contacts were generated, how many iterations the resolver used, how many contacts were dropped because
+    the contact buffer was full, as counted by the generators themselves, and how many contacts were warm started from
+    the last frame. With an adaptive timestep every step is recorded as a frame. Only the last `window` frames are kept,
+    so the percentiles roll with the simulation and the memory used is bounded.
+
+    Statistics are opt-in: attach an instance to ParticleWorld.stats to start recording, and set it back to None to
+    stop. A world without stats only pays for a single attribute check per frame.
+
+    :param window: the number of frames kept for the rolling percentiles
+    """
+
+    def __init__(self, window: int = 600):
+        if window <= 0:
+            raise ValueError("Window must hold at least one frame")
+        self.window = window
+        self.frames = 0
+        self.last: dict[str, float] = {}
+        self._history: dict[str, deque] = {metric: deque(maxlen=window) for metric in METRICS}
+
+    def record(self, frame: dict[str, float]):
+        """
+        Records the statistics of one frame. Metrics missing from the frame are recorded as zero.
+
+        :param frame: the value of each metric for the frame
+        """
+        self.frames += 1
+        self.last = {metric: frame.get(metric, 0) for metric in METRICS}
+        for metric, value in self.last.items():
+            self._history[metric].append(value)
+
+    def history(self, metric: str) -> list[float]:
+        """
+        :param metric: the name of the metric, one of METRICS
+        :return: the values of the metric for the frames in the window, oldest first
+        """
+        return list(self._history[metric])
+
+    def percentile(self, metric: str, q: float) -> float:
+        """
+        Returns the q-th percentile of a metric over the frames in the window, using the nearest-rank method so the
+        result is always a recorded value.
+
+        :param metric: the name of the metric, one of METRICS
+        :param q: the percentile, in the range [0, 100]
+        :return: the percentile, or 0 if no frame was recorded yet
+        """
+        if not 0 <= q <= 100:
+            raise ValueError("Percentile must be in the range [0, 100]")
+        values = sorted(self._history[metric])
+        if not values:
+            return 0
+        rank = max(math.ceil(q / 100 * len(values)), 1)
+        return values[rank - 1]
+
+    def summary(self, percentiles: tuple[float, ...] = (50, 95, 99)) -> dict[str, dict[str, float]]:
+        """
+        Summarizes every metric over the frames in the window.
+
+        :param percentiles: the percentiles to report for each metric
+        :return: for each metric, the requested percentiles keyed as 'p50', 'p95', ... and the maximum as 'max'
+        """
+        result = {}
+        for metric in METRICS:
+            values = sorted(self._history[metric])
+            summary = {}
+            for q in percentiles:
+                rank = max(math.ceil(q / 100 * len(values)), 1)
+                summary[f'p{q:g}'] = values[rank - 1] if values else 0
+            summary['max'] = values[-1] if values else 0
+            result[metric] = summary
+        return result
+
+    def reset(self):
+        """
+        Forgets every recorded frame.
+        """
+        self.frames = 0
+        self.last = {}
+        for values in self._history.values():
+            values.clear()
@@ -0,0 +1,362 @@
+import numpy as np
+
+from core.matrix import Matrix3, Matrix4
+
+
+def quaternion_product(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    :param first: quaternions (r, i, j, k), as an array of shape (n, 4)
+    :param second: quaternions, as an array of shape (n, 4)
+    :return: the product of each pair of quaternions
+    """
+    r1, i1, j1, k1 = first.T
+    r2, i2, j2, k2 = second.T
+    return np.column_stack([r1 * r2 - i1 * i2 - j1 * j2 - k1 * k2,
+                            r1 * i2 + i1 * r2 + j1 * k2 - k1 * j2,
+                            r1 * j2 + j1 * r2 + k1 * i2 - i1 * k2,
+                            r1 * k2 + k1 * r2 + i1 * j2 - j1 * i2])
+
+
+def rotation_matrices(orientations: np.ndarray) -> np.ndarray:
+    """
+    :param orientations: unit quaternions (r, i, j, k), as an array of shape (n, 4)
+    :return: the rotation matrix of each quaternion, as an array of shape (n, 3, 3)
+    """
+    r, i, j, k = orientations.T
+    return np.stack([
+        np.stack([1 - 2 * (j * j + k * k), 2 * (i * j - r * k), 2 * (i * k + r * j)], axis=-1),
+        np.stack([2 * (i * j + r * k), 1 - 2 * (i * i + k * k), 2 * (j * k - r * i)], axis=-1),
+        np.stack([2 * (i * k - r * j), 2 * (j * k + r * i), 1 - 2 * (i * i + j * j)], axis=-1),
+    ], axis=1)
+
+
+def box_inertia_tensors(half_sizes: np.ndarray, mass: np.ndarray | float) -> np.ndarray:
+    """
+    :param half_sizes: the half extents of solid boxes along their axes, as an array of shape (n, 3)
+    :param mass: the mass of each box
+    :return: the inertia tensor of each box about its centre, in body space, as an array of shape (n, 3, 3)
+    """
+    squares = (2 * np.asarray(half_sizes, dtype=float)) ** 2
+    moments = np.asarray(mass, dtype=float).reshape(-1, 1) / 12 * (squares.sum(axis=1, keepdims=True) - squares)
+    return moments[:, :, None] * np.eye(3)
+
+
+class RigidBodySet:
+    """
+    Holds many rigid bodies in struct-of-arrays form and integrates them all at once, the array counterpart of the
+    rigid body of the book. Each body is a row of the arrays: its position, its orientation as a unit quaternion
+    (r, i, j, k), its linear velocity and its angular velocity (rotation) in world space, its inverse mass, and its
+    inverse inertia tensor in body space.
+
+    Every step also derives, for all bodies in one batch, the data the forces and the collision detection need: the
+    transform from body space to world space, as the 3x4 matrices of Matrix4, and the inverse inertia tensor in world
+    space. The per-body accessors return those as Matrix4 and Matrix3.
+
+    Derived data is cached: each body has a dirty flag, set when its position or orientation changes, and only the
+    dirty bodies are updated, so resting bodies cost nothing. The transforms from world space back to body space are
+    computed on demand, for the bodies queried, and cached the same way, as are the Matrix4 and Matrix3 returned by the
+    accessors; repeated queries within a frame are free. Code writing to the position or orientation arrays directly
+    must call mark_moved.
+
+    Forces and torques are accumulated over a frame, then cleared by integrate.
+
+    :param capacity: the number of bodies preallocated, the arrays doubling as needed
+    """
+
+    COLUMNS = ('position', 'orientation', 'velocity', 'rotation', 'acceleration', 'inverse_mass',
+               'inverse_inertia_tensor', 'linear_damping', 'angular_damping', 'force_accum', 'torque_accum',
+               'transform_matrix', 'inverse_inertia_tensor_world', 'inverse_transform_matrix', '_dirty',
+               '_inverse_dirty')
+
+    def __init__(self, capacity: int = 64):
+        capacity = max(capacity, 1)
+        self.count = 0
+        self.position = np.zeros((capacity, 3))
+        self.orientation = np.tile((1.0, 0.0, 0.0, 0.0), (capacity, 1))
+        self.velocity = np.zeros((capacity, 3))
+        self.rotation = np.zeros((capacity, 3))
+        self.acceleration = np.zeros((capacity, 3))
+        self.inverse_mass = np.zeros(capacity)
+        self.inverse_inertia_tensor = np.zeros((capacity, 3, 3))
+        self.linear_damping = np.ones(capacity)
+        self.angular_damping = np.ones(capacity)
+        self.force_accum = np.zeros((capacity, 3))
+        self.torque_accum = np.zeros((capacity, 3))
+        # derived data
+        self.transform_matrix = np.zeros((capacity, 3, 4))
+        self.inverse_inertia_tensor_world = np.zeros((capacity, 3, 3))
+        self.inverse_transform_matrix = np.zeros((capacity, 3, 4))
+        # the bodies whose derived data, and whose inverse transform, are out of date
+        self._dirty = np.zeros(capacity, dtype=bool)
+        self._inverse_dirty = np.zeros(capacity, dtype=bool)
+        self._any_dirty = False
+        # the Matrix4 and Matrix3 returned by the accessors, by body
+        self._matrices: dict[int, dict[str, Matrix3 | Matrix4]] = {}
+        # the number of times the derived data of a body was computed
+        self.derived_updates = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return len(self.inverse_mass)
+
+    def _grow(self, capacity: int):
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros((capacity, *column.shape[1:]), dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+        self.orientation[self.count:, 0] = 1
+        self.linear_damping[self.count:] = 1
+        self.angular_damping[self.count:] = 1
+
+    def add_bodies(self,
+                   count: int,
+                   position: np.ndarray = 0.0,
+                   orientation: np.ndarray = (1.0, 0.0, 0.0, 0.0),
+                   velocity: np.ndarray = 0.0,
+                   rotation: np.ndarray = 0.0,
+                   acceleration: np.ndarray = 0.0,
+                   inverse_mass: np.ndarray | float = 1.0,
+                   inverse_inertia_tensor: np.ndarray | Matrix3 = None,
+                   linear_damping: np.ndarray | float = 1.0,
+                   angular_damping: np.ndarray | float = 1.0) -> np.ndarray:
+        """
+        Adds many bodies at once. Every argument is either one value per body or a single value broadcast to all of
+        them.
+
+        :param count: the number of bodies to add
+        :param position: the positions of the centres of mass, as an array of shape (count, 3) or (3,)
+        :param orientation: the orientations, as quaternions (r, i, j, k) of shape (count, 4) or (4,), normalized here
+        :param velocity: the linear velocities
+        :param rotation: the angular velocities, in world space
+        :param acceleration: the constant accelerations, such as gravity
+        :param inverse_mass: the inverse masses, 0 for immovable bodies
+        :param inverse_inertia_tensor: the inverse inertia tensors in body space, as an array of shape (count, 3, 3)
+        or (3, 3) or as a Matrix3. Defaults to that of a unit mass sphere of unit radius
+        :param linear_damping: the fraction of the linear velocity kept after a second
+        :param angular_damping: the fraction of the angular velocity kept after a second
+        :return: the indices of the new bodies
+        """
+        if inverse_inertia_tensor is None:
+            inverse_inertia_tensor = np.eye(3) * 2.5
+        elif isinstance(inverse_inertia_tensor, Matrix3):
+            inverse_inertia_tensor = np.reshape(inverse_inertia_tensor.data, (3, 3))
+        if self.count + count > self.capacity:
+            self._grow(max(self.capacity * 2, self.count + count))
+
+        bodies = np.arange(self.count, self.count + count)
+        self.count += count
+        self.position[bodies] = position
+        self.orientation[bodies] = orientation
+        self.velocity[bodies] = velocity
+        self.rotation[bodies] = rotation
+        self.acceleration[bodies] = acceleration
+        self.inverse_mass[bodies] = inverse_mass
+        self.inverse_inertia_tensor[bodies] = inverse_inertia_tensor
+        self.linear_damping[bodies] = linear_damping
+        self.angular_damping[bodies] = angular_damping
+        self.force_accum[bodies] = 0
+        self.torque_accum[bodies] = 0
+        self.mark_moved(bodies)
+        self.calculate_derived_data()
+        return bodies
+
+    def add_boxes(self, count: int, half_sizes: np.ndarray, mass: np.ndarray | float, **kwargs) -> np.ndarray:
+        """
+        Adds solid boxes of uniform density, such as crates.
+
+        :param half_sizes: the half extents of the boxes along their axes, as an array of shape (count, 3) or (3,)
+        :param mass: the masses of the boxes
+        :param kwargs: the other arguments of add_bodies
+        :return: the indices of the new bodies
+        """
+        inertia = box_inertia_tensors(np.broadcast_to(half_sizes, (count, 3)), np.broadcast_to(mass, count))
+        return self.add_bodies(count, inverse_mass=1 / np.asarray(mass, dtype=float),
+                               inverse_inertia_tensor=np.linalg.inv(inertia), **kwargs)
+
+    def mark_moved(self, bodies: np.ndarray):
+        """
+        Marks the derived data of some bodies as out of date, after their position or orientation was changed.
+
+        :param bodies: the indices of the bodies
+        """
+        self._dirty[bodies] = True
+        self._inverse_dirty[bodies] = True
+        self._any_dirty = True
+        if self._matrices:
+            for body in np.intersect1d(bodies, list(self._matrices)).tolist():
+                del self._matrices[body]
+
+    def calculate_derived_data(self):
+        """
+        Normalizes the orientations, and computes the transform matrices and the inverse inertia tensors in world space
+        of the bodies marked as moved.
+        """
+        if not self._any_dirty:
+            return
+        count = self.count
+        dirty = self._dirty[:count]
+        bodies = slice(0, count) if dirty.all() else np.flatnonzero(dirty)
+        orientation = self.orientation[bodies]
+        orientation /= np.linalg.norm(orientation, axis=1, keepdims=True)
+        self.orientation[bodies] = orientation
+        rotation = rotation_matrices(orientation)
+        self.transform_matrix[bodies, :, :3] = rotation
+        self.transform_matrix[bodies, :, 3] = self.position[bodies]
+        # R I^-1 R^T
+        self.inverse_inertia_tensor_world[bodies] = rotation @ self.inverse_inertia_tensor[bodies] @ rotation.transpose(
+            0, 2, 1)
+        self.derived_updates += len(rotation)
+        dirty[:] = False
+        self._any_dirty = False
+
+    def inverse_transforms(self, bodies: np.ndarray) -> np.ndarray:
+        """
+        :param bodies: the indices of some bodies
+        :return: the transforms from world space to the body space of the bodies, as an array of shape (n, 3, 4)
+        """
+        self.calculate_derived_data()
+        dirty = self._inverse_dirty[bodies]
+        if dirty.any():
+            stale = np.unique(np.asarray(bodies).reshape(-1)[dirty.reshape(-1)])
+            # the rotation is orthonormal, so its inverse is its transpose
+            rotation = self.transform_matrix[stale, :, :3].transpose(0, 2, 1)
+            self.inverse_transform_matrix[stale, :, :3] = rotation
+            self.inverse_transform_matrix[stale, :, 3] = -np.einsum('nij,nj->ni', rotation,
+                                                                    self.transform_matrix[stale, :, 3])
+            self._inverse_dirty[stale] = False
+        return self.inverse_transform_matrix[bodies]
+
+    def add_forces(self, bodies: np.ndarray, forces: np.ndarray):
+        """
+        Adds forces acting at the centres of mass of some bodies.
+
+        :param bodies: the indices of the bodies, a body appearing more than once getting every force given to it
+        :param forces: the forces, as an array of shape (n, 3) or (3,)
+        """
+        bodies = np.asarray(bodies, dtype=np.int64).reshape(-1)
+        np.add.at(self.force_accum, bodies, np.broadcast_to(forces, (len(bodies), 3)))
+
+    def add_forces_at_points(self, bodies: np.ndarray, forces: np.ndarray, points: np.ndarray):
+        """
+        Adds forces acting at points given in world space, which also add torques to the bodies.
+
+        :param bodies: the indices of the bodies
+        :param forces: the forces, as an array of shape (n, 3) or (3,)
+        :param points: the points of application in world space, as an array of shape (n, 3) or (3,)
+        """
+        bodies = np.asarray(bodies, dtype=np.int64).reshape(-1)
+        forces = np.broadcast_to(forces, (len(bodies), 3))
+        arms = np.broadcast_to(points, (len(bodies), 3)) - self.position[bodies]
+        np.add.at(self.force_accum, bodies, forces)
+        np.add.at(self.torque_accum, bodies, np.cross(arms, forces))
+
+    def add_forces_at_body_points(self, bodies: np.ndarray, forces: np.ndarray, points: np.ndarray):
+        """
+        Adds forces acting at points given in the body space of each body, such as the corners of crates.
+
+        :param bodies: the indices of the bodies
+        :param forces: the forces in world space, as an array of shape (n, 3) or (3,)
+        :param points: the points of application in body space, as an array of shape (n, 3) or (3,)
+        """
+        bodies = np.asarray(bodies, dtype=np.int64).reshape(-1)
+        self.add_forces_at_points(bodies, forces, self.local_to_world(bodies, points))
+
+    def add_torques(self, bodies: np.ndarray, torques: np.ndarray):
+        """
+        Adds torques about the centres of mass of some bodies.
+
+        :param bodies: the indices of the bodies
+        :param torques: the torques in world space, as an array of shape (n, 3) or (3,)
+        """
+        bodies = np.asarray(bodies, dtype=np.int64).reshape(-1)
+        np.add.at(self.torque_accum, bodies, np.broadcast_to(torques, (len(bodies), 3)))
+
+    def local_to_world(self, bodies: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """
+        :param bodies: the indices of the bodies
+        :param points: points in the body space of each body, as an array of shape (n, 3) or (3,)
+        :return: the points in world space
+        """
+        self.calculate_derived_data()
+        return self._apply(self.transform_matrix[bodies], points)
+
+    def world_to_local(self, bodies: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """
+        :param bodies: the indices of the bodies
+        :param points: points in world space, as an array of shape (n, 3) or (3,)
+        :return: the points in the body space of each body
+        """
+        return self._apply(self.inverse_transforms(bodies), points)
+
+    @staticmethod
+    def _apply(transforms: np.ndarray, points: np.ndarray) -> np.ndarray:
+        points = np.broadcast_to(points, (len(transforms), 3))
+        return np.einsum('nij,nj->ni', transforms[:, :, :3], points) + transforms[:, :, 3]
+
+    def integrate(self, duration: float):
+        """
+        Integrates every body forward in time by the given duration, then updates the derived data and clears the
+        accumulated forces and torques.
+
+        :param duration: the duration of the step
+        """
+        self.calculate_derived_data()
+        count = self.count
+        last_frame_acceleration = self.acceleration[:count] + self.force_accum[:count] * self.inverse_mass[:count, None]
+        angular_acceleration = np.einsum('nij,nj->ni', self.inverse_inertia_tensor_world[:count],
+                                         self.torque_accum[:count])
+
+        velocity, rotation = self.velocity[:count], self.rotation[:count]
+        velocity += last_frame_acceleration * duration
+        rotation += angular_acceleration * duration
+        velocity *= (self.linear_damping[:count] ** duration)[:, None]
+        rotation *= (self.angular_damping[:count] ** duration)[:, None]
+
+        moved = velocity.any(axis=1) | rotation.any(axis=1)
+        self.position[:count] += velocity * duration
+        # q += dt / 2 * (0, w) q
+        spin = np.column_stack([np.zeros(count), rotation])
+        self.orientation[:count] += quaternion_product(spin, self.orientation[:count]) * (0.5 * duration)
+
+        if moved.any():
+            self.mark_moved(np.flatnonzero(moved))
+        self.calculate_derived_data()
+        self.force_accum[:count] = 0
+        self.torque_accum[:count] = 0
+
+    def _matrix(self, body: int, kind: str, make) -> Matrix3 | Matrix4:
+        """
+        :return: the cached matrix of the given kind of a body, made by make if it is not cached
+        """
+        self.calculate_derived_data()
+        matrices = self._matrices.setdefault(int(body), {})
+        if kind not in matrices:
+            matrices[kind] = make()
+        return matrices[kind]
+
+    def transform(self, body: int) -> Matrix4:
+        """
+        :param body: the index of a body
+        :return: the transform from the body space of the body to world space
+        """
+        return self._matrix(body, 'transform', lambda: Matrix4(self.transform_matrix[body].ravel().tolist()))
+
+    def inverse_transform(self, body: int) -> Matrix4:
+        """
+        :param body: the index of a body
+        :return: the transform from world space to the body space of the body
+        """
+        return self._matrix(body, 'inverse_transform',
+                            lambda: Matrix4(self.inverse_transforms(np.array([body]))[0].ravel().tolist()))
+
+    def world_inverse_inertia(self, body: int) -> Matrix3:
+        """
+        :param body: the index of a body
+        :return: the inverse inertia tensor of the body in world space
+        """
+        return self._matrix(body, 'world_inverse_inertia',
+                            lambda: Matrix3(self.inverse_inertia_tensor_world[body].ravel().tolist()))
@@ -0,0 +1,53 @@
+import math
+import unittest
+
+from core.matrix import Matrix3, Matrix4
+from core.vector import Vector
+
+
+class Matrix3Test(unittest.TestCase):
+    matrix = Matrix3([2, 0, 1, 1, 3, 0, 0, 1, 4])
+
+    def test_determinant(self):
+        self.assertEqual(self.matrix.determinant(), 25)
+        self.assertEqual(Matrix3().determinant(), 0)
+
+    def test_inverse(self):
+        product = self.matrix * self.matrix.inverse()
+        for value, expected in zip(product.data, [1, 0, 0, 0, 1, 0, 0, 0, 1]):
+            self.assertAlmostEqual(value, expected)
+        self.assertRaises(ValueError, Matrix3().inverse)
+
+    def test_transpose(self):
+        self.assertEqual(self.matrix.transpose().data, [2, 1, 0, 0, 3, 1, 1, 0, 4])
+
+    def test_transform(self):
+        self.assertEqual(self.matrix * Vector(1, 2, 3), Vector(5, 7, 14))
+
+
+class Matrix4Test(unittest.TestCase):
+    # a quarter turn about z, then a translation
+    transform = Matrix4([0, -1, 0, 1,
+                         1, 0, 0, 2,
+                         0, 0, 1, 3])
+
+    def test_transform_vector(self):
+        self.assertEqual(self.transform * Vector(1, 0, 0), Vector(1, 3, 3))
+
+    def test_combine(self):
+        combined = self.transform * self.transform
+        self.assertEqual(combined * Vector(1, 0, 0), self.transform * (self.transform * Vector(1, 0, 0)))
+
+    def test_determinant(self):
+        self.assertEqual(self.transform.determinant(), 1)
+
+    def test_inverse(self):
+        for inverse in (self.transform.inverse(), self.transform.rigid_inverse()):
+            self.assertEqual(inverse * (self.transform * Vector(4, 5, 6)), Vector(4, 5, 6))
+        scaled = Matrix4([2, 0, 0, 1, 0, 4, 0, 0, 0, 0, 0.5, 0])
+        self.assertEqual(scaled.inverse() * Vector(3, 4, 0.5), Vector(1, 1, 1))
+        self.assertRaises(ValueError, Matrix4([0] * 12).inverse)
+
+    def test_linear(self):
+        angle = math.atan2(self.transform.linear().data[3], self.transform.linear().data[0])
+        self.assertAlmostEqual(angle, math.pi / 2)
@@ -0,0 +1,150 @@
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_contact import ParticleContact, ParticleContactCache
+from core.particle_contact_batches import ParticleBatchContactResolver, color_constraints, match_contacts
+from core.particle_link import ParticleRod
+from core.particle_world import ParticleWorld
+from core.particle_world_stats import ParticleWorldStats
+from core.vector import Vector
+from tests.core.particle_piles import pile
+
+
+def assert_independent(test: unittest.TestCase, first: np.ndarray, second: np.ndarray, colors: np.ndarray):
+    test.assertTrue((colors >= 0).all())
+    for color in range(colors.max() + 1):
+        ends = np.concatenate([first[colors == color], second[colors == color]])
+        ends = ends[ends >= 0]
+        test.assertEqual(len(np.unique(ends)), len(ends))
+
+
+class ColorConstraintsTest(unittest.TestCase):
+
+    def test_chain(self):
+        first = np.arange(1000)
+        colors = color_constraints(first, first + 1)
+        assert_independent(self, first, first + 1, colors)
+        # a chain needs two colors, and the maximal colors leave few constraints for a third one
+        self.assertLessEqual(colors.max() + 1, 3)
+        np.testing.assert_array_equal(colors, color_constraints(first, first + 1))
+
+    def test_random_graph(self):
+        rng = np.random.default_rng(1)
+        first, second = rng.integers(0, 500, 5000), rng.integers(0, 500, 5000)
+        second[first == second] = -1
+        colors = color_constraints(first, second)
+        assert_independent(self, first, second, colors)
+        degree = np.bincount(np.concatenate([first, second[second >= 0]])).max()
+        self.assertLess(colors.max() + 1, 2 * degree)
+
+    def test_unshared_ends(self):
+        # constraints with the scenery only conflict through their particle
+        colors = color_constraints(np.array([0, 0, 1, 2]), np.array([-1, -1, -1, -1]))
+        self.assertEqual(sorted(colors.tolist()), [0, 0, 0, 1])
+        self.assertEqual(len(color_constraints(np.zeros(0), np.zeros(0))), 0)
+
+
+class MatchContactsTest(unittest.TestCase):
+
+    def test_matches_by_pair_and_normal(self):
+        up, side = (0, 1, 0), (1, 0, 0)
+        # the third particle rests on two planes, whose contacts are matched in order
+        cached = np.array([[1, -1], [2, 5], [3, -1], [3, -1]]), np.array([up, side, up, side], dtype=float)
+        first, second = np.array([3, 2, 1, 3, 3, 4]), np.array([-1, 5, -1, -1, -1, -1])
+        normals = np.array([side, up, up, up, up, up], dtype=float)
+        matched = match_contacts(first, second, normals, cached[0][:, 0], cached[0][:, 1], cached[1], 0.9)
+        self.assertEqual(matched.tolist(), [3, -1, 0, 2, -1, -1])
+        empty = np.zeros(0, dtype=np.int64)
+        self.assertEqual(match_contacts(first, second, normals, empty, empty, np.zeros((0, 3)), 0.9).tolist(), [-1] * 6)
+
+
+class ParticleBatchContactResolverTest(unittest.TestCase):
+
+    def test_matches_sequential_resolution(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        world.spawn_many(3, position=[(0, 0, 0), (1, 0, 0), (5, 0, 0)], velocity=[(1, 0, 0), (-1, 0, 0), (0, -2, 0)],
+                         inverse_mass=[1, 0.5, 2])
+        a, b, c = world.particles
+        contacts = [ParticleContact((a, b), restitution=0.5, contact_normal=Vector(-1, 0, 0), penetration=0.3),
+                    ParticleContact(c, restitution=1, contact_normal=Vector(0, 1, 0))]
+        resolver = ParticleBatchContactResolver(world.storage, 10)
+        resolver.resolve_contacts(contacts, 2, 0.1)
+
+        # momentum is kept, the closing speed of 2 bounces back at 1, and the scenery bounces the third particle
+        np.testing.assert_allclose(world.storage.velocity[:3], [(-1, 0, 0), (0, 0, 0), (0, 2, 0)], atol=1e-12)
+        np.testing.assert_allclose(world.storage.position[:2, 0], [-0.2, 1.1])
+        self.assertEqual((resolver.colors, resolver.iterations_used), (1, 1))
+        self.assertAlmostEqual(contacts[0].accumulated_impulse, 2)
+
+    def test_impulse_carries_over(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        world.spawn_many(1, velocity=(0, -1, 0), inverse_mass=0.5)
+        particle, = world.particles
+        contact = ParticleContact(particle, contact_normal=Vector(0, 1, 0))
+        resolver = ParticleBatchContactResolver(world.storage, 10, ParticleContactCache())
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertAlmostEqual(contact.accumulated_impulse, 2)
+        self.assertEqual(len(resolver.cache), 1)
+
+        # the same contact closing at the same speed is held by the carried impulse alone
+        particle.velocity = Vector(0, -1, 0)
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertEqual((resolver.iterations_used, resolver.cache.warm_started), (0, 1))
+        self.assertEqual(particle.velocity, Vector(0, 0, 0))
+        self.assertAlmostEqual(contact.warm_impulse, 2)
+
+        # closing slower, the part of the impulse that would push the particle away is taken back
+        particle.velocity = Vector(0, -0.25, 0)
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertEqual(resolver.iterations_used, 1)
+        self.assertEqual(particle.velocity, Vector(0, 0, 0))
+        self.assertAlmostEqual(contact.accumulated_impulse, 0.5)
+
+    def test_wakes_sleeping_particles(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        world.spawn_many(2, position=[(0, 0, 0), (1, 0, 0)], velocity=[(1, 0, 0), (0, 0, 0)])
+        world.storage.awake[1] = False
+        moving, sleeping = world.particles
+        contact = ParticleContact((moving, sleeping), contact_normal=Vector(-1, 0, 0))
+        ParticleBatchContactResolver(world.storage, 10).resolve_contacts([contact], 1, 0.1)
+        self.assertTrue(sleeping.is_awake)
+        self.assertEqual(sleeping.velocity, Vector(0.5, 0, 0))
+
+    def test_rejects_particles_outside_the_storage(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        resolver = ParticleBatchContactResolver(world.storage, 10)
+        with self.assertRaises(ValueError):
+            resolver.resolve_contacts([ParticleContact(Particle(), contact_normal=Vector(0, 1, 0))], 1, 0.1)
+
+    def test_rod_chain(self):
+        world = ParticleWorld(max_contacts=100, iterations=0)
+        # a chain of rods hanging from a fixed particle swings down from the horizontal
+        acceleration = np.tile((0, -9.81, 0), (5, 1))
+        acceleration[0] = 0
+        handles = world.spawn_many(5, position=np.column_stack([np.arange(5), np.zeros(5), np.zeros(5)]),
+                                   acceleration=acceleration, inverse_mass=np.r_[0, np.ones(4)])
+        particles = [world.particle(int(handle)) for handle in handles]
+        world.contact_gen += [ParticleRod(1, (particles[i], particles[i + 1])) for i in range(4)]
+        world.resolver = ParticleBatchContactResolver(world.storage, 0)
+        for _ in range(60):
+            world.run_physics(1 / 60)
+
+        lengths = np.linalg.norm(np.diff(world.storage.position[:5], axis=0), axis=1)
+        np.testing.assert_allclose(lengths, 1, atol=0.05)
+        self.assertLess(world.storage.position[4, 1], -1)
+        self.assertLessEqual(world.resolver.colors, 3)
+        self.assertEqual(world.storage.position[0].tolist(), [0, 0, 0])
+
+    def test_resting_pile(self):
+        world = pile(3, 4)
+        world.resolver = ParticleBatchContactResolver(world.storage, 0, ParticleContactCache())
+        world.stats = ParticleWorldStats()
+        for _ in range(240):
+            world.run_physics(1 / 60)
+
+        heights = np.sort(world.storage.position[:4, 1])
+        np.testing.assert_allclose(heights, [0.5, 1.5, 2.5, 3.5], atol=0.1)
+        self.assertLess(np.mean(world.stats.history('iterations')[120:]), 3)
+        self.assertGreaterEqual(world.stats.last['warm_started'], 12)
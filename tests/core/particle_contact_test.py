@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_contact import ParticleContact, ParticleContactCache, ParticleContactResolver
+from core.particle_world_stats import ParticleWorldStats
+from core.vector import Vector
+from tests.core.particle_piles import pile
+
+
+class ParticleContactCacheTest(unittest.TestCase):
+
+    def test_impulse_carries_over(self):
+        particle = Particle(velocity=Vector(0, -1, 0), inverse_mass=0.5)
+        resolver = ParticleContactResolver(10, ParticleContactCache())
+        contact = ParticleContact(particle, contact_normal=Vector(0, 1, 0))
+
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertEqual(resolver.iterations_used, 1)
+        self.assertAlmostEqual(contact.accumulated_impulse, 2)
+
+        # the same contact closing at the same speed is held by the carried impulse alone
+        particle.velocity = Vector(0, -1, 0)
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertEqual((resolver.iterations_used, resolver.cache.warm_started), (0, 1))
+        self.assertEqual(particle.velocity, Vector(0, 0, 0))
+
+        # closing slower, the part of the impulse that would push the particle away is taken back
+        particle.velocity = Vector(0, -0.25, 0)
+        resolver.resolve_contacts([contact], 1, 0.1)
+        self.assertEqual(resolver.iterations_used, 1)
+        self.assertEqual(particle.velocity, Vector(0, 0, 0))
+        self.assertAlmostEqual(contact.accumulated_impulse, 0.5)
+
+    def test_contacts_are_matched_by_pair_and_normal(self):
+        first, second = Particle(inverse_mass=1), Particle(inverse_mass=1)
+        cache = ParticleContactCache()
+        contacts = [ParticleContact((first, second), contact_normal=Vector(1, 0, 0)),
+                    ParticleContact(first, contact_normal=Vector(0, 1, 0))]
+        for contact in contacts:
+            contact.accumulated_impulse = 1
+        cache.store(contacts, 2)
+        self.assertEqual(len(cache), 2)
+
+        contacts = [ParticleContact((first, second), contact_normal=Vector(1, 0, 0)),
+                    ParticleContact(first, contact_normal=Vector(1, 0, 0)),
+                    ParticleContact((second, first), contact_normal=Vector(1, 0, 0))]
+        cache.warm_start(contacts, 3)
+        self.assertEqual(cache.warm_started, 1)
+        self.assertEqual([contact.warm_impulse for contact in contacts], [1, 0, 0])
+
+    def test_resting_pile_converges_in_a_few_iterations(self):
+        iterations = []
+        for cache in (None, ParticleContactCache()):
+            world = pile(3, 4)
+            world.resolver.cache = cache
+            world.stats = ParticleWorldStats()
+            for _ in range(240):
+                world.run_physics(1 / 60)
+            iterations.append(np.mean(world.stats.history('iterations')[120:]))
+
+        # the warm started pile stays stacked
+        heights = np.sort(world.storage.position[:4, 1])
+        np.testing.assert_allclose(heights, [0.5, 1.5, 2.5, 3.5], atol=0.1)
+        # every floor contact and every contact within a column carries its impulse over
+        self.assertGreaterEqual(world.stats.last['warm_started'], 12)
+        self.assertLess(iterations[1], 6)
+        self.assertLess(iterations[1], iterations[0] / 2)
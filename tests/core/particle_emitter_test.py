@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+from core.particle_emitter import ParticleEmitter, ParticleEmitterSystem, ParticlePayload, ParticleSphericalEmitter
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def emitter_world() -> ParticleWorld:
+    return ParticleWorld(max_contacts=0, iterations=0)
+
+
+class ParticleEmitterSystemTest(unittest.TestCase):
+
+    def test_rate_accumulates_fractions(self):
+        world = emitter_world()
+        system = ParticleEmitterSystem(world, seed=1)
+        emitter = ParticleEmitter(rate=25, min_lifetime=10, max_lifetime=10)
+        system.add(emitter)
+        for _ in range(10):
+            system.update(0.01)
+        self.assertEqual(len(system), 2)
+        self.assertEqual(world.storage.count, 2)
+
+        system.remove(emitter)
+        for _ in range(100):
+            system.update(0.01)
+        self.assertEqual(len(system), 2)
+
+    def test_velocity_distributions(self):
+        system = ParticleEmitterSystem(emitter_world(), seed=2)
+        box = ParticleEmitter(min_velocity=Vector(-1, 2, 0), max_velocity=Vector(1, 3, 0))
+        sphere = ParticleSphericalEmitter(min_speed=4, max_speed=5)
+        storage = system.world.storage
+
+        slots = storage.slots(system.burst(box, 1000))
+        velocities = storage.velocity[slots]
+        self.assertTrue((velocities >= (-1, 2, 0)).all() and (velocities <= (1, 3, 0)).all())
+
+        slots = storage.slots(system.burst(sphere, 1000))
+        speeds = np.linalg.norm(storage.velocity[slots], axis=1)
+        self.assertTrue((speeds >= 4 - 1e-9).all() and (speeds <= 5 + 1e-9).all())
+
+    def test_expired_particles_release_payload(self):
+        world = emitter_world()
+        system = ParticleEmitterSystem(world, capacity=2, seed=3)
+        spark = ParticleEmitter(min_lifetime=0.5, max_lifetime=0.5)
+        shell = ParticleEmitter(min_lifetime=1, max_lifetime=1, payloads=[ParticlePayload(spark, 10)])
+        system.burst(shell, 3, position=(0, 5, 0), velocity=(1, 0, 0))
+
+        for _ in range(8):
+            world.run_physics(0.125)
+            system.update(0.125)
+        self.assertEqual(len(system), 30)
+        positions = world.storage.position[world.storage.slots(system.handles[:len(system)])]
+        np.testing.assert_allclose(positions, np.tile((1, 5, 0), (30, 1)))
+
+        for _ in range(4):
+            world.run_physics(0.125)
+            system.update(0.125)
+        self.assertEqual(len(system), 0)
+        self.assertEqual(world.storage.count, 0)
+
+    def test_despawned_particles_are_dropped(self):
+        world = emitter_world()
+        system = ParticleEmitterSystem(world)
+        handles = system.burst(ParticleEmitter(min_lifetime=5, max_lifetime=5), 4)
+        world.despawn(int(handles[1]))
+        system.update(0.1)
+        self.assertEqual(system.handles[:len(system)].tolist(), handles[[0, 2, 3]].tolist())
+
+    def test_many_sparks(self):
+        world = emitter_world()
+        system = ParticleEmitterSystem(world, seed=4)
+        spark = ParticleSphericalEmitter(min_speed=1, max_speed=10, rate=200_000 / 0.5, min_lifetime=0.5,
+                                         max_lifetime=0.5, acceleration=Vector(0, -9.8, 0), damping=0.9)
+        system.add(spark)
+        for _ in range(40):
+            system.update(1 / 60)
+            world.run_physics(1 / 60)
+        self.assertLessEqual(abs(len(system) - 200_000), 7000)
+        self.assertEqual(world.storage.count, len(system))
@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from core.particle_encoding import ParticleQuantization, ParticleStateDecoder, ParticleStateEncoder
+from core.particle_server import ParticleWorldServer, encode_frame, read_frame
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def quantization(position_bits: int = 16, velocity_bits: int = 12) -> ParticleQuantization:
+    return ParticleQuantization(Vector(-10, -10, -10), Vector(10, 10, 10), 20, position_bits, velocity_bits)
+
+
+def random_world(count: int, seed: int = 0) -> ParticleWorld:
+    rng = np.random.default_rng(seed)
+    world = ParticleWorld(max_contacts=0, iterations=0, capacity=count)
+    world.spawn_many(count, position=rng.uniform(-8, 8, (count, 3)), velocity=rng.uniform(-1, 1, (count, 3)))
+    return world
+
+
+class ParticleStateEncoderTest(unittest.TestCase):
+
+    def assert_decoded(self, world: ParticleWorld, decoded: tuple, bounds: ParticleQuantization):
+        _, _, handles, positions, velocities = decoded
+        slots = world.storage.live_slots()
+        np.testing.assert_array_equal(handles, world.storage.slot_handle[slots])
+        self.assertTrue((np.abs(positions - world.storage.position[slots]) <= bounds.position_error * 1.0001).all())
+        self.assertTrue((np.abs(velocities - world.storage.velocity[slots]) <= bounds.velocity_error * 1.0001).all())
+
+    def test_error_stays_bounded_over_keyframes_and_deltas(self):
+        for position_bits, velocity_bits in ((16, 12), (8, 8), (24, 20)):
+            bounds = quantization(position_bits, velocity_bits)
+            world = random_world(500)
+            encoder, decoder = ParticleStateEncoder(bounds, keyframe_interval=10), ParticleStateDecoder()
+            for frame in range(25):
+                world.run_physics(0.05)
+                self.assert_decoded(world, decoder.decode(encoder.encode(world, frame, frame * 0.05)), bounds)
+            self.assertEqual(encoder.keyframes, 3)
+
+    def test_positions_outside_bounds_are_clamped(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        world.spawn_many(1, position=(50, 0, -50), velocity=(0, 100, 0))
+        _, _, _, positions, velocities = ParticleStateDecoder().decode(
+            ParticleStateEncoder(quantization()).encode(world, 0, 0))
+        np.testing.assert_allclose(positions, [(10, 0, -10)], atol=1e-3)
+        np.testing.assert_allclose(velocities, [(0, 20, 0)], atol=1e-2)
+
+    def test_delta_frames_are_an_order_of_magnitude_smaller(self):
+        world = random_world(10000)
+        encoder = ParticleStateEncoder(quantization(), keyframe_interval=100)
+        keyframe = encoder.encode(world, 0, 0)
+        world.run_physics(0.01)
+        delta = encoder.encode(world, 1, 0.01)
+        self.assertLess(len(keyframe), len(encode_frame(world, 0, 0)) / 2)
+        self.assertLess(len(delta), len(encode_frame(world, 1, 0.01)) / 10)
+
+        # sleeping particles that have not moved since the keyframe are skipped
+        encoder = ParticleStateEncoder(quantization(), keyframe_interval=100)
+        encoder.encode(world, 2, 0.02)
+        world.storage.awake[:world.storage.size] = False
+        self.assertLess(len(encoder.encode(world, 3, 0.03)), 100)
+
+    def test_decoder_skips_frames_but_needs_keyframes(self):
+        bounds = quantization()
+        world = random_world(100)
+        encoder = ParticleStateEncoder(bounds, keyframe_interval=5)
+        frames = []
+        for frame in range(12):
+            world.run_physics(0.1)
+            frames.append(encoder.encode(world, frame, 0))
+
+        decoder = ParticleStateDecoder()
+        with self.assertRaises(ValueError):
+            decoder.decode(frames[1])
+        decoder.decode(frames[0])
+        decoder.decode(frames[4])
+        # the next keyframe was missed
+        with self.assertRaises(ValueError):
+            decoder.decode(frames[6])
+        decoder.decode(frames[10])
+        self.assert_decoded(world, decoder.decode(frames[11]), bounds)
+
+    def test_spawning_forces_a_keyframe(self):
+        bounds = quantization()
+        world = random_world(10)
+        encoder, decoder = ParticleStateEncoder(bounds, keyframe_interval=100), ParticleStateDecoder()
+        decoder.decode(encoder.encode(world, 0, 0))
+        world.spawn_many(3, position=(1, 2, 3))
+        world.despawn(int(world.storage.slot_handle[0]))
+        self.assert_decoded(world, decoder.decode(encoder.encode(world, 1, 0)), bounds)
+        self.assertEqual(encoder.keyframes, 2)
+
+    def test_full_range_moves_at_the_widest_components(self):
+        bounds = quantization(32, 32)
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        world.spawn_many(1, position=(-9.9, 0, 0), velocity=(-19, 0, 0))
+        encoder, decoder = ParticleStateEncoder(bounds), ParticleStateDecoder()
+        decoder.decode(encoder.encode(world, 0, 0))
+        # the deltas of a move across the bounds do not fit in 32 bits
+        world.storage.position[0, 0] = 9.9
+        world.storage.velocity[0, 0] = 19
+        self.assert_decoded(world, decoder.decode(encoder.encode(world, 1, 0)), bounds)
+
+    def test_invalid_quantization(self):
+        with self.assertRaises(ValueError):
+            quantization(position_bits=33)
+        with self.assertRaises(ValueError):
+            ParticleQuantization(Vector(0, 0, 0), Vector(1, 0, 1), 1)
+
+
+class ParticleStateEncoderServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_server_streams_encoded_frames(self):
+        bounds = quantization()
+        world = random_world(50)
+        server = ParticleWorldServer(world, duration=0.1, max_pending=10,
+                                     encode=ParticleStateEncoder(bounds, keyframe_interval=3).encode)
+        port = await server.start_tcp()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        while not server.subscribers:
+            await asyncio.sleep(0.01)
+
+        await server.run(frames=5)
+        decoder = ParticleStateDecoder()
+        for expected in range(1, 6):
+            frame, _, handles, positions, _ = decoder.decode(await read_frame(reader))
+            self.assertEqual(frame, expected)
+        np.testing.assert_allclose(positions, world.storage.position[:50], atol=bounds.position_error.max() * 1.0001)
+        writer.close()
+        await server.close()
@@ -0,0 +1,114 @@
+import math
+import unittest
+
+import numpy as np
+
+from core.particle_fake_spring import ParticleFakeSpringBatchForceGenerator
+from core.particle_force_generator import ParticleFakeSpringForceGenerator, damped_spring_coefficients
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+# under-damped, critically damped and over-damped springs
+SPRINGS = ((100, 2), (100, 20), (100, 100))
+
+
+def anchored_world(positions: np.ndarray, velocities: np.ndarray = 0) -> ParticleWorld:
+    world = ParticleWorld(max_contacts=0, iterations=0, capacity=len(positions))
+    world.integrator = ParticleSemiImplicitEulerIntegrator()
+    world.spawn_many(len(positions), position=positions, velocity=velocities, inverse_mass=0.5)
+    return world
+
+
+class ParticleFakeSpringBatchForceGeneratorTest(unittest.TestCase):
+
+    def test_matches_single_particle_generator(self):
+        rng = np.random.default_rng(0)
+        positions, velocities, anchors = rng.normal(size=(3, 30, 3))
+        constants = np.repeat(SPRINGS, 10, axis=0)
+
+        world = anchored_world(positions, velocities)
+        for slot, (spring_constant, damping) in enumerate(constants):
+            generator = ParticleFakeSpringForceGenerator(Vector(*anchors[slot]), spring_constant, damping)
+            world.registry.add(world.particle(int(world.storage.slot_handle[slot])), generator)
+        world.registry.update_forces(0.02)
+
+        batch_world = anchored_world(positions, velocities)
+        springs = ParticleFakeSpringBatchForceGenerator(batch_world.storage)
+        springs.add_springs(batch_world.storage.slot_handle[:30], anchors, constants[:, 0], constants[:, 1])
+        batch_world.registry.add_batch(springs)
+        batch_world.registry.update_forces(0.02)
+
+        np.testing.assert_allclose(batch_world.storage.force_accum[:30], world.storage.force_accum[:30])
+
+    def test_step_follows_closed_form(self):
+        for spring_constant, damping in SPRINGS:
+            world = anchored_world(np.array([(1.0, 0, 0)]))
+            springs = ParticleFakeSpringBatchForceGenerator(world.storage)
+            springs.add_springs(world.storage.slot_handle[:1], (0, 0, 0), spring_constant, damping)
+            world.registry.add_batch(springs)
+            world.run_physics(0.05)
+
+            if damping ** 2 < 4 * spring_constant:
+                gamma = math.sqrt(spring_constant - damping ** 2 / 4)
+                expected = math.exp(-damping * 0.025) * (math.cos(gamma * 0.05) + damping / 2 / gamma *
+                                                         math.sin(gamma * 0.05))
+            elif damping ** 2 == 4 * spring_constant:
+                expected = math.exp(-damping * 0.025) * (1 + damping * 0.025)
+            else:
+                gamma = math.sqrt(damping ** 2 / 4 - spring_constant)
+                expected = math.exp(-damping * 0.025) * (math.cosh(gamma * 0.05) + damping / 2 / gamma *
+                                                         math.sinh(gamma * 0.05))
+            self.assertAlmostEqual(world.storage.position[0, 0], expected)
+
+    def test_over_damped_spring_creeps_back_without_overshooting(self):
+        world = anchored_world(np.array([(1.0, 0, 0)]))
+        springs = ParticleFakeSpringBatchForceGenerator(world.storage)
+        springs.add_springs(world.storage.slot_handle[:1], (0, 0, 0), 100, 100)
+        world.registry.add_batch(springs)
+        offsets = []
+        for _ in range(100):
+            world.run_physics(0.02)
+            offsets.append(world.storage.position[0, 0])
+        self.assertTrue((np.diff(offsets) < 0).all())
+        # the slow mode decays at the rate damping / 2 - sqrt(damping ** 2 / 4 - spring_constant)
+        self.assertAlmostEqual(offsets[-1], math.exp(-(50 - math.sqrt(2400)) * 2), delta=0.01)
+
+    def test_stiff_jelly_is_stable(self):
+        rng = np.random.default_rng(1)
+        anchors = rng.uniform(-1, 1, (20000, 3))
+        world = anchored_world(anchors + rng.normal(scale=0.1, size=anchors.shape))
+        springs = ParticleFakeSpringBatchForceGenerator(world.storage)
+        springs.add_springs(world.storage.slot_handle[:20000], anchors, 1e6, 10)
+        world.registry.add_batch(springs)
+        for _ in range(60):
+            world.run_physics(1 / 60)
+        self.assertLess(np.abs(world.storage.position[:20000] - anchors).max(), 0.1)
+
+    def test_coefficients_are_cached(self):
+        world = anchored_world(np.zeros((4, 3)))
+        springs = ParticleFakeSpringBatchForceGenerator(world.storage)
+        springs.add_springs(world.storage.slot_handle[:4], (0, 1, 0), [10, 10, 20, 20], 1)
+        self.assertEqual(len(springs._parameters), 2)
+        factors = springs.factors(0.1)
+        self.assertIs(springs.factors(0.1), factors)
+        np.testing.assert_array_equal(factors[2], damped_spring_coefficients(20.0, 1.0, 0.1))
+        self.assertIsNot(springs.factors(0.2), factors)
+
+    def test_skips_sleeping_fixed_and_despawned_particles(self):
+        world = anchored_world(np.ones((4, 3)))
+        springs = ParticleFakeSpringBatchForceGenerator(world.storage)
+        handles = world.storage.slot_handle[:4].copy()
+        springs.add_springs(handles, (0, 0, 0), 100, 1)
+        world.registry.add_batch(springs)
+        world.particle(int(handles[0])).set_awake(False)
+        world.storage.inverse_mass[1] = 0
+        world.despawn(int(handles[2]))
+        world.registry.update_forces(0.1)
+
+        slot = world.storage.slot(int(handles[3]))
+        self.assertTrue((world.storage.force_accum[slot] < 0).all())
+        force = world.storage.force_accum[:world.storage.size]
+        self.assertEqual(np.count_nonzero(force.any(axis=1)), 1)
+        with self.assertRaises(KeyError):
+            springs.add_springs(handles[2:3], (0, 0, 0), 1, 1)
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_field_force import ParticleGridField, ParticleFieldForceGenerator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def linear_field(shape: tuple, gradient: tuple, **kwargs) -> ParticleGridField:
+    """
+    A field with one channel holding the dot product of the grid coordinates with the gradient.
+    """
+    grid = np.indices(shape).transpose(*range(1, len(shape) + 1), 0)
+    return ParticleGridField((grid @ np.array(gradient, dtype=float))[..., None], **kwargs)
+
+
+class ParticleGridFieldTest(unittest.TestCase):
+
+    def test_interpolation_is_exact_for_linear_fields(self):
+        field = linear_field((5, 6, 7), (1, 2, 3), origin=Vector(1, 0, -1), spacing=0.5)
+        positions = np.random.default_rng(8).uniform(0, 2, (100, 3)) + (1, 0, -1)
+        expected = ((positions - (1, 0, -1)) / 0.5) @ (1, 2, 3)
+        np.testing.assert_allclose(field.sample(positions)[:, 0], expected)
+
+    def test_2d_field_lies_on_xz_plane_and_clamps(self):
+        field = linear_field((3, 3), (1, 10))
+        positions = np.array([(0.5, 100, 1.5), (-5, 0, 1), (10, 0, 10)])
+        np.testing.assert_allclose(field.sample(positions)[:, 0], [15.5, 10, 22])
+
+    def test_memory_mapped_series(self):
+        frames = np.stack([np.full((2, 2, 2, 1), value) for value in (0.0, 10.0, 30.0)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'series.npy')
+            np.save(path, frames)
+            field = ParticleGridField.load_series(path, frame_duration=2)
+            self.assertIsInstance(field.frames, np.memmap)
+            for time, value in ((0, 0), (1, 5), (3, 20), (4, 30), (50, 30)):
+                field.set_time(time)
+                self.assertAlmostEqual(field.sample(np.zeros((1, 3)))[0, 0], value)
+            del field
+
+        with self.assertRaises(ValueError):
+            ParticleGridField(np.zeros((2, 2, 1))).set_time(0)
+
+
+class ParticleFieldForceGeneratorTest(unittest.TestCase):
+
+    def test_drag_relative_to_wind(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        wind = ParticleGridField(np.tile((2.0, 0, 0), (2, 2, 2, 1)))
+        generator = ParticleFieldForceGenerator(world.storage, wind=wind, k1=1, k2=0.5)
+        world.registry.add_batch(generator)
+        still = world.spawn(Particle(position=Vector.zero()))
+        drifting = world.spawn(Particle(position=Vector.zero(), velocity=Vector(2, 0, 0)))
+        sleeping = world.spawn(Particle(position=Vector.zero()))
+        sleeping.set_awake(False)
+
+        world.registry.update_forces(0.1)
+        self.assertEqual(still.force_accum, Vector(4, 0, 0))
+        self.assertEqual(drifting.force_accum, Vector.zero())
+        self.assertEqual(sleeping.force_accum, Vector.zero())
+
+    def test_buoyancy_follows_local_water(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        waves = linear_field((3, 3), (1, 0))
+        density = ParticleGridField(np.full((2, 2, 2, 1), 2.0))
+        generator = ParticleFieldForceGenerator(world.storage, water_height=waves, density=density, max_depth=0.5,
+                                                volume=3, gravity=10)
+        world.registry.add_batch(generator)
+        world.spawn_many(4, position=[(0, 0, 0), (2, 0, 0), (2, 2, 0), (2, 3, 0)])
+
+        world.registry.update_forces(0.1)
+        np.testing.assert_allclose(world.storage.force_accum[:4, 1], [30, 60, 30, 0])
+
+    def test_registry_batches(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        generator = ParticleFieldForceGenerator(world.storage, k1=1)
+        handle = world.registry.add_batch(generator)
+        self.assertEqual(len(world.registry), 1)
+        self.assertEqual(world.registry.batches, [generator])
+        self.assertTrue(world.registry.discard(handle))
+        world.registry.add_batch(generator)
+        self.assertEqual(world.registry.remove_generator(generator), 1)
+        self.assertEqual(len(world.registry), 0)
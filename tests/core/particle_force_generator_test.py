@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from core.particle import Particle
+from core.particle_force_generator import ParticleForceRegistry, ParticleGravityForceGenerator
+from core.vector import Vector
+
+
+class ParticleForceRegistryTest(unittest.TestCase):
+
+    def test_add_and_discard(self):
+        registry = ParticleForceRegistry()
+        particle = Particle()
+        generator = ParticleGravityForceGenerator(Vector(0, -10, 0))
+        handle = registry.add(particle, generator)
+        self.assertEqual(len(registry), 1)
+        self.assertTrue(registry.discard(handle))
+        self.assertFalse(registry.discard(handle))
+        self.assertEqual(len(registry), 0)
+
+    def test_remove_pair(self):
+        registry = ParticleForceRegistry()
+        particle = Particle()
+        kept = ParticleGravityForceGenerator(Vector(1, 0, 0))
+        removed = ParticleGravityForceGenerator(Vector(0, 1, 0))
+        registry.add(particle, kept)
+        registry.add(particle, removed)
+        registry.remove(particle, removed)
+        registry.remove(Particle(), kept)
+
+        registry.update_forces(0.1)
+        self.assertEqual(particle.force_accum, Vector(1, 0, 0))
+
+    def test_remove_particle_and_generator(self):
+        registry = ParticleForceRegistry()
+        particles = [Particle() for _ in range(4)]
+        generators = [ParticleGravityForceGenerator(Vector.random()) for _ in range(3)]
+        for particle in particles:
+            for generator in generators:
+                registry.add(particle, generator)
+
+        self.assertEqual(registry.remove_particle(particles[0]), 3)
+        self.assertEqual(registry.remove_generator(generators[0]), 3)
+        self.assertEqual(len(registry), 6)
+        self.assertTrue(all(particle is not particles[0] and generator is not generators[0]
+                            for particle, generator in registry.items()))
+
+    def test_clear(self):
+        registry = ParticleForceRegistry()
+        particle = Particle()
+        registry.add(particle, ParticleGravityForceGenerator(Vector(0, -10, 0)))
+        registry.clear()
+        registry.update_forces(0.1)
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(particle.force_accum, Vector.zero())
+
+    def test_churn_keeps_handles_valid(self):
+        registry = ParticleForceRegistry()
+        live = {}
+        for _ in range(2000):
+            if live and random.random() < 0.5:
+                handle = random.choice(list(live))
+                self.assertTrue(registry.discard(handle))
+                del live[handle]
+            else:
+                particle = Particle()
+                generator = ParticleGravityForceGenerator()
+                live[registry.add(particle, generator)] = (particle, generator)
+        self.assertEqual(len(registry), len(live))
+        self.assertEqual({(id(p), id(g)) for p, g in registry.items()},
+                         {(id(p), id(g)) for p, g in live.values()})
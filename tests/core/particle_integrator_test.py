@@ -0,0 +1,81 @@
+import math
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_force_generator import ParticleForceGenerator
+from core.particle_integrator import ParticleEulerIntegrator, ParticleSemiImplicitEulerIntegrator, \
+    ParticleVelocityVerletIntegrator, ParticleRK4Integrator
+from core.particle_state import ParticleState
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+class OriginSpringForceGenerator(ParticleForceGenerator):
+    """
+    A linear spring of rest length zero pulling the particle towards the origin.
+    """
+
+    def __init__(self, spring_constant: float):
+        self.spring_constant = spring_constant
+
+    def update_force(self, particle: Particle, duration: float):
+        particle.add_force(particle.position * -self.spring_constant)
+
+
+def oscillator_error(integrator, duration: float, steps: int) -> float:
+    """
+    Integrates a unit mass on a unit spring released from x = 1 and returns the position error against cos(t).
+    """
+    state = ParticleState(1)
+    state.position[0] = (1, 0, 0)
+
+    def update_forces(s: ParticleState):
+        s.force_accum[:] = -s.position
+
+    dt = duration / steps
+    for _ in range(steps):
+        update_forces(state)
+        integrator.integrate(state, dt, update_forces)
+    return abs(state.position[0, 0] - math.cos(duration))
+
+
+class ParticleIntegratorTest(unittest.TestCase):
+
+    def test_euler_matches_particle_integrate(self):
+        particles = [Particle(position=Vector.random(), velocity=Vector.random(), acceleration=Vector.random(),
+                              damping=0.9, force_accum=Vector.random()) for _ in range(5)]
+        state = ParticleState.from_particles(particles)
+        ParticleEulerIntegrator().integrate(state, 0.1, lambda s: None)
+        for i, particle in enumerate(particles):
+            particle.integrate(0.1)
+            np.testing.assert_allclose(state.position[i], (particle.position.x, particle.position.y,
+                                                           particle.position.z))
+            np.testing.assert_allclose(state.velocity[i], (particle.velocity.x, particle.velocity.y,
+                                                           particle.velocity.z))
+        self.assertFalse(state.force_accum.any())
+
+    def test_order_of_convergence(self):
+        for integrator in (ParticleSemiImplicitEulerIntegrator(), ParticleVelocityVerletIntegrator(),
+                           ParticleRK4Integrator()):
+            coarse = oscillator_error(integrator, 2.0, 50)
+            fine = oscillator_error(integrator, 2.0, 100)
+            self.assertGreater(coarse / fine, 2 ** integrator.order * 0.8, type(integrator).__name__)
+
+    def test_large_step_stays_bounded(self):
+        # dt = 0.5 is far beyond what explicit Euler tolerates on a unit spring over this many periods
+        self.assertGreater(oscillator_error(ParticleEulerIntegrator(), 100, 200), 10)
+        for integrator in (ParticleSemiImplicitEulerIntegrator(), ParticleVelocityVerletIntegrator(),
+                           ParticleRK4Integrator()):
+            self.assertLess(oscillator_error(integrator, 100, 200), 1.5, type(integrator).__name__)
+
+    def test_world_uses_integrator(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, integrator=ParticleVelocityVerletIntegrator())
+        particle = world.spawn(Particle(position=Vector(1, 0, 0), velocity=Vector.zero()))
+        world.registry.add(particle, OriginSpringForceGenerator(1))
+        for _ in range(100):
+            world.start_frame()
+            world.run_physics(0.02)
+        self.assertAlmostEqual(particle.position.x, math.cos(2.0), places=3)
+        self.assertEqual(particle.force_accum, Vector.zero())
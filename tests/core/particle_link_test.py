@@ -0,0 +1,43 @@
+import unittest
+
+from core.particle import Particle
+from core.particle_contact import ParticleContact
+from core.particle_link import ParticleCable, ParticleRod
+from core.vector import Vector
+
+
+def resolve_link(link) -> float:
+    """
+    Resolves the contact of a link once.
+
+    :return: the length of the link afterwards
+    """
+    contact = ParticleContact()
+    if link.add_contact(contact, 1):
+        contact.resolve(0.01)
+    particle_a, particle_b = link.particles
+    return (particle_b.position - particle_a.position).magnitude()
+
+
+class ParticleLinkTest(unittest.TestCase):
+
+    def test_overextended_cable_is_pulled_back(self):
+        cable = ParticleCable((Particle(position=Vector(0, 0, 0)), Particle(position=Vector(12, 0, 0))), 10, 0)
+        self.assertAlmostEqual(resolve_link(cable), 10)
+        self.assertEqual(cable.particles[0].position, Vector(1, 0, 0))
+        self.assertEqual(cable.particles[1].position, Vector(11, 0, 0))
+
+        # a slack cable has no contact
+        cable.particles[1].position = Vector(5, 0, 0)
+        self.assertEqual(cable.add_contact(ParticleContact(), 1), 0)
+
+    def test_rod_keeps_its_length(self):
+        for start in (5, 2):
+            rod = ParticleRod(3, (Particle(position=Vector(0, 0, 0)), Particle(position=Vector(0, start, 0))))
+            self.assertAlmostEqual(resolve_link(rod), 3)
+
+        # the pull on a moving particle stops it from stretching the rod
+        rod = ParticleRod(3, (Particle(position=Vector(0, 0, 0), inverse_mass=0),
+                              Particle(position=Vector(4, 0, 0), velocity=Vector(2, 0, 0))))
+        self.assertAlmostEqual(resolve_link(rod), 3)
+        self.assertEqual(rod.particles[1].velocity, Vector(0, 0, 0))
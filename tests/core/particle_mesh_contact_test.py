@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_mesh_contact import ParticleTriangleMesh, ParticleMeshBVH, ParticleMeshContactGenerator, \
+    closest_points_on_triangles
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def grid_mesh(cells: int, size: float) -> ParticleTriangleMesh:
+    """
+    A flat square floor in the plane y = 0, centred on the origin, split into cells x cells squares.
+    """
+    coordinates = np.linspace(-size / 2, size / 2, cells + 1)
+    x, z = np.meshgrid(coordinates, coordinates, indexing='ij')
+    vertices = np.stack([x.ravel(), np.zeros(x.size), z.ravel()], axis=1)
+    corner = (np.arange(cells)[:, None] * (cells + 1) + np.arange(cells)[None, :]).ravel()
+    triangles = np.concatenate([
+        np.stack([corner, corner + 1, corner + cells + 1], axis=1),
+        np.stack([corner + 1, corner + cells + 2, corner + cells + 1], axis=1),
+    ])
+    return ParticleTriangleMesh(vertices, triangles)
+
+
+class ParticleTriangleMeshTest(unittest.TestCase):
+
+    def test_load_obj_and_npz(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'quad.obj')
+            with open(path, 'w') as file:
+                file.write('# a unit quad\nv 0 0 0\nv 1 0 0\nv 1 0 1\nv 0 0 1\nvn 0 1 0\nf 1//1 2//1 3//1 -1//1\n')
+            mesh = ParticleTriangleMesh.load(path)
+            self.assertEqual(mesh.triangles.tolist(), [[0, 1, 2], [0, 2, 3]])
+
+            path = os.path.join(directory, 'quad.npz')
+            mesh.save(path)
+            loaded = ParticleTriangleMesh.load(path)
+            np.testing.assert_array_equal(loaded.vertices, mesh.vertices)
+            np.testing.assert_array_equal(loaded.triangles, mesh.triangles)
+
+            with self.assertRaises(ValueError):
+                ParticleTriangleMesh.load(os.path.join(directory, 'quad.stl'))
+
+    def test_degenerate_triangles_are_dropped(self):
+        mesh = ParticleTriangleMesh([(0, 0, 0), (1, 0, 0), (2, 0, 0), (0, 1, 0)], [(0, 1, 2), (0, 1, 3)])
+        self.assertEqual(len(mesh), 1)
+
+
+class ParticleMeshBVHTest(unittest.TestCase):
+
+    def test_query_matches_brute_force(self):
+        rng = np.random.default_rng(6)
+        mesh = ParticleTriangleMesh(rng.uniform(-10, 10, (600, 3)), rng.integers(0, 600, (1000, 3)))
+        bvh = ParticleMeshBVH(mesh, leaf_size=3)
+        self.assertTrue((bvh.count[bvh.children[:, 0] < 0] <= 3).all())
+
+        centres = rng.uniform(-10, 10, (200, 3))
+        boxes, triangles = bvh.query(centres - 0.5, centres + 0.5)
+        found = np.zeros((200, len(mesh)), dtype=bool)
+        found[boxes, triangles] = True
+        expected = ((centres[:, None] - 0.5 <= bvh.triangle_max) & (centres[:, None] + 0.5 >= bvh.triangle_min)).all(2)
+        np.testing.assert_array_equal(found, expected)
+        self.assertEqual(len(boxes), expected.sum())
+
+    def test_closest_points(self):
+        a, b, c = (np.tile(corner, (5, 1)) for corner in ((0, 0, 0), (2, 0, 0), (0, 2, 0)))
+        points = np.array([(0.5, 0.5, 3), (-1, -1, 0), (3, -1, 0), (1, -1, 1), (2, 2, 0)])
+        np.testing.assert_allclose(closest_points_on_triangles(points, a, b, c),
+                                   [(0.5, 0.5, 0), (0, 0, 0), (2, 0, 0), (1, 0, 0), (1, 1, 0)])
+
+
+class ParticleMeshContactGeneratorTest(unittest.TestCase):
+
+    def test_contacts_push_off_nearest_triangle(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticleMeshContactGenerator(world.storage, grid_mesh(4, 4), restitution=0.25)
+        world.spawn_many(3, position=[(0.3, 0.1, 0.3), (0.3, -0.05, -1.2), (0.3, 1, 0.3)], radius=0.2)
+
+        slots, normals, depths, restitutions = floor.find_contacts()
+        self.assertEqual(slots.tolist(), [0, 1])
+        np.testing.assert_allclose(normals, [(0, 1, 0), (0, -1, 0)], atol=1e-12)
+        np.testing.assert_allclose(depths, [0.1, 0.15])
+        np.testing.assert_allclose(restitutions, [0.25, 0.25])
+
+    def test_particles_land_on_mesh(self):
+        world = ParticleWorld(max_contacts=100, iterations=0)
+        world.contact_gen.append(ParticleMeshContactGenerator(world.storage, grid_mesh(20, 20)))
+        rng = np.random.default_rng(7)
+        positions = np.column_stack([rng.uniform(-9, 9, 50), rng.uniform(0.5, 1, 50), rng.uniform(-9, 9, 50)])
+        world.spawn_many(50, position=positions, acceleration=(0, -9.8, 0), radius=0.1)
+
+        for _ in range(80):
+            world.run_physics(0.01)
+        heights = world.storage.position[:world.storage.size, 1]
+        self.assertTrue((np.abs(heights - 0.1) < 0.01).all())
+
+    def test_sleeping_particle_is_ignored(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticleMeshContactGenerator(world.storage, grid_mesh(1, 1), thickness=0.1)
+        particle = world.spawn(Particle(position=Vector(0, 0.05, 0)))
+        self.assertEqual(len(floor.find_contacts()[0]), 1)
+        particle.set_awake(False)
+        self.assertEqual(len(floor.find_contacts()[0]), 0)
+
+    def test_continuous_detection_stops_tunnelling(self):
+        wall = ParticleTriangleMesh([(1, -1, -1), (1, 1, -1), (1, 1, 1), (1, -1, 1)], [(0, 1, 2), (0, 2, 3)])
+        for continuous in (False, True):
+            world = ParticleWorld(max_contacts=10, iterations=10)
+            world.contact_gen.append(ParticleMeshContactGenerator(world.storage, wall, restitution=1, thickness=0.01,
+                                                                  continuous=continuous))
+            bullet = world.spawn(Particle(position=Vector(0, 0.5, 0), velocity=Vector(100, 0, 0)))
+            slow = world.spawn(Particle(position=Vector(0.995, 0.5, 0), velocity=Vector(0.01, 0, 0)))
+
+            world.run_physics(0.1)
+            if continuous:
+                self.assertAlmostEqual(bullet.position.x, 0.99)
+                self.assertEqual(bullet.velocity, Vector(-100, 0, 0))
+            else:
+                self.assertEqual(bullet.position, Vector(10, 0.5, 0))
+            self.assertLess(slow.velocity.x, 0)
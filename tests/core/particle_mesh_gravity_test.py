@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from core.particle_mesh_gravity import ParticleMeshGravityForceGenerator
+from core.particle_world import ParticleWorld
+
+
+def gravity_world(box_size: float, cells: int) -> tuple[ParticleWorld, ParticleMeshGravityForceGenerator]:
+    world = ParticleWorld(max_contacts=0, iterations=0)
+    generator = ParticleMeshGravityForceGenerator(world.storage, box_size, cells, gravitational_constant=1)
+    world.registry.add_batch(generator)
+    return world, generator
+
+
+class ParticleMeshGravityForceGeneratorTest(unittest.TestCase):
+
+    def test_two_bodies_match_newton(self):
+        world, _ = gravity_world(64, 64)
+        world.spawn_many(2, position=[(30.3, 32.1, 32.7), (38.3, 32.1, 32.7)], inverse_mass=[1, 0.5])
+        world.registry.update_forces(0.1)
+
+        force = world.storage.force_accum[:2]
+        np.testing.assert_allclose(force[0], -force[1], atol=1e-12)
+        self.assertAlmostEqual(force[0, 0], 2 / 8 ** 2, delta=0.1 * 2 / 8 ** 2)
+        np.testing.assert_allclose(force[:, 1:], 0, atol=1e-12)
+
+    def test_no_self_force_and_momentum_conserved(self):
+        world, _ = gravity_world(10, 32)
+        world.spawn_many(1, position=(1.23, 4.56, 7.89))
+        world.registry.update_forces(0.1)
+        np.testing.assert_allclose(world.storage.force_accum[0], 0, atol=1e-12)
+
+        world, _ = gravity_world(10, 32)
+        rng = np.random.default_rng(11)
+        world.spawn_many(500, position=rng.uniform(-20, 20, (500, 3)), inverse_mass=rng.uniform(0.5, 2, 500))
+        world.registry.update_forces(0.1)
+        np.testing.assert_allclose(world.storage.force_accum[:500].sum(axis=0), 0, atol=1e-9)
+
+    def test_uniform_lattice_feels_no_force(self):
+        world, _ = gravity_world(8, 8)
+        lattice = np.indices((8, 8, 8)).reshape(3, -1).T + 0.5
+        world.spawn_many(len(lattice), position=lattice)
+        world.registry.update_forces(0.1)
+        np.testing.assert_allclose(world.storage.force_accum[:len(lattice)], 0, atol=1e-9)
+
+    def test_sleeping_particles_attract_but_do_not_move(self):
+        world, _ = gravity_world(16, 16)
+        handles = world.spawn_many(2, position=[(4, 8, 8), (10, 8, 8)])
+        sleeping = world.particle(int(handles[1]))
+        sleeping.set_awake(False)
+        world.run_physics(1)
+        self.assertGreater(world.storage.velocity[0, 0], 0)
+        self.assertEqual(world.storage.velocity[1, 0], 0)
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from core.particle_neighbours import ParticleSpatialGrid, ParticleNeighbourList, ParticleCollisionContactGenerator
+from core.particle_world import ParticleWorld
+
+
+def brute_force_pairs(positions: np.ndarray, distance: float) -> set:
+    delta = positions[:, None] - positions[None]
+    first, second = np.nonzero(np.triu(np.linalg.norm(delta, axis=2) < distance, 1))
+    return set(zip(first.tolist(), second.tolist()))
+
+
+def pair_set(first: np.ndarray, second: np.ndarray) -> set:
+    return {(min(a, b), max(a, b)) for a, b in zip(first.tolist(), second.tolist())}
+
+
+class ParticleSpatialGridTest(unittest.TestCase):
+
+    def test_pairs_match_brute_force(self):
+        positions = np.random.default_rng(9).uniform(-5, 5, (800, 3))
+        grid = ParticleSpatialGrid(1.0)
+        grid.build(positions)
+        first, second = grid.pairs(positions, 0.8)
+        self.assertEqual(len(first), len(pair_set(first, second)))
+        self.assertEqual(pair_set(first, second), brute_force_pairs(positions, 0.8))
+
+        with self.assertRaises(ValueError):
+            grid.pairs(positions, 1.5)
+
+
+class ParticleNeighbourListTest(unittest.TestCase):
+
+    def test_rebuilds_only_after_moving_half_the_skin(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        rng = np.random.default_rng(10)
+        world.spawn_many(300, position=rng.uniform(0, 5, (300, 3)), velocity=rng.uniform(-1, 1, (300, 3)))
+        neighbours = ParticleNeighbourList(world.storage, cutoff=0.5, skin=0.2)
+        self.assertTrue(neighbours.update())
+
+        builds = []
+        for _ in range(50):
+            world.run_physics(0.01)
+            builds.append(neighbours.update())
+            positions = world.storage.position[:world.storage.size]
+            first, second, _, _ = neighbours.close_pairs()
+            self.assertEqual(pair_set(first, second), brute_force_pairs(positions, 0.5))
+        # the fastest particles move sqrt(3) * 0.01 per step, so the list lasts several steps
+        self.assertLess(sum(builds), 15)
+        self.assertGreater(sum(builds), 0)
+
+    def test_rebuilds_when_particles_change(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(3, position=[(0, 0, 0), (0.1, 0, 0), (0.2, 0, 0)])
+        neighbours = ParticleNeighbourList(world.storage, cutoff=0.15, skin=0.1)
+        neighbours.update()
+        self.assertFalse(neighbours.update())
+
+        world.despawn(int(handles[1]))
+        self.assertTrue(neighbours.update())
+        self.assertEqual(len(neighbours.close_pairs()[0]), 0)
+
+        world.spawn_many(1, position=(0.05, 0, 0))
+        self.assertTrue(neighbours.update())
+        self.assertEqual(len(neighbours.close_pairs()[0]), 1)
+
+
+class ParticleCollisionContactGeneratorTest(unittest.TestCase):
+
+    def test_colliding_particles_bounce(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        neighbours = ParticleNeighbourList(world.storage, cutoff=1, skin=0.5)
+        world.contact_gen.append(ParticleCollisionContactGenerator(neighbours, restitution=1))
+        world.spawn_many(2, position=[(0, 0, 0), (1.05, 0, 0)], velocity=[(1, 0, 0), (-1, 0, 0)], radius=0.5)
+        world.spawn_many(1, position=(10, 0, 0), radius=0.5)
+
+        world.run_physics(0.1)
+        velocity = world.storage.velocity[:3]
+        np.testing.assert_allclose(velocity, [(-1, 0, 0), (1, 0, 0), (0, 0, 0)])
+        np.testing.assert_allclose(world.storage.position[1, 0] - world.storage.position[0, 0], 1)
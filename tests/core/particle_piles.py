@@ -0,0 +1,20 @@
+import numpy as np
+
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_neighbours import ParticleCollisionContactGenerator, ParticleNeighbourList
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def pile(columns: int, rows: int) -> ParticleWorld:
+    """
+    Creates columns of particles of radius 0.5 stacked on a floor.
+    """
+    world = ParticleWorld(max_contacts=200, iterations=0, integrator=ParticleSemiImplicitEulerIntegrator())
+    positions = [(x * 1.0, 0.5 + y * 1.0, 0) for x in range(columns) for y in range(rows)]
+    world.spawn_many(len(positions), position=np.array(positions), acceleration=(0, -9.81, 0), radius=0.5)
+    floor = ParticlePlaneContactGenerator(world.storage)
+    floor.add_plane(Vector(0, 1, 0), 0)
+    world.contact_gen += [floor, ParticleCollisionContactGenerator(ParticleNeighbourList(world.storage, 1.0, 0.2))]
+    return world
@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+class ParticlePlaneContactGeneratorTest(unittest.TestCase):
+
+    def test_penetrations_account_for_radius(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 2, 0), 0, restitution=0.5)
+        world.spawn_many(3, position=[(0, 0.5, 0), (0, 1.5, 0), (0, -0.25, 0)], radius=1)
+
+        slots, planes, depths = floor.penetrations()
+        self.assertEqual(slots.tolist(), [0, 2])
+        self.assertEqual(planes.tolist(), [0, 0])
+        np.testing.assert_allclose(depths, [0.5, 1.25])
+
+        used = floor.add_contacts(world.contacts, 3, 7)
+        self.assertEqual(used, 2)
+        contact = world.contacts[3]
+        self.assertEqual(contact.particles[0].position, Vector(0, 0.5, 0))
+        self.assertIsNone(contact.particles[1])
+        self.assertEqual(contact.contact_normal, Vector(0, 1, 0))
+        self.assertEqual(contact.restitution, 0.5)
+
+    def test_limit_keeps_deepest(self):
+        world = ParticleWorld(max_contacts=1, iterations=1)
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 1, 0), 0)
+        world.spawn_many(3, position=[(0, -1, 0), (0, -3, 0), (0, -2, 0)])
+        self.assertEqual(floor.add_contacts(world.contacts, 0, 1), 1)
+        self.assertAlmostEqual(world.contacts[0].penetration, 3)
+
+    def test_particles_stay_in_box(self):
+        world = ParticleWorld(max_contacts=1000, iterations=0)
+        box = ParticlePlaneContactGenerator(world.storage)
+        box.add_box(Vector(-1, -1, -1), Vector(1, 1, 1), restitution=0.8)
+        self.assertEqual(len(box), 6)
+        world.contact_gen.append(box)
+        rng = np.random.default_rng(5)
+        world.spawn_many(200, position=rng.uniform(-0.9, 0.9, (200, 3)), velocity=rng.uniform(-5, 5, (200, 3)),
+                         acceleration=(0, -9.8, 0), radius=0.05)
+
+        for _ in range(200):
+            world.run_physics(0.01)
+        positions = world.storage.position[:world.storage.size]
+        self.assertTrue((np.abs(positions) <= 0.95 + 1e-9).all())
+
+    def test_bounce_uses_plane_restitution(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 1, 0), 0, restitution=0.5)
+        world.contact_gen.append(floor)
+        ball = world.spawn(Particle(position=Vector(0, 0.05, 0), velocity=Vector(0, -10, 0)))
+
+        world.run_physics(0.01)
+        self.assertEqual(ball.velocity, Vector(0, 5, 0))
+        self.assertEqual(ball.position, Vector(0, 0, 0))
+
+    def test_sleeping_particles_are_skipped(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 1, 0), 0)
+        particle = world.spawn(Particle(position=Vector(0, -1, 0)))
+        particle.set_awake(False)
+        self.assertEqual(len(floor.penetrations()[0]), 0)
+
+    def test_continuous_detection_clamps_at_impact(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        floor = ParticlePlaneContactGenerator(world.storage, continuous=True)
+        floor.add_plane(Vector(0, 1, 0), 0)
+        floor.add_plane(Vector(1, 0, 0), -5)
+        world.contact_gen.append(floor)
+        ball = world.spawn(Particle(position=Vector(0, 1, 0), velocity=Vector(10, -10, 0)))
+        slow = world.particle(int(world.spawn_many(1, position=(3, 0.1, 0), velocity=(0.01, -0.05, 0), radius=0.1)[0]))
+
+        world.run_physics(1)
+        self.assertEqual(ball.position, Vector(1, 0, 0))
+        self.assertEqual(ball.velocity, Vector(10, 0, 0))
+        self.assertAlmostEqual(slow.position.x, 3.01)
+        self.assertAlmostEqual(slow.position.y, 0.1)
+
+    def test_spawned_particles_are_not_swept_from_the_origin(self):
+        world = ParticleWorld(max_contacts=10, iterations=10)
+        ceiling = ParticlePlaneContactGenerator(world.storage, continuous=True)
+        ceiling.add_plane(Vector(0, -1, 0), -2)
+        world.contact_gen.append(ceiling)
+        particle = world.spawn(Particle(position=Vector(0, 5, 0)))
+        world.spawn_many(1, position=(1, 5, 0))
+        np.testing.assert_array_equal(world.storage.previous_position[:2], [(0, 5, 0), (1, 5, 0)])
+
+        # the particles spawned inside the ceiling are found there, not clamped where a sweep from the origin hits it
+        self.assertEqual(world.generate_contacts(), 2)
+        self.assertEqual(particle.position, Vector(0, 5, 0))
+        self.assertEqual([contact.penetration for contact in world.contacts[:2]], [3, 3])
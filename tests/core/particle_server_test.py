@@ -0,0 +1,110 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.particle_server import ParticleWorldServer, decode_frame, encode_frame, read_frame
+from core.particle_world import ParticleWorld
+
+
+def moving_world(count: int, precision: type = np.float64) -> ParticleWorld:
+    world = ParticleWorld(max_contacts=0, iterations=0, capacity=count, precision=precision)
+    world.spawn_many(count, position=np.arange(count * 3).reshape(count, 3), velocity=(1, 0, 0))
+    return world
+
+
+class ParticleServerFrameTest(unittest.TestCase):
+
+    def test_frame_round_trip(self):
+        for precision in (np.float64, np.float32):
+            world = moving_world(5, precision)
+            world.despawn(int(world.storage.slot_handle[1]))
+            frame, simulated_time, records = decode_frame(encode_frame(world, 7, 0.25))
+
+            self.assertEqual((frame, simulated_time), (7, 0.25))
+            slots = world.storage.live_slots()
+            np.testing.assert_array_equal(records['handle'], world.storage.slot_handle[slots])
+            np.testing.assert_array_equal(records['position'], world.storage.position[slots])
+            self.assertEqual(records['position'].dtype, precision)
+
+    def test_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            decode_frame(b'\0' * 64)
+
+
+class ParticleWorldServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_streams_frames_over_tcp(self):
+        server = ParticleWorldServer(moving_world(3), duration=0.5, max_pending=100)
+        port = await server.start_tcp()
+        readers = [await asyncio.open_connection('127.0.0.1', port) for _ in range(2)]
+        while len(server.subscribers) < 2:
+            await asyncio.sleep(0.01)
+
+        await server.run(frames=4)
+        for reader, writer in readers:
+            for expected in range(1, 5):
+                frame, simulated_time, records = decode_frame(await read_frame(reader))
+                self.assertEqual(frame, expected)
+                self.assertAlmostEqual(simulated_time, 0.5 * expected)
+                np.testing.assert_allclose(records['position'][:, 0], np.arange(3) * 3 + 0.5 * expected)
+            writer.close()
+        await server.close()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix sockets are not available')
+    async def test_streams_frames_over_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'world.sock')
+            server = ParticleWorldServer(moving_world(2), duration=0.1)
+            await server.start_unix(path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            while not server.subscribers:
+                await asyncio.sleep(0.01)
+
+            await server.run(frames=1)
+            frame, _, records = decode_frame(await read_frame(reader))
+            self.assertEqual((frame, len(records)), (1, 2))
+            writer.close()
+            await server.close()
+
+    async def test_stalled_client_drops_frames(self):
+        # frames of a few MB fill the socket buffers at once, so the client below stalls the server's writes
+        server = ParticleWorldServer(moving_world(50000), duration=0.1, max_pending=2)
+        port = await server.start_tcp()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 24)
+        while not server.subscribers:
+            await asyncio.sleep(0.01)
+        subscriber = server.subscribers[0]
+
+        await server.run(frames=30)
+        self.assertEqual(server.frame, 30)
+        self.assertGreater(subscriber.dropped, 0)
+        self.assertLessEqual(subscriber.queue.qsize(), 2)
+
+        # the client catches up with the latest frames, skipping those dropped
+        frames = []
+        while not frames or frames[-1] < 30:
+            frames.append(decode_frame(await read_frame(reader))[0])
+        self.assertLess(len(frames), 30)
+        self.assertEqual(frames, sorted(frames))
+        writer.close()
+        await server.close()
+
+    async def test_disconnected_client_is_removed(self):
+        server = ParticleWorldServer(moving_world(2), duration=0.1)
+        port = await server.start_tcp()
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+        while not server.subscribers:
+            await asyncio.sleep(0.01)
+        writer.close()
+        await writer.wait_closed()
+
+        for _ in range(50):
+            await server.run(frames=1)
+            if not server.subscribers:
+                break
+        self.assertEqual(server.subscribers, [])
+        await server.close()
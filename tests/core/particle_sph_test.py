@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_sph import ParticleSPHForceGenerator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+SPACING = 0.05
+MASS = 1000 * SPACING ** 3
+
+
+def fluid_world(count: int, stiffness: float = 1000, viscosity: float = 20, max_contacts: int = 0,
+                rest_density: float = 1000) -> tuple[ParticleWorld, ParticleSPHForceGenerator]:
+    world = ParticleWorld(max_contacts=max_contacts, iterations=0, integrator=ParticleSemiImplicitEulerIntegrator(),
+                          capacity=count)
+    generator = ParticleSPHForceGenerator(world.storage, 2 * SPACING, rest_density, stiffness, viscosity)
+    world.registry.add_batch(generator)
+    return world, generator
+
+
+def block(shape: tuple[int, int, int], spacing: float = SPACING) -> np.ndarray:
+    return (np.indices(shape).reshape(3, -1).T + 0.5) * spacing
+
+
+class ParticleSPHForceGeneratorTest(unittest.TestCase):
+
+    def test_lattice_density_matches_rest_density(self):
+        world, generator = fluid_world(1000)
+        positions = block((10, 10, 10))
+        world.spawn_many(len(positions), position=positions, inverse_mass=1 / MASS)
+        world.registry.update_forces(0.001)
+
+        centre = np.flatnonzero(np.all(np.abs(positions - 0.25) < 0.1, axis=1))
+        np.testing.assert_allclose(generator.density[centre], 1000, rtol=0.05)
+        # particles of the surface have fewer neighbours
+        self.assertLess(generator.density[0], generator.density[centre].min())
+
+    def test_compressed_fluid_expands_and_conserves_momentum(self):
+        world, generator = fluid_world(512)
+        positions = block((8, 8, 8), 0.8 * SPACING)
+        world.spawn_many(len(positions), position=positions, inverse_mass=1 / MASS)
+        world.registry.update_forces(0.001)
+
+        self.assertGreater(generator.pressure.max(), 0)
+        force = world.storage.force_accum[:512]
+        np.testing.assert_allclose(force.sum(axis=0), 0, atol=1e-9)
+        outwards = np.einsum('ij,ij->i', force, positions - positions.mean(axis=0))
+        self.assertGreater(outwards.sum(), 0)
+
+        for _ in range(50):
+            world.run_physics(0.001)
+        self.assertLess(generator.density.max(), 1000 * 1.05)
+        np.testing.assert_allclose(world.storage.velocity[:512].sum(axis=0) * MASS, 0, atol=1e-9)
+
+    def test_viscosity_damps_relative_velocity(self):
+        world, _ = fluid_world(2, stiffness=0, viscosity=50)
+        world.spawn_many(2, position=[(0, 0, 0), (0.05, 0, 0)], velocity=[(0, 1, 0), (0, -1, 0)],
+                         inverse_mass=1 / MASS)
+        world.registry.update_forces(0.001)
+        force = world.storage.force_accum[:2]
+        self.assertLess(force[0, 1], 0)
+        np.testing.assert_allclose(force[0], -force[1])
+
+    def test_sleeping_and_infinite_mass_particles(self):
+        # two particles are far less dense than the fluid at rest, so lower its rest density to get some pressure
+        world, generator = fluid_world(3, rest_density=100)
+        handles = world.spawn_many(3, position=[(0, 0, 0), (0.02, 0, 0), (0, 0.02, 0)],
+                                   inverse_mass=[1 / MASS, 1 / MASS, 0])
+        world.particle(int(handles[1])).set_awake(False)
+        world.registry.update_forces(0.001)
+
+        force = world.storage.force_accum[:3]
+        self.assertLess(force[0, 0], 0)
+        self.assertEqual(force[0, 1], 0)
+        np.testing.assert_allclose(force[1:], 0)
+        self.assertEqual(generator.density[2], 0)
+
+    def test_fluid_settles_in_a_tank(self):
+        positions = block((3, 6, 3))
+        world, generator = fluid_world(len(positions), max_contacts=len(positions))
+        tank = ParticlePlaneContactGenerator(world.storage)
+        tank.add_box(Vector(0, 0, 0), Vector(0.3, 1, 0.15))
+        world.contact_gen.append(tank)
+        world.spawn_many(len(positions), position=positions, acceleration=(0, -9.81, 0), inverse_mass=1 / MASS,
+                         radius=SPACING / 2)
+
+        for _ in range(200):
+            world.run_physics(0.001)
+        state = world.storage
+        count = len(positions)
+        self.assertTrue(np.isfinite(state.position[:count]).all())
+        self.assertLess(generator.density[:count].max(), 1000 * 1.2)
+        self.assertLess(np.abs(state.velocity[:count]).max(), 5)
+        self.assertGreater(state.position[:count, 0].max(), 0.2)
+
+    def test_invalid_parameters(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        with self.assertRaises(ValueError):
+            ParticleSPHForceGenerator(world.storage, 0, 1000, 1)
+        with self.assertRaises(ValueError):
+            ParticleSPHForceGenerator(world.storage, 0.1, 0, 1)
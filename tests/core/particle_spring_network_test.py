@@ -0,0 +1,147 @@
+import math
+import unittest
+
+import numpy as np
+
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_spring_network import ParticleSpringNetwork, ParticleImplicitEulerIntegrator
+from core.particle_world import ParticleWorld
+
+
+def cloth(size: int, stiffness: float, integrator=None) -> tuple[ParticleWorld, ParticleSpringNetwork]:
+    """
+    Creates a square cloth of 10 g particles 10 cm apart, with structural and shear springs, hanging from two corners.
+    """
+    world = ParticleWorld(max_contacts=0, iterations=0, capacity=size * size)
+    network = ParticleSpringNetwork(world.storage)
+    grid = np.indices((size, size)).reshape(2, -1).T * 0.1
+    handles = world.spawn_many(size * size, position=np.column_stack([grid[:, 0], np.zeros(size * size), grid[:, 1]]),
+                               acceleration=(0, -9.81, 0), inverse_mass=100, damping=0.9)
+    index = np.arange(size * size).reshape(size, size)
+    for first, second in ((index[:, :-1], index[:, 1:]), (index[:-1], index[1:]),
+                          (index[:-1, :-1], index[1:, 1:]), (index[1:, :-1], index[:-1, 1:])):
+        network.add_springs(handles[first.ravel()], handles[second.ravel()], stiffness, damping=0.1)
+    world.storage.inverse_mass[[0, size - 1]] = 0
+    world.storage.acceleration[[0, size - 1]] = 0
+    world.registry.add_batch(network)
+    world.integrator = integrator or ParticleImplicitEulerIntegrator([network])
+    return world, network
+
+
+def stretch(world: ParticleWorld, network: ParticleSpringNetwork) -> float:
+    springs, first, second = network.live_springs()
+    delta = world.storage.position[first] - world.storage.position[second]
+    return float(np.max(np.sqrt(np.einsum('ij,ij->i', delta, delta)) / network.rest_length[springs]))
+
+
+class ParticleSpringNetworkTest(unittest.TestCase):
+
+    def test_forces(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(4, position=[(0, 0, 0), (2, 0, 0), (0, 5, 0), (0, 5.5, 0)],
+                                   velocity=[(0, 0, 0), (1, 0, 0), (0, 0, 0), (0, 0, 0)])
+        network = ParticleSpringNetwork(world.storage)
+        network.add_spring(handles[0], handles[1], 10, rest_length=1, damping=2)
+        network.add_spring(handles[2], handles[3], 10, rest_length=1)
+        world.registry.add_batch(network)
+        world.registry.update_forces(0.1)
+
+        force = world.storage.force_accum[:4]
+        # stretched by 1 and lengthening at 1: pulled together by 10 + 2
+        np.testing.assert_allclose(force[0], (12, 0, 0))
+        np.testing.assert_allclose(force[1], (-12, 0, 0))
+        # compressed by 0.5: pushed apart
+        np.testing.assert_allclose(force[2], (0, -5, 0))
+        np.testing.assert_allclose(force[3], (0, 5, 0))
+
+    def test_jacobians_match_finite_differences(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(2, position=[(0.3, 0.2, -0.1), (1.5, 0.9, 0.4)])
+        network = ParticleSpringNetwork(world.storage)
+        network.add_spring(handles[0], handles[1], 7, rest_length=1, damping=3)
+        springs = np.array([0])
+        delta = np.array([[-1.2, -0.7, -0.5]])
+        stiffness, damping = network.jacobians(springs, delta)
+
+        epsilon = 1e-6
+        for axis in range(3):
+            step = np.zeros((1, 3))
+            step[0, axis] = epsilon
+            change = (network.forces(springs, delta + step, np.zeros((1, 3)))
+                      - network.forces(springs, delta - step, np.zeros((1, 3)))) / (2 * epsilon)
+            np.testing.assert_allclose(change[0], -stiffness[0, :, axis], atol=1e-5)
+            change = (network.forces(springs, delta, step) - network.forces(springs, delta, np.zeros((1, 3)))) / epsilon
+            np.testing.assert_allclose(change[0], -damping[0, :, axis], atol=1e-5)
+
+    def test_despawned_ends(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(3, position=[(0, 0, 0), (2, 0, 0), (4, 0, 0)])
+        network = ParticleSpringNetwork(world.storage)
+        network.add_springs(handles[:2], handles[1:], 10, rest_length=1)
+        world.registry.add_batch(network)
+        world.despawn(int(handles[2]))
+        world.registry.update_forces(0.1)
+
+        self.assertEqual(len(network.live_springs()[0]), 1)
+        np.testing.assert_allclose(world.storage.force_accum[1], (-10, 0, 0))
+        with self.assertRaises(KeyError):
+            network.add_spring(handles[0], handles[2], 1)
+
+
+class ParticleImplicitEulerIntegratorTest(unittest.TestCase):
+
+    def test_soft_spring_matches_analytic_motion(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(2, position=[(0, 0, 0), (2, 0, 0)], inverse_mass=[0, 1])
+        network = ParticleSpringNetwork(world.storage)
+        network.add_spring(handles[0], handles[1], 1, rest_length=1)
+        world.registry.add_batch(network)
+        world.integrator = ParticleImplicitEulerIntegrator([network])
+
+        for _ in range(1000):
+            world.run_physics(0.001)
+        self.assertAlmostEqual(world.storage.position[1, 0], 1 + math.cos(1), delta=1e-3)
+        np.testing.assert_allclose(world.storage.position[0], 0)
+
+    def test_stiff_cloth_is_stable_at_60_hz(self):
+        world, network = cloth(8, 10000)
+        for _ in range(120):
+            world.run_physics(1 / 60)
+        self.assertTrue(np.isfinite(world.storage.position[:64]).all())
+        self.assertLess(stretch(world, network), 1.01)
+        np.testing.assert_allclose(world.storage.position[[0, 7]], [(0, 0, 0), (0, 0, 0.7)], atol=1e-12)
+        # the cloth hangs below its corners
+        self.assertLess(world.storage.position[:64, 1].min(), -0.5)
+
+        world, network = cloth(8, 10000, ParticleSemiImplicitEulerIntegrator())
+        with np.errstate(all='ignore'):
+            for _ in range(10):
+                world.run_physics(1 / 60)
+        self.assertFalse(stretch(world, network) < 1.01)
+
+    def test_warm_start_saves_iterations(self):
+        totals = []
+        for warm_start in (True, False):
+            world, network = cloth(6, 10000)
+            world.integrator = ParticleImplicitEulerIntegrator([network], warm_start=warm_start)
+            total = 0
+            for _ in range(60):
+                world.run_physics(1 / 60)
+                total += world.integrator.iterations
+            totals.append(total)
+        self.assertLess(totals[0], totals[1])
+
+    def test_sleeping_end_is_fixed(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        handles = world.spawn_many(3, position=[(0, 0, 0), (2, 0, 0), (5, 0, 0)])
+        network = ParticleSpringNetwork(world.storage)
+        network.add_spring(handles[0], handles[1], 100, rest_length=1)
+        world.registry.add_batch(network)
+        world.integrator = ParticleImplicitEulerIntegrator([network])
+        world.particle(int(handles[0])).set_awake(False)
+
+        for _ in range(30):
+            world.run_physics(1 / 30)
+        np.testing.assert_allclose(world.storage.position[0], 0)
+        self.assertLess(world.storage.position[1, 0], 2)
+        np.testing.assert_allclose(world.storage.position[2], (5, 0, 0))
@@ -0,0 +1,114 @@
+import random
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_force_generator import ParticleGravityForceGenerator
+from core.particle_storage import ParticleStorage
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+class ParticleStorageTest(unittest.TestCase):
+
+    def test_free_list_reuses_slots(self):
+        storage = ParticleStorage(capacity=4)
+        slots, handles = storage.allocate(3)
+        self.assertEqual(slots.tolist(), [0, 1, 2])
+        storage.release(handles[1:2])
+        new_slots, new_handles = storage.allocate(1)
+        self.assertEqual(new_slots.tolist(), [1])
+        self.assertNotEqual(new_handles[0], handles[1])
+        self.assertEqual(storage.slots(handles).tolist(), [0, -1, 2])
+        self.assertEqual(storage.capacity, 4)
+
+    def test_capacity_grows_geometrically(self):
+        storage = ParticleStorage(capacity=4)
+        storage.allocate(5)
+        self.assertEqual(storage.capacity, 8)
+        storage.allocate(20)
+        self.assertEqual(storage.capacity, 25)
+        storage.allocate(1)
+        self.assertEqual(storage.capacity, 50)
+        self.assertEqual(storage.count, 26)
+
+    def test_handles_survive_compaction(self):
+        storage = ParticleStorage(capacity=8)
+        slots, handles = storage.allocate(100)
+        storage.position[slots, 0] = np.arange(100)
+        storage.release(handles[::3])
+        kept = np.setdiff1d(np.arange(100), np.arange(0, 100, 3))
+        version = storage.version
+
+        self.assertFalse(storage.compact_if_sparse())
+        storage.compact()
+        self.assertGreater(storage.version, version)
+        self.assertEqual(storage.size, len(kept))
+        self.assertTrue(storage.alive[:storage.size].all())
+        np.testing.assert_array_equal(storage.position[storage.slots(handles[kept]), 0], kept)
+        with self.assertRaises(KeyError):
+            storage.slot(int(handles[0]))
+
+    def test_random_churn(self):
+        storage = ParticleStorage(capacity=2)
+        live = {}
+        for step in range(500):
+            if live and random.random() < 0.5:
+                handle = random.choice(list(live))
+                storage.release([handle])
+                del live[handle]
+            else:
+                slots, handles = storage.allocate(random.randint(1, 4))
+                for slot, handle in zip(slots.tolist(), handles.tolist()):
+                    storage.position[slot, 0] = handle
+                    live[handle] = handle
+            if step % 50 == 0:
+                storage.compact_if_sparse()
+        self.assertEqual(storage.count, len(live))
+        handles = np.array(list(live), dtype=np.int64)
+        np.testing.assert_array_equal(storage.position[storage.slots(handles), 0], handles.astype(float))
+
+
+class ParticleWorldSpawnTest(unittest.TestCase):
+
+    def test_spawn_copies_particle(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        particle = world.spawn(Particle(position=Vector(1, 2, 3), velocity=Vector(1, 0, 0), inverse_mass=0.5))
+        self.assertEqual(particle.position, Vector(1, 2, 3))
+        self.assertEqual(particle.mass, 2)
+        self.assertIs(world.particle(particle.handle), particle)
+        self.assertEqual(world.particles, (particle,))
+        # particles are only added and removed through spawn and despawn
+        with self.assertRaises(AttributeError):
+            world.particles.append(Particle())
+
+        world.run_physics(1)
+        self.assertEqual(particle.position, Vector(2, 2, 3))
+
+    def test_despawn_removes_registrations(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        kept = world.spawn()
+        removed = world.spawn()
+        gravity = ParticleGravityForceGenerator(Vector(0, -10, 0))
+        world.registry.add(kept, gravity)
+        world.registry.add(removed, gravity)
+
+        world.despawn(removed)
+        self.assertFalse(removed.is_alive)
+        self.assertEqual(len(world.registry), 1)
+        with self.assertRaises(KeyError):
+            removed.position
+        world.run_physics(1)
+        self.assertEqual(kept.velocity, Vector(0, -10, 0))
+
+    def test_spawn_many_and_compaction(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, capacity=16)
+        handles = world.spawn_many(1000, position=np.random.rand(1000, 3), velocity=(1, 0, 0))
+        tracked = world.particle(int(handles[-1]))
+        start = tracked.position
+        world.despawn_many(handles[:900])
+        world.run_physics(0.5)
+
+        self.assertEqual(world.storage.size, 100)
+        self.assertEqual(tracked.position, start + Vector(0.5, 0, 0))
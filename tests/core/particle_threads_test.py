@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_neighbours import ParticleNeighbourList
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_spring_network import ParticleSpringNetwork
+from core.particle_threads import ParticleThreadPool
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+def spring_world(threads: int, count: int = 3000) -> ParticleWorld:
+    """
+    Creates a chain of falling particles, with chunks small enough that every kernel is split.
+    """
+    world = ParticleWorld(max_contacts=0, iterations=0, capacity=count,
+                          integrator=ParticleSemiImplicitEulerIntegrator())
+    world.storage.pool = ParticleThreadPool(threads, min_chunk=200)
+    rng = np.random.default_rng(0)
+    handles = world.spawn_many(count, position=rng.uniform(0, 10, (count, 3)), velocity=rng.normal(size=(count, 3)),
+                               acceleration=(0, -9.81, 0), radius=0.1)
+    network = ParticleSpringNetwork(world.storage)
+    network.add_springs(handles[:-1], handles[1:], 50, rest_length=0.5, damping=0.5)
+    world.registry.add_batch(network)
+    return world
+
+
+class ParticleThreadPoolTest(unittest.TestCase):
+
+    def test_chunks(self):
+        pool = ParticleThreadPool(4, min_chunk=10)
+        self.assertEqual(pool.chunks(25), [slice(0, 12), slice(12, 25)])
+        self.assertEqual(len(pool.chunks(1000)), 4)
+        self.assertEqual(pool.chunks(5), [slice(0, 5)])
+        self.assertEqual(pool.chunks(0), [slice(0, 0)])
+        with self.assertRaises(ValueError):
+            ParticleThreadPool(0)
+
+    def test_accumulate_matches_bincount(self):
+        rng = np.random.default_rng(1)
+        rows, values = rng.integers(0, 50, 10000), rng.normal(size=(10000, 3))
+        pool = ParticleThreadPool(4, min_chunk=100)
+        total = pool.accumulate(lambda chunk: (rows[chunk], values[chunk]), len(rows), 50)
+        expected = np.column_stack([np.bincount(rows, values[:, axis], minlength=50) for axis in range(3)])
+        np.testing.assert_allclose(total, expected)
+        # the chunks are merged in order, whichever thread finishes first
+        for _ in range(5):
+            np.testing.assert_array_equal(pool.accumulate(lambda chunk: (rows[chunk], values[chunk]), len(rows), 50),
+                                          total)
+        pool.close()
+
+    def test_world_threads(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, threads=3)
+        self.assertEqual(world.threads, 3)
+        world.threads = 2
+        self.assertEqual(world.storage.pool.threads, 2)
+
+    def test_threaded_world_matches_single_thread(self):
+        positions = []
+        for threads in (1, 4, 4):
+            world = spring_world(threads)
+            for _ in range(20):
+                world.run_physics(0.01)
+            positions.append(world.storage.position[:3000].copy())
+            world.storage.pool.close()
+        np.testing.assert_allclose(positions[1], positions[0], atol=1e-9)
+        np.testing.assert_array_equal(positions[2], positions[1])
+
+    def test_threaded_contact_kernels(self):
+        world = spring_world(4)
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 1, 0), 5)
+        slots, planes, depths = floor.penetrations()
+        below = np.flatnonzero(world.storage.position[:3000, 1] < 5.1)
+        np.testing.assert_array_equal(slots, below)
+
+        neighbours = ParticleNeighbourList(world.storage, 0.5, 0.1)
+        neighbours.update()
+        first, second, delta, distance = neighbours.close_pairs()
+        world.storage.pool = ParticleThreadPool()
+        np.testing.assert_array_equal(neighbours.close_pairs()[0], first)
+        np.testing.assert_array_equal(neighbours.close_pairs()[3], distance)
@@ -0,0 +1,56 @@
+import math
+import unittest
+
+from core.particle import Particle
+from core.particle_force_generator import ParticleAnchoredBungeeForceGenerator
+from core.particle_integrator import ParticleVelocityVerletIntegrator
+from core.particle_timestep import ParticleAdaptiveTimestep
+from core.particle_world import ParticleWorld
+from core.particle_world_stats import ParticleWorldStats
+from core.vector import Vector
+
+
+class ParticleAdaptiveTimestepTest(unittest.TestCase):
+
+    def test_calm_world_takes_large_steps(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        world.timestep = ParticleAdaptiveTimestep(min_step=0.001, max_step=0.1, tolerance=1e-4)
+        particle = world.spawn(Particle(position=Vector.zero(), velocity=Vector(1, 0, 0)))
+
+        world.run_physics(1.0)
+        self.assertLess(len(world.timestep.steps), 20)
+        self.assertAlmostEqual(sum(world.timestep.steps), 1.0)
+        self.assertAlmostEqual(particle.position.x, 1.0)
+
+    def test_courant_limit(self):
+        world = ParticleWorld(max_contacts=0, iterations=0)
+        world.timestep = ParticleAdaptiveTimestep(min_step=0.0001, max_step=0.1, tolerance=1,
+                                                  courant=0.5, length_scale=0.1)
+        world.spawn(Particle(position=Vector.zero(), velocity=Vector(10, 0, 0)))
+        world.run_physics(0.1)
+        self.assertLessEqual(max(world.timestep.steps), 0.005 + 1e-12)
+
+    def test_spring_period_limit_and_stats(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, integrator=ParticleVelocityVerletIntegrator())
+        world.timestep = ParticleAdaptiveTimestep(min_step=0.0001, max_step=0.1, tolerance=1, spring_fraction=0.05)
+        world.stats = ParticleWorldStats()
+        particle = world.spawn(Particle(position=Vector(2, 0, 0), velocity=Vector.zero()))
+        world.registry.add(particle, ParticleAnchoredBungeeForceGenerator(Vector.zero(), 10_000, 1))
+
+        world.run_physics(0.1)
+        limit = 0.05 * 2 * math.pi * math.sqrt(1 / 10_000)
+        self.assertLessEqual(max(world.timestep.steps), limit + 1e-12)
+        self.assertEqual(world.stats.history('step'), world.timestep.steps)
+
+    def test_error_control_rejects_inaccurate_steps(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, integrator=ParticleVelocityVerletIntegrator())
+        timestep = world.timestep = ParticleAdaptiveTimestep(min_step=1e-5, max_step=0.5, tolerance=1e-6,
+                                                             spring_fraction=1)
+        timestep.step = timestep.max_step
+        particle = world.spawn(Particle(position=Vector(2, 0, 0), velocity=Vector.zero()))
+        world.registry.add(particle, ParticleAnchoredBungeeForceGenerator(Vector.zero(), 1, 1))
+
+        world.run_physics(1.0)
+        self.assertGreater(timestep.rejected, 0)
+        self.assertLessEqual(timestep.last_error, timestep.tolerance)
+        self.assertAlmostEqual(particle.position.x, 1 + math.cos(1.0), places=4)
@@ -0,0 +1,86 @@
+import unittest
+
+from core.particle import Particle
+from core.particle_contact import ParticleContact, ParticleContactGenerator
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_world import ParticleWorld
+from core.particle_world_stats import ParticleWorldStats, PHASES
+from core.vector import Vector
+
+
+class TouchingContactGenerator(ParticleContactGenerator):
+    """
+    Always reports a single closing contact between two particles.
+    """
+
+    def __init__(self, particle_a: Particle, particle_b: Particle):
+        self.particle_a = particle_a
+        self.particle_b = particle_b
+
+    def add_contact(self, contact: ParticleContact, limit: int) -> int:
+        contact.particles = self.particle_a, self.particle_b
+        contact.contact_normal = Vector(1, 0, 0)
+        contact.penetration = 0
+        contact.restitution = 1
+        return 1
+
+    def count_contacts(self) -> int:
+        return 1
+
+
+class ParticleWorldStatsTest(unittest.TestCase):
+
+    def test_percentile(self):
+        stats = ParticleWorldStats(window=100)
+        for i in range(1, 101):
+            stats.record({'contacts': i})
+        self.assertEqual(stats.percentile('contacts', 50), 50)
+        self.assertEqual(stats.percentile('contacts', 99), 99)
+        self.assertEqual(stats.percentile('contacts', 100), 100)
+        self.assertEqual(stats.summary()['contacts']['max'], 100)
+
+    def test_window_rolls(self):
+        stats = ParticleWorldStats(window=3)
+        for i in range(10):
+            stats.record({'iterations': i})
+        self.assertEqual(stats.frames, 10)
+        self.assertEqual(stats.history('iterations'), [7, 8, 9])
+
+    def test_world_records_phases_only_when_enabled(self):
+        world = ParticleWorld(max_contacts=1, iterations=4)
+        particle_a = world.spawn(Particle(position=Vector(0, 0, 0), velocity=Vector(-1, 0, 0)))
+        particle_b = world.spawn(Particle(position=Vector(1, 0, 0), velocity=Vector(1, 0, 0)))
+        world.contact_gen = [TouchingContactGenerator(particle_a, particle_b) for _ in range(3)]
+
+        self.assertIsNone(world.stats)
+        stats = world.stats = ParticleWorldStats()
+        world.run_physics(0.01)
+        world.stats = None
+        world.run_physics(0.01)
+        self.assertEqual(stats.frames, 1)
+
+        frame = stats.last
+        for phase in PHASES:
+            self.assertGreaterEqual(frame[phase], 0)
+        self.assertAlmostEqual(frame['frame'], sum(frame[phase] for phase in PHASES))
+        self.assertEqual(frame['contacts'], 1)
+        self.assertEqual(frame['iterations'], 1)
+        self.assertEqual(frame['contacts_dropped'], 2)
+
+    def test_dropped_contacts_are_counted_without_running_skipped_generators(self):
+        world = ParticleWorld(max_contacts=2, iterations=4)
+        world.spawn_many(3, position=[(0, -0.5, 0), (1, -0.5, 0), (2, -0.5, 0)])
+        floor = ParticlePlaneContactGenerator(world.storage)
+        floor.add_plane(Vector(0, 1, 0), 0)
+        # a particle tunnelling through the wall of a skipped generator is not clamped
+        wall = ParticlePlaneContactGenerator(world.storage, continuous=True)
+        wall.add_plane(Vector(-1, 0, 0), -10)
+        world.contact_gen = [floor, wall]
+        world.stats = ParticleWorldStats()
+
+        fast = world.particle(int(world.spawn_many(1, position=(9, 5, 0), velocity=(120, 0, 0))[0]))
+        world.run_physics(0.025)
+        self.assertEqual(fast.position, Vector(12, 5, 0))
+        # one floor contact did not fit, and the wall was skipped with one contact
+        self.assertEqual(world.stats.last['contacts'], 2)
+        self.assertEqual(world.stats.last['contacts_dropped'], 2)
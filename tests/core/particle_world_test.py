@@ -0,0 +1,189 @@
+import unittest
+
+import numpy as np
+
+from core.particle import Particle
+from core.particle_contact import ParticleContact
+from core.particle_field_force import ParticleFieldForceGenerator, ParticleGridField
+from core.particle_force_generator import ParticleAnchoredBungeeForceGenerator, ParticleForceGenerator, \
+    ParticleSpringForceGenerator
+from core.particle_integrator import ParticleSemiImplicitEulerIntegrator
+from core.particle_mesh_gravity import ParticleMeshGravityForceGenerator
+from core.particle_plane_contact import ParticlePlaneContactGenerator
+from core.particle_world import ParticleWorld
+from core.vector import Vector
+
+
+class CountingForceGenerator(ParticleForceGenerator):
+    """
+    Counts how many times it was asked for a force, and applies none.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def update_force(self, particle: Particle, duration: float):
+        self.calls += 1
+
+
+def sleepy_world(integrator=None) -> ParticleWorld:
+    world = ParticleWorld(max_contacts=0, iterations=0, integrator=integrator)
+    world.sleep_energy = 1e-3
+    world.sleep_delay = 0.5
+    return world
+
+
+class ParticleWorldSleepTest(unittest.TestCase):
+
+    def test_resting_particle_falls_asleep_and_is_skipped(self):
+        for integrator in (None, ParticleSemiImplicitEulerIntegrator()):
+            world = sleepy_world(integrator)
+            resting = world.spawn(Particle(position=Vector.zero(), velocity=Vector(0.01, 0, 0)))
+            moving = world.spawn(Particle(position=Vector.zero(), velocity=Vector(1, 0, 0)))
+            generator = CountingForceGenerator()
+            world.registry.add(resting, generator)
+
+            for _ in range(60):
+                world.run_physics(0.01)
+            self.assertFalse(resting.is_awake)
+            self.assertTrue(moving.is_awake)
+
+            calls = generator.calls
+            position = resting.position
+            for _ in range(10):
+                world.run_physics(0.01)
+            self.assertEqual(generator.calls, calls)
+            self.assertEqual(resting.position, position)
+            self.assertEqual(resting.velocity, Vector.zero())
+
+    def test_force_wakes_particle(self):
+        particle = Particle()
+        particle.set_awake(False)
+        particle.add_force(Vector(1, 0, 0))
+        self.assertTrue(particle.is_awake)
+        self.assertEqual(particle.force_accum, Vector(1, 0, 0))
+
+    def test_contact_wakes_particle(self):
+        sleeping = Particle(position=Vector(1, 0, 0))
+        sleeping.set_awake(False)
+        moving = Particle(position=Vector.zero(), velocity=Vector(1, 0, 0))
+        contact = ParticleContact((moving, sleeping), restitution=0, contact_normal=Vector(-1, 0, 0), penetration=0)
+        contact.resolve(0.01)
+        self.assertTrue(sleeping.is_awake)
+        self.assertGreater(sleeping.velocity.x, 0)
+
+    def test_linked_particle_wakes_particle(self):
+        world = sleepy_world()
+        sleeping = world.spawn(Particle(position=Vector.zero()))
+        other = world.spawn(Particle(position=Vector(2, 0, 0)))
+        world.registry.add(sleeping, ParticleSpringForceGenerator(other, 1, 1))
+        sleeping.set_awake(False)
+        other.set_awake(False)
+
+        world.run_physics(0.01)
+        self.assertFalse(sleeping.is_awake)
+
+        other.set_awake()
+        world.run_physics(0.01)
+        self.assertTrue(sleeping.is_awake)
+        self.assertNotEqual(sleeping.velocity, Vector.zero())
+
+    def test_changed_force_wakes_particle(self):
+        world = sleepy_world()
+        sleeping = world.spawn(Particle(position=Vector(0, -2, 0)))
+        bungee = ParticleAnchoredBungeeForceGenerator(Vector.zero(), 1, 1)
+        handle = world.registry.add(sleeping, bungee)
+        sleeping.set_awake(False)
+
+        # moving the anchor does not wake the particle up until the registry is told about it
+        bungee.anchor = Vector(1, 0, 0)
+        world.run_physics(0.01)
+        self.assertFalse(sleeping.is_awake)
+
+        self.assertEqual(world.registry.wake_generator(bungee), 1)
+        world.run_physics(0.01)
+        self.assertTrue(sleeping.is_awake)
+        self.assertGreater(sleeping.velocity.x, 0)
+
+        sleeping.set_awake(False)
+        self.assertTrue(world.registry.wake(handle))
+        self.assertTrue(sleeping.is_awake)
+        self.assertFalse(world.registry.wake(handle + 1))
+
+    def test_batch_force_does_not_wake_particle(self):
+        world = sleepy_world()
+        handles = world.spawn_many(2)
+        world.storage.awake[world.storage.slot(int(handles[0]))] = False
+        wind = ParticleGridField(np.tile((1.0, 0, 0), (2, 2, 2, 1)))
+        world.registry.add_batch(ParticleFieldForceGenerator(world.storage, wind=wind, k1=1, k2=0))
+
+        world.run_physics(0.01)
+        sleeping, awake = (world.particle(int(handle)) for handle in handles)
+        self.assertFalse(sleeping.is_awake)
+        self.assertEqual(sleeping.velocity, Vector.zero())
+        self.assertGreater(awake.velocity.x, 0)
+
+
+def precision_worlds(count: int, max_contacts: int = 0) -> list[ParticleWorld]:
+    return [ParticleWorld(max_contacts=max_contacts, iterations=0, integrator=ParticleSemiImplicitEulerIntegrator(),
+                          capacity=count, precision=precision) for precision in (np.float64, np.float32)]
+
+
+class ParticleWorldPrecisionTest(unittest.TestCase):
+
+    def test_single_precision_storage(self):
+        world = ParticleWorld(max_contacts=0, iterations=0, capacity=4, precision=np.float32)
+        world.spawn_many(100, position=np.random.rand(100, 3), velocity=(1, 0, 0))
+        storage = world.storage
+        for name in ('position', 'velocity', 'force_accum', 'inverse_mass', 'previous_position', 'radius'):
+            self.assertEqual(getattr(storage, name).dtype, np.float32)
+        self.assertEqual(storage.slot_handle.dtype, np.int64)
+        self.assertEqual(storage.select(np.arange(10)).position.dtype, np.float32)
+        self.assertEqual(storage.copy().velocity.dtype, np.float32)
+
+        world.run_physics(0.1)
+        self.assertEqual(storage.position.dtype, np.float32)
+        self.assertEqual(storage.kinetic_energy().dtype, np.float64)
+        self.assertAlmostEqual(storage.total_kinetic_energy(), 50, places=4)
+        np.testing.assert_allclose(storage.momentum(), (100, 0, 0), rtol=1e-6)
+
+        with self.assertRaises(ValueError):
+            ParticleWorld(max_contacts=0, iterations=0, precision=np.float16)
+
+    def test_ballistic_drift(self):
+        rng = np.random.default_rng(3)
+        position, velocity = rng.uniform(-10, 10, (1000, 3)), rng.uniform(-5, 5, (1000, 3))
+        results = []
+        for world in precision_worlds(1000):
+            world.spawn_many(1000, position=position, velocity=velocity, acceleration=(0, -9.81, 0), damping=0.99)
+            for _ in range(1000):
+                world.run_physics(0.001)
+            results.append(world.storage.position[:1000].astype(np.float64))
+        np.testing.assert_allclose(results[1], results[0], atol=1e-3)
+
+    def test_mesh_gravity_drift(self):
+        rng = np.random.default_rng(7)
+        position, inverse_mass = rng.uniform(2, 14, (500, 3)), rng.uniform(0.5, 2, 500)
+        results = []
+        for world in precision_worlds(500):
+            world.registry.add_batch(ParticleMeshGravityForceGenerator(world.storage, 16, 16, 1))
+            world.spawn_many(500, position=position, inverse_mass=inverse_mass)
+            for _ in range(200):
+                world.run_physics(0.01)
+            np.testing.assert_allclose(world.storage.momentum(), 0, atol=1e-3)
+            results.append(world.storage.position[:500].astype(np.float64))
+        np.testing.assert_allclose(results[1], results[0], atol=1e-3)
+
+    def test_bouncing_in_a_box_drift(self):
+        rng = np.random.default_rng(5)
+        position, velocity = rng.uniform(1, 9, (50, 3)), rng.uniform(-10, 10, (50, 3))
+        results = []
+        for world in precision_worlds(50, max_contacts=50):
+            box = ParticlePlaneContactGenerator(world.storage)
+            box.add_box(Vector(0, 0, 0), Vector(10, 10, 10), restitution=1)
+            world.contact_gen.append(box)
+            world.spawn_many(50, position=position, velocity=velocity)
+            for _ in range(200):
+                world.run_physics(0.01)
+            results.append(world.storage.position[:50].astype(np.float64))
+        np.testing.assert_allclose(results[1], results[0], atol=1e-3)
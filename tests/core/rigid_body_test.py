@@ -0,0 +1,118 @@
+import math
+import unittest
+
+import numpy as np
+
+from core.matrix import Matrix3
+from core.rigid_body import RigidBodySet, rotation_matrices
+
+
+def random_orientations(count: int, seed: int = 0) -> np.ndarray:
+    orientations = np.random.default_rng(seed).normal(size=(count, 4))
+    return orientations / np.linalg.norm(orientations, axis=1, keepdims=True)
+
+
+class RigidBodySetTest(unittest.TestCase):
+
+    def test_derived_data(self):
+        bodies = RigidBodySet(capacity=2)
+        orientations = random_orientations(5)
+        indices = bodies.add_boxes(5, half_sizes=(0.5, 1, 2), mass=3, position=np.arange(15).reshape(5, 3),
+                                   orientation=orientations * 2)
+        np.testing.assert_array_equal(indices, np.arange(5))
+        self.assertEqual(len(bodies), 5)
+        np.testing.assert_allclose(np.linalg.norm(bodies.orientation[:5], axis=1), 1)
+
+        rotation = rotation_matrices(orientations)
+        np.testing.assert_allclose(rotation @ rotation.transpose(0, 2, 1), np.tile(np.eye(3), (5, 1, 1)), atol=1e-12)
+        np.testing.assert_allclose(np.linalg.det(rotation), 1)
+
+        transform = bodies.transform(3).data
+        np.testing.assert_allclose(np.reshape(transform, (3, 4))[:, :3], rotation[3])
+        np.testing.assert_allclose(np.reshape(transform, (3, 4))[:, 3], (9, 10, 11))
+
+        # the world inverse inertia matches R I^-1 R^T computed with Matrix3
+        body_inertia = Matrix3(bodies.inverse_inertia_tensor[3].ravel().tolist())
+        expected = Matrix3(rotation[3].ravel().tolist()) * body_inertia * Matrix3(rotation[3].T.ravel().tolist())
+        np.testing.assert_allclose(bodies.world_inverse_inertia(3).data, expected.data)
+        # a 1 x 2 x 4 box of 3 kg
+        np.testing.assert_allclose(np.diag(bodies.inverse_inertia_tensor[0]), 12 / 3 / np.array((20, 17, 5)))
+
+    def test_linear_motion(self):
+        bodies = RigidBodySet()
+        bodies.add_bodies(2, velocity=(1, 0, 0), acceleration=(0, -10, 0), inverse_mass=[1, 0.5])
+        bodies.add_forces([0, 1, 1], (0, 10, 0))
+        bodies.integrate(0.1)
+        np.testing.assert_allclose(bodies.velocity[:2], [(1, 0, 0), (1, 0, 0)])
+        np.testing.assert_allclose(bodies.force_accum[:2], 0)
+        bodies.integrate(0.1)
+        np.testing.assert_allclose(bodies.position[:2], [(0.2, -0.1, 0), (0.2, -0.1, 0)])
+
+    def test_constant_spin(self):
+        bodies = RigidBodySet()
+        bodies.add_bodies(1, rotation=(0, 0, math.pi))
+        for _ in range(1000):
+            bodies.integrate(0.001)
+        # half a turn about z
+        angle = 2 * math.atan2(bodies.orientation[0, 3], bodies.orientation[0, 0])
+        self.assertAlmostEqual(angle, math.pi, delta=1e-2)
+        np.testing.assert_allclose(bodies.local_to_world([0], (1, 0, 0)), [(-1, 0, 0)], atol=1e-2)
+
+    def test_force_at_point_spins_the_body(self):
+        bodies = RigidBodySet()
+        bodies.add_boxes(2, half_sizes=(1, 1, 1), mass=6, position=[(0, 0, 0), (5, 0, 0)])
+        # pushing the +x face sideways makes a torque about z; pushing at the centre does not
+        bodies.add_forces_at_body_points([0, 1], (0, 6, 0), [(1, 0, 0), (0, 0, 0)])
+        np.testing.assert_allclose(bodies.torque_accum[:2], [(0, 0, 6), (0, 0, 0)])
+        bodies.integrate(0.5)
+        # the box has a moment of inertia of 4 about each axis
+        np.testing.assert_allclose(bodies.rotation[:2], [(0, 0, 0.75), (0, 0, 0)])
+        np.testing.assert_allclose(bodies.velocity[:2], [(0, 0.5, 0), (0, 0.5, 0)])
+
+    def test_many_tumbling_crates(self):
+        count = 5000
+        rng = np.random.default_rng(2)
+        bodies = RigidBodySet()
+        bodies.add_boxes(count, half_sizes=rng.uniform(0.2, 1, (count, 3)), mass=rng.uniform(1, 10, count),
+                         orientation=random_orientations(count, 3), rotation=rng.normal(size=(count, 3)),
+                         acceleration=(0, -9.81, 0), angular_damping=0.9)
+        for _ in range(60):
+            bodies.add_torques(np.arange(count), rng.normal(size=(count, 3)))
+            bodies.integrate(1 / 60)
+        self.assertTrue(np.isfinite(bodies.transform_matrix[:count]).all())
+        np.testing.assert_allclose(np.linalg.norm(bodies.orientation[:count], axis=1), 1)
+        np.testing.assert_allclose(bodies.position[:count, 1], -0.5 * 9.81 * 61 / 60, rtol=1e-12)
+
+    def test_derived_data_is_only_updated_for_moving_bodies(self):
+        bodies = RigidBodySet()
+        bodies.add_boxes(100, half_sizes=(1, 1, 1), mass=1, orientation=random_orientations(100))
+        bodies.rotation[:10] = (0, 1, 0)
+        updates = bodies.derived_updates
+        bodies.integrate(0.1)
+        self.assertEqual(bodies.derived_updates - updates, 10)
+
+        # repeated queries return the cached matrices until the body moves
+        resting, spinning = bodies.transform(50), bodies.transform(5)
+        inverse = bodies.inverse_transform(50)
+        bodies.integrate(0.1)
+        self.assertIs(bodies.transform(50), resting)
+        self.assertIs(bodies.inverse_transform(50), inverse)
+        self.assertIsNot(bodies.transform(5), spinning)
+
+        # positions written directly are picked up once marked
+        bodies.position[50] = (1, 2, 3)
+        bodies.mark_moved(np.array([50]))
+        self.assertEqual(bodies.transform(50).data[3::4], [1, 2, 3])
+
+    def test_world_to_local(self):
+        bodies = RigidBodySet()
+        indices = bodies.add_bodies(20, position=np.random.default_rng(4).normal(size=(20, 3)),
+                                    orientation=random_orientations(20, 5), rotation=(1, 2, 3))
+        bodies.integrate(0.1)
+        points = np.random.default_rng(6).normal(size=(20, 3))
+        np.testing.assert_allclose(bodies.world_to_local(indices, bodies.local_to_world(indices, points)), points)
+        # the cached inverse matches the general inverse of the transform
+        inverse = bodies.transform(7).inverse()
+        np.testing.assert_allclose(bodies.inverse_transform(7).data, inverse.data, atol=1e-12)
+        bodies.integrate(0.1)
+        np.testing.assert_allclose(bodies.world_to_local(indices, bodies.local_to_world(indices, points)), points)
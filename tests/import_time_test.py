@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a headless worker imports on startup. They must not load any of HEAVY_MODULES, and must import within
+# IMPORT_BUDGET seconds in a fresh interpreter
+STARTUP_MODULES = (
+    'core.particle_world',
+    'core.particle_force_generator',
+    'core.particle_link',
+    'application.multi_body_gravitation_system',
+    'application.particle_spring_system',
+)
+HEAVY_MODULES = ('numpy', 'cv2')
+IMPORT_BUDGET = 0.1
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+'''
+
+
+def measure_import(*modules: str) -> dict:
+    """
+    Imports the given modules in a fresh interpreter.
+
+    :return: the time the imports took in seconds, and the names of every module loaded by the interpreter
+    """
+    output = subprocess.run([sys.executable, '-c', PROBE, *modules], cwd=ROOT, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+
+class ImportTimeTest(unittest.TestCase):
+
+    def test_startup_modules_stay_light(self):
+        for module in STARTUP_MODULES:
+            loaded = measure_import(module)['modules']
+            for heavy in HEAVY_MODULES:
+                self.assertNotIn(heavy, loaded, f'{module} should not import {heavy}')
+
+    def test_startup_budget(self):
+        # take the best of a few runs, so that a busy machine does not fail the budget
+        seconds = min(measure_import(*STARTUP_MODULES)['seconds'] for _ in range(3))
+        self.assertLess(seconds, IMPORT_BUDGET, f'Startup imports took {seconds * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    for name in STARTUP_MODULES:
+        print(f'{name}: {measure_import(name)["seconds"] * 1000:.1f} ms')